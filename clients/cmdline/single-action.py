@@ -1,26 +1,53 @@
+import argparse
 import base64
 import json
 
 import requests
 
+STREAM_FORMATS = ["base64", "json", "msgpack"]
 
-def send_request_and_process_events(url, headers, data):
+
+def print_event(data):
+    if data.get("type") == "bot-llm-text":
+        text_content = data.get("data", {}).get("text", "")
+        print(text_content, end="", flush=True)
+
+
+def process_sse_events(response, stream_format):
+    for line in response.iter_lines():
+        if line:
+            decoded_line = line.decode("utf-8")
+            if decoded_line.startswith("data: "):
+                event_data = decoded_line[6:]  # Remove 'data: ' prefix
+                try:
+                    if stream_format == "base64":
+                        event_data = base64.b64decode(event_data).decode("utf-8")
+                    print_event(json.loads(event_data))
+                except Exception as e:
+                    print(f"Error decoding event: {e}")
+
+
+def process_msgpack_events(response):
+    import msgpack
+
+    unpacker = msgpack.Unpacker(raw=False)
+    for chunk in response.iter_content(chunk_size=None):
+        unpacker.feed(chunk)
+        for data in unpacker:
+            print_event(data)
+
+
+def send_request_and_process_events(url, headers, data, stream_format="base64", coalesce_ms=None):
+    query = {"stream_format": stream_format}
+    if coalesce_ms is not None:
+        query["coalesce_ms"] = coalesce_ms
     try:
-        with requests.post(url, headers=headers, json=data, stream=True) as response:
+        with requests.post(url, headers=headers, params=query, json=data, stream=True) as response:
             response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    decoded_line = line.decode("utf-8")
-                    if decoded_line.startswith("data: "):
-                        event_data = decoded_line[6:]  # Remove 'data: ' prefix
-                        try:
-                            decoded_event = base64.b64decode(event_data).decode("utf-8")
-                            data = json.loads(decoded_event)
-                            if data.get("type") == "bot-llm-text":
-                                text_content = data.get("data", {}).get("text", "")
-                                print(text_content, end="", flush=True)
-                        except Exception as e:
-                            print(f"Error decoding event: {e}")
+            if stream_format == "msgpack":
+                process_msgpack_events(response)
+            else:
+                process_sse_events(response, stream_format)
     except requests.exceptions.RequestException as e:
         print(f"HTTP Request failed: {e}")
     except Exception as e:
@@ -28,6 +55,11 @@ def send_request_and_process_events(url, headers, data):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a single RTVI action and print the reply")
+    parser.add_argument("--format", choices=STREAM_FORMATS, default="base64")
+    parser.add_argument("--coalesce-ms", type=int, default=None)
+    args = parser.parse_args()
+
     url = "http://localhost:8000/api/rtvi/action"
     headers = {"Content-Type": "application/json", "Authorization": "Bearer hello"}
     data = {
@@ -81,4 +113,4 @@ if __name__ == "__main__":
         ],
     }
 
-    send_request_and_process_events(url, headers, data)
+    send_request_and_process_events(url, headers, data, args.format, args.coalesce_ms)
@@ -288,6 +288,63 @@ CREATE INDEX IF NOT EXISTS idx_attachments_message_id ON attachments(message_id)
 --     )
 -- );
 
+-- ========================
+-- Voice Turn Latencies Table
+-- ========================
+CREATE TABLE IF NOT EXISTS voice_turn_latencies (
+    latency_id BIGSERIAL PRIMARY KEY,
+    conversation_id UUID NOT NULL REFERENCES conversations(conversation_id) ON DELETE CASCADE,
+    workspace_id UUID NOT NULL REFERENCES workspaces(workspace_id) ON DELETE CASCADE,
+    stt_provider VARCHAR(64) NOT NULL,
+    llm_provider VARCHAR(64) NOT NULL,
+    tts_provider VARCHAR(64) NOT NULL,
+    stt_ms INTEGER,
+    llm_ttfb_ms INTEGER,
+    tts_ttfb_ms INTEGER,
+    end_to_end_ms INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_voice_turn_latencies_workspace_created
+ON voice_turn_latencies(workspace_id, created_at);
+
+-- Enable row-level security on the voice turn latencies table
+ALTER TABLE voice_turn_latencies ENABLE ROW LEVEL SECURITY;
+
+-- Policy: Allow users to access only latencies of their own workspaces
+CREATE POLICY user_can_access_their_voice_turn_latencies
+ON voice_turn_latencies
+USING (
+    workspace_id IN (
+        SELECT workspace_id FROM workspaces WHERE user_id = get_current_user_id()
+    )
+);
+
+-- ========================
+-- Voice Bot Workers and Jobs Tables
+-- ========================
+-- Shared by the webapp and the voice bot worker nodes, not user data: no
+-- row-level security, like login_attempts. Jobs are deleted when a node
+-- claims them or after SESAME_VOICE_BOT_JOB_TIMEOUT, and the room token in
+-- their payload is encrypted with SESAME_APP_SECRET.
+CREATE TABLE IF NOT EXISTS voice_bot_workers (
+    worker_id VARCHAR(255) PRIMARY KEY,
+    capacity INTEGER NOT NULL,
+    running INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    heartbeat_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS voice_bot_jobs (
+    job_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    worker_id VARCHAR(255) NOT NULL REFERENCES voice_bot_workers(worker_id),
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_voice_bot_jobs_worker_created
+ON voice_bot_jobs(worker_id, created_at);
+
 -- ========================
 -- Services Table
 -- ========================
@@ -554,6 +611,22 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 REVOKE ALL ON FUNCTION check_rate_limit(VARCHAR(255), INT, INT) FROM PUBLIC;
 
+-- Function to list the services workspaces are configured with, across users
+CREATE OR REPLACE FUNCTION get_configured_services()
+RETURNS TABLE (service_type VARCHAR(255), service_provider VARCHAR(255)) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT DISTINCT s.key::VARCHAR(255), s.value::VARCHAR(255)
+    FROM workspaces w,
+        jsonb_each_text(
+            CASE WHEN jsonb_typeof(w.config -> 'services') = 'object'
+            THEN w.config -> 'services' ELSE '{}'::jsonb END
+        ) s;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+REVOKE ALL ON FUNCTION get_configured_services() FROM PUBLIC;
+
 -- ========================
 -- Create Public Role
 -- ========================
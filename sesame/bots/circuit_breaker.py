@@ -0,0 +1,89 @@
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from common.circuit_breaker import CircuitBreaker, circuit_breakers
+from loguru import logger
+
+from pipecat.frames.frames import (
+    CancelFrame,
+    ErrorFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMMessagesFrame,
+    StartInterruptionFrame,
+    TextFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+
+class _CircuitBreakerGuard(FrameProcessor):
+    """
+    Before the LLM service: refuses requests while the circuit is open and
+    counts the errors the service pushes upstream as failures.
+    """
+
+    def __init__(self, breaker: CircuitBreaker):
+        super().__init__()
+        self._breaker = breaker
+        # When the requests waiting for an answer were sent, oldest first.
+        self._sent_at: Deque[float] = deque()
+
+    def done(self) -> Optional[float]:
+        """When the oldest request waiting for an answer was sent."""
+        return self._sent_at.popleft() if self._sent_at else None
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.UPSTREAM:
+            if isinstance(frame, ErrorFrame) and self.done() is not None:
+                self._breaker.record_failure()
+        elif isinstance(frame, (OpenAILLMContextFrame, LLMMessagesFrame)):
+            if not self._breaker.allow():
+                logger.warning(f"Circuit {self._breaker.name} is open, not sending LLM request")
+                await self.push_error(ErrorFrame("LLM provider unavailable, try again later"))
+                return
+            self._sent_at.append(time.monotonic())
+        elif isinstance(frame, (StartInterruptionFrame, CancelFrame)):
+            # Unanswered for longer than a slow response counts as failed.
+            while (sent_at := self.done()) is not None:
+                self._breaker.record_abandoned(time.monotonic() - sent_at)
+
+        await self.push_frame(frame, direction)
+
+
+class _CircuitBreakerMonitor(FrameProcessor):
+    """After the LLM service: counts the first token of a response as a success."""
+
+    def __init__(self, breaker: CircuitBreaker, guard: _CircuitBreakerGuard):
+        super().__init__()
+        self._breaker = breaker
+        self._guard = guard
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, (TextFrame, LLMFullResponseEndFrame)):
+            sent_at = self._guard.done()
+            if sent_at is not None:
+                self._breaker.record_success(time.monotonic() - sent_at)
+
+        await self.push_frame(frame, direction)
+
+
+def with_circuit_breaker(llm: LLMService) -> FrameProcessor:
+    """
+    Wraps an LLM service made by `ServiceFactory` so its responses feed the
+    circuit breaker of its provider and API key, and requests fail fast
+    (with an `ErrorFrame`) while that circuit is open.
+    """
+    breaker = circuit_breakers.for_service(llm)
+    if breaker is None:
+        return llm
+    guard = _CircuitBreakerGuard(breaker)
+    monitor = _CircuitBreakerMonitor(breaker, guard)
+    return Pipeline([guard, llm, monitor])
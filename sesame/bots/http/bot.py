@@ -1,10 +1,17 @@
-import asyncio
-from typing import Any, AsyncGenerator, Tuple, cast
-
-from bots.http.frame_serializer import BotFrameSerializer
+import math
+from typing import Any, Optional, cast
+
+from bots.http.llm_cache import cached_llm
+from bots.http.partial_response import PartialResponseProcessor
+from bots.http.session import HTTPBotSession, HTTPBotTurnCompletion, HTTPBotTurnOutput
+from bots.http.text_coalescer import BotLLMTextCoalescer
+from bots.circuit_breaker import with_circuit_breaker
+from bots.llm_router import check_llm_circuits, create_llm_router
 from bots.persistent_context import PersistentContext
+from bots.prompt_cache import PromptCacheUsageProcessor, cache_context_prefix
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotConfig, BotParams
+from common.errors import ServiceUnavailableError
 from common.models import Message, Service
 from common.service_factory import ServiceFactory, ServiceType
 from fastapi import HTTPException, status
@@ -13,15 +20,8 @@ from openai._types import NOT_GIVEN
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from pipecat.pipeline.pipeline import Pipeline
-from pipecat.pipeline.runner import PipelineRunner
-from pipecat.pipeline.task import PipelineTask
-from pipecat.processors.async_generator import AsyncGeneratorProcessor
-from pipecat.processors.frameworks.rtvi import (
-    RTVIActionRun,
-    RTVIBotLLMProcessor,
-    RTVIMessage,
-    RTVIProcessor,
-)
+from pipecat.pipeline.task import PipelineParams, PipelineTask
+from pipecat.processors.frameworks.rtvi import RTVIBotLLMProcessor
 from pipecat.services.ai_services import LLMService, OpenAILLMContext
 
 
@@ -32,7 +32,15 @@ async def http_bot_pipeline(
     messages,
     db: AsyncSession,
     language_code: str = "english",
-) -> Tuple[AsyncGenerator[Any, None], Any]:
+    prefix_length: int = 0,
+    workspace_id: Optional[str] = None,
+) -> HTTPBotSession:
+    """
+    The pipeline of a text conversation. The first `prefix_length` of
+    `messages` are the workspace's default context, which providers with
+    prompt caching can reuse across conversations. Cached LLM responses are
+    only shared within the conversation's workspace, `workspace_id`.
+    """
     if "llm" not in services:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -47,15 +55,41 @@ async def http_bot_pipeline(
                 ServiceType.ServiceLLM,
                 str(services["llm"].api_key),
                 getattr(services["llm"], "options"),
+                # Checked below, with routing the other providers may be up.
+                check_circuit=False,
             ),
         )
+        # Picks one of several LLM providers per turn, if the workspace has them.
+        llm_router = create_llm_router(config, services, llm)
+        check_llm_circuits(str(services["llm"].service_provider), llm, llm_router)
 
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating LLM service: {e}",
         )
 
+    llm_processor = llm_router or with_circuit_breaker(llm)
+    # Not with routing, the response may come from another provider than `llm`.
+    if config.llm_response_cache and not llm_router:
+        llm_processor = cached_llm(
+            llm_processor,
+            llm,
+            str(services["llm"].service_provider),
+            f"{workspace_id}:{services['llm'].api_key}",
+        )
+
+    if not llm_router:
+        messages = cache_context_prefix(
+            llm, str(services["llm"].service_provider), messages, prefix_length, config
+        )
+
     tools = NOT_GIVEN
     context = OpenAILLMContext(messages, tools)
     context_aggregator = llm.create_context_aggregator(
@@ -64,9 +98,7 @@ async def http_bot_pipeline(
     user_aggregator = context_aggregator.user()
     assistant_aggregator = context_aggregator.assistant()
 
-    storage = PersistentContext(context=context)
-
-    async_generator = AsyncGeneratorProcessor(serializer=BotFrameSerializer())
+    storage = PersistentContext(context=context, wal_key=str(params.conversation_id))
 
     #
     # RTVI
@@ -81,43 +113,57 @@ async def http_bot_pipeline(
     # This will send `bot-llm-*` messages.
     rtvi_bot_llm = RTVIBotLLMProcessor()
 
+    # Tracks the in-flight response so it can be stored if we are cancelled.
+    partial_response = PartialResponseProcessor()
+
+    coalescer = BotLLMTextCoalescer(window_secs=0)
+
+    output = HTTPBotTurnOutput()
+
+    completion = HTTPBotTurnCompletion()
+
     processors = [
         rtvi,
         user_aggregator,
         storage.create_processor(),
-        llm,
+        llm_processor,
+        PromptCacheUsageProcessor(str(services["llm"].service_provider), workspace_id),
+        partial_response,
         rtvi_bot_llm,
-        async_generator,
+        coalescer,
+        output,
         assistant_aggregator,
         storage.create_processor(exit_on_endframe=True),
+        completion,
     ]
 
     pipeline = Pipeline(processors)
 
-    runner = PipelineRunner(handle_sigint=False)
-
-    task = PipelineTask(pipeline)
-
-    runner_task = asyncio.create_task(runner.run(task))
+    # Usage metrics tell how much of the prompt providers read from their cache.
+    task = PipelineTask(pipeline, params=PipelineParams(enable_usage_metrics=True))
+
+    session = HTTPBotSession(
+        conversation_id=str(params.conversation_id),
+        db=db,
+        context=context,
+        storage=storage,
+        rtvi=rtvi,
+        task=task,
+        output=output,
+        completion=completion,
+        coalescer=coalescer,
+        partial_response=partial_response,
+    )
 
     @storage.on_context_message
     async def on_context_message(messages: list[Any]):
         logger.debug(f"{len(messages)} message(s) received for storage: {messages}")
+        if session.db is None:
+            raise RuntimeError("No database session available outside of a turn")
         try:
-            await Message.save_messages(params.conversation_id, language_code, messages, db)
+            await Message.save_messages(params.conversation_id, language_code, messages, session.db)
         except Exception as e:
             logger.error(f"Error storing messages: {e}")
             raise e
 
-    @rtvi.event_handler("on_bot_started")
-    async def on_bot_started(rtvi: RTVIProcessor):
-        for message in params.actions:
-            await rtvi.handle_message(message)
-
-        # This is a single turn, so we just push an action to stop the running
-        # pipeline task.
-        action = RTVIActionRun(service="system", action="end")
-        message = RTVIMessage(type="action", id="END", data=action.model_dump())
-        await rtvi.handle_message(message)
-
-    return (async_generator.generator(), runner_task)
+    return session
@@ -1,19 +1,79 @@
 import base64
 import json
+from enum import Enum
+from typing import Optional
 
 from pipecat.frames.frames import Frame, TransportMessageUrgentFrame
-from pipecat.serializers.base_serializer import FrameSerializer
+from pipecat.serializers.base_serializer import FrameSerializer, FrameSerializerType
 
+try:
+    import msgpack
+except ModuleNotFoundError:
+    # Optional, only needed for the `msgpack` stream format.
+    msgpack = None
+
+
+class StreamFormat(str, Enum):
+    """Wire formats supported by the `/rtvi/action` stream."""
+
+    BASE64 = "base64"  # SSE events carrying base64 encoded JSON (default, legacy)
+    JSON = "json"  # SSE events carrying plain JSON
+    MSGPACK = "msgpack"  # Concatenated msgpack documents over a chunked body
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-msgpack" if self is StreamFormat.MSGPACK else "text/event-stream"
+
+
+def negotiate_stream_format(requested: Optional[str], accept: Optional[str]) -> StreamFormat:
+    """Pick a stream format from an explicit request (query param) or the Accept header.
+
+    `Accept: application/x-msgpack` selects msgpack and
+    `Accept: text/event-stream; format=json` selects plain JSON events.
+    Raises ValueError for unknown or unavailable formats.
+    """
+    if requested:
+        try:
+            stream_format = StreamFormat(requested.lower())
+        except ValueError:
+            raise ValueError(
+                f"Unknown stream format '{requested}'. "
+                f"Must be one of: {', '.join(f.value for f in StreamFormat)}"
+            )
+    else:
+        accept = (accept or "").lower()
+        if "application/x-msgpack" in accept:
+            stream_format = StreamFormat.MSGPACK
+        elif "format=json" in accept.replace(" ", ""):
+            stream_format = StreamFormat.JSON
+        else:
+            stream_format = StreamFormat.BASE64
+
+    if stream_format is StreamFormat.MSGPACK and msgpack is None:
+        raise ValueError("The msgpack stream format requires `pip install msgpack`")
+
+    return stream_format
+
+
+def encode_response(
+    data: str | dict, stream_format: StreamFormat = StreamFormat.BASE64
+) -> str | bytes:
+    if stream_format is StreamFormat.MSGPACK:
+        data = json.loads(data) if isinstance(data, str) else data
+        return msgpack.packb(data)
 
-def encode_response(data: str | dict) -> str:
     data = data if isinstance(data, str) else json.dumps(data)
+    if stream_format is StreamFormat.JSON:
+        return f"data: {data}\n\n"
+
     encoded = base64.b64encode(data.encode("utf-8")).decode("utf-8")
     return f"data: {encoded}\n\n"
 
 
 class BotFrameSerializer(FrameSerializer):
-    def __init__(self):
+    def __init__(self, stream_format: StreamFormat = StreamFormat.BASE64):
         super().__init__()
+        self._stream_format = stream_format
 
     @property
     def type(self) -> str:
@@ -21,7 +81,29 @@ class BotFrameSerializer(FrameSerializer):
 
     def serialize(self, frame: Frame) -> str | bytes | None:
         if isinstance(frame, TransportMessageUrgentFrame):
-            return encode_response(frame.message)
+            return encode_response(frame.message, self._stream_format)
 
     def deserialize(self, data: str | bytes) -> Frame | None:
         return None
+
+
+class BotWebSocketSerializer(FrameSerializer):
+    """RTVI messages as plain JSON text, one per WebSocket message (`/rtvi/ws`)."""
+
+    @property
+    def type(self) -> FrameSerializerType:
+        return FrameSerializerType.TEXT
+
+    def serialize(self, frame: Frame) -> str | bytes | None:
+        if isinstance(frame, TransportMessageUrgentFrame):
+            message = frame.message
+            return message if isinstance(message, str) else json.dumps(message)
+
+    def deserialize(self, data: str | bytes) -> Frame | None:
+        try:
+            message = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+        if not isinstance(message, dict):
+            return None
+        return TransportMessageUrgentFrame(message=message)
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.frames.frames import (
+    ErrorFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMUpdateSettingsFrame,
+    MetricsFrame,
+    StartInterruptionFrame,
+    SystemFrame,
+    TextFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContextFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+# Size of the response cache of a process, 0 disables it for every workspace.
+LLM_CACHE_MAX_BYTES = int(os.getenv("SESAME_LLM_CACHE_MAX_MB", "32") or 0) * 1024 * 1024
+
+
+class LLMResponseCache:
+    """
+    Text chunks of LLM responses, as the provider streamed them, shared by
+    the sessions of a process. The least recently used responses are
+    dropped once the cache holds more than `max_bytes` of text.
+    """
+
+    def __init__(self, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+
+    @staticmethod
+    def key(
+        scope: str,
+        provider: str,
+        model: str,
+        settings: Dict[str, Any],
+        messages: List[Any],
+        tools: Any,
+    ) -> str:
+        data = json.dumps(
+            [scope, provider, model, settings, messages, tools], sort_keys=True, default=str
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    @staticmethod
+    def _entry_size(key: str, chunks: List[str]) -> int:
+        return len(key) + sum(len(chunk.encode()) for chunk in chunks)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        chunks = self._entries.get(key)
+        if chunks is not None:
+            self._entries.move_to_end(key)
+        return chunks
+
+    def put(self, key: str, chunks: List[str]):
+        size = self._entry_size(key, chunks)
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._size -= self._entry_size(key, self._entries.pop(key))
+        self._entries[key] = chunks
+        self._size += size
+        while self._size > self._max_bytes:
+            old_key, old_chunks = self._entries.popitem(last=False)
+            self._size -= self._entry_size(old_key, old_chunks)
+            Metrics.increment("llm_cache_evictions")
+
+
+llm_response_cache = LLMResponseCache()
+
+
+class _LLMCacheRecorder(FrameProcessor):
+    """After the LLM: records new responses and plays cached ones."""
+
+    def __init__(self, cache: LLMResponseCache):
+        super().__init__()
+        self._cache = cache
+        self._key: Optional[str] = None
+        self._chunks: Optional[List[str]] = None
+
+    def expect(self, key: str):
+        self._key = key
+        self._chunks = None
+
+    def abort(self):
+        self._key = None
+        self._chunks = None
+
+    async def play(self, chunks: List[str]):
+        await self.push_frame(LLMFullResponseStartFrame())
+        for chunk in chunks:
+            await self.push_frame(TextFrame(chunk))
+        await self.push_frame(LLMFullResponseEndFrame())
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if self._key and direction == FrameDirection.DOWNSTREAM:
+            if isinstance(frame, LLMFullResponseStartFrame):
+                self._chunks = []
+            elif self._chunks is not None:
+                if type(frame) is TextFrame:
+                    self._chunks.append(frame.text)
+                elif isinstance(frame, LLMFullResponseEndFrame):
+                    if self._chunks:
+                        self._cache.put(self._key, self._chunks)
+                    self.abort()
+                elif isinstance(frame, StartInterruptionFrame) or not isinstance(
+                    frame, (SystemFrame, MetricsFrame)
+                ):
+                    # Interrupted, or not only text (e.g. function calls).
+                    self.abort()
+
+        await self.push_frame(frame, direction)
+
+
+class _LLMCacheLookup(FrameProcessor):
+    """Before the LLM: answers requests from the cache."""
+
+    def __init__(
+        self,
+        llm: LLMService,
+        provider: str,
+        scope: str,
+        cache: LLMResponseCache,
+        recorder: _LLMCacheRecorder,
+    ):
+        super().__init__()
+        self._provider = provider
+        self._scope = scope
+        self._cache = cache
+        self._recorder = recorder
+        # The LLM's settings as they will be when it gets the next request,
+        # settings updates ahead of it may not have reached it yet.
+        self._model = llm.model_name
+        self._settings = dict(getattr(llm, "_settings", {}))
+
+    def _key(self, frame: OpenAILLMContextFrame) -> Optional[str]:
+        # Only responses that should come out the same every time.
+        if self._settings.get("temperature") != 0:
+            return None
+        context = frame.context
+        return LLMResponseCache.key(
+            self._scope,
+            self._provider,
+            self._model,
+            self._settings,
+            context.get_messages(),
+            context.tools,
+        )
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.UPSTREAM:
+            if isinstance(frame, ErrorFrame):
+                self._recorder.abort()
+            await self.push_frame(frame, direction)
+            return
+
+        if isinstance(frame, LLMUpdateSettingsFrame):
+            for name, value in frame.settings.items():
+                if name == "model":
+                    self._model = value
+                else:
+                    self._settings[name] = value
+        elif isinstance(frame, StartInterruptionFrame):
+            self._recorder.abort()
+        elif isinstance(frame, OpenAILLMContextFrame):
+            key = self._key(frame)
+            if key:
+                chunks = self._cache.get(key)
+                if chunks is not None:
+                    Metrics.increment("llm_cache_hits")
+                    logger.debug(f"Playing cached LLM response ({len(chunks)} chunks)")
+                    await self._recorder.play(chunks)
+                    return
+                Metrics.increment("llm_cache_misses")
+                self._recorder.expect(key)
+
+        await self.push_frame(frame, direction)
+
+
+def cached_llm(
+    processor: FrameProcessor,
+    llm: LLMService,
+    provider: str,
+    scope: str,
+    cache: Optional[LLMResponseCache] = None,
+) -> FrameProcessor:
+    """
+    Wraps the processor answering LLM requests (`llm` itself or one around
+    it) so requests at temperature 0 with the same context as an earlier one
+    are answered with its response, streamed in the same chunks, without a
+    request to `provider`. Responses are only replayed to requests with the
+    same `scope` (e.g. the workspace and API key they were made with).
+
+    `processor` must send every request to `llm`, the key is made from its
+    model and settings.
+    """
+    if not LLM_CACHE_MAX_BYTES and cache is None:
+        return processor
+    cache = cache or llm_response_cache
+    recorder = _LLMCacheRecorder(cache)
+    lookup = _LLMCacheLookup(llm, provider, scope, cache, recorder)
+    return Pipeline([lookup, processor, recorder])
@@ -0,0 +1,33 @@
+from pipecat.frames.frames import (
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+
+class PartialResponseProcessor(FrameProcessor):
+    """Keeps the text of the LLM response currently being generated.
+
+    Once the response is complete the text is handed over to the assistant
+    aggregator, so `text` is only non-empty while a response is in flight.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._text = ""
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, (LLMFullResponseStartFrame, LLMFullResponseEndFrame)):
+            self._text = ""
+        elif type(frame) is TextFrame:
+            self._text += frame.text
+
+        await self.push_frame(frame, direction)
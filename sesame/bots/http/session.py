@@ -0,0 +1,239 @@
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from bots.http.frame_serializer import BotFrameSerializer
+from bots.http.partial_response import PartialResponseProcessor
+from bots.http.text_coalescer import BotLLMTextCoalescer
+from bots.persistent_context import PersistentContext
+from common.metrics import Metrics
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pipecat.frames.frames import CancelFrame, ControlFrame, EndFrame, Frame
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.processors.frameworks.rtvi import (
+    ActionResult,
+    RTVIAction,
+    RTVIActionRun,
+    RTVIMessage,
+    RTVIProcessor,
+)
+from pipecat.serializers.base_serializer import FrameSerializer
+from pipecat.services.ai_services import OpenAILLMContext
+
+
+class HTTPBotTurnEndFrame(ControlFrame):
+    """Pushed after the actions of a request, marks the end of that request's output."""
+
+    pass
+
+
+class HTTPBotTurnOutput(FrameProcessor):
+    """Serializes the frames of the current turn into an async generator.
+
+    Works like pipecat's `AsyncGeneratorProcessor`, but the generator ends on
+    `HTTPBotTurnEndFrame` and the processor can be reused for the next turn.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._serializer: FrameSerializer = BotFrameSerializer()
+        self._data_queue: asyncio.Queue = asyncio.Queue()
+
+    def start_turn(self, serializer: FrameSerializer):
+        self._serializer = serializer
+        self._data_queue = asyncio.Queue()
+
+    def stop_turn(self):
+        self._data_queue.put_nowait(None)
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        await self.push_frame(frame, direction)
+
+        if isinstance(frame, (HTTPBotTurnEndFrame, CancelFrame, EndFrame)):
+            await self._data_queue.put(None)
+        else:
+            data = self._serializer.serialize(frame)
+            if data:
+                await self._data_queue.put(data)
+
+    async def generator(self) -> AsyncGenerator[Any, None]:
+        queue = self._data_queue
+        while True:
+            data = await queue.get()
+            if data is None:
+                break
+            yield data
+
+
+class HTTPBotTurnCompletion(FrameProcessor):
+    """Last processor of the pipeline, lets the session know a turn went all the way through."""
+
+    def __init__(self):
+        super().__init__()
+        self._done = asyncio.Event()
+
+    def start_turn(self):
+        self._done = asyncio.Event()
+
+    async def wait(self):
+        await self._done.wait()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        await self.push_frame(frame, direction)
+
+        if isinstance(frame, (HTTPBotTurnEndFrame, CancelFrame, EndFrame)):
+            self._done.set()
+
+
+class HTTPBotSession:
+    """
+    A running HTTP bot pipeline for one conversation.
+
+    Each `/rtvi/action` request (or `/rtvi/ws` message) is a turn: its
+    actions are fed into the pipeline and the output is streamed back until
+    `HTTPBotTurnEndFrame` reaches the end of the pipeline. Between turns the
+    pipeline (and the LLM service with its HTTP connections) stays up, so a
+    follow-up request doesn't pay for building it again. Turns must not
+    overlap, callers serialize them (see `HTTPBotSessionManager`).
+    """
+
+    def __init__(
+        self,
+        *,
+        conversation_id: str,
+        db: AsyncSession,
+        context: OpenAILLMContext,
+        storage: PersistentContext,
+        rtvi: RTVIProcessor,
+        task: PipelineTask,
+        output: HTTPBotTurnOutput,
+        completion: HTTPBotTurnCompletion,
+        coalescer: BotLLMTextCoalescer,
+        partial_response: PartialResponseProcessor,
+    ):
+        self.conversation_id = conversation_id
+        # Database session of the request currently being served.
+        self.db: Optional[AsyncSession] = db
+        self.fingerprint: Optional[str] = None
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self._context = context
+        self._storage = storage
+        self._rtvi = rtvi
+        self._task = task
+        self._output = output
+        self._completion = completion
+        self._coalescer = coalescer
+        self._partial_response = partial_response
+        self._runner_task: Optional[asyncio.Task] = None
+        self._started = asyncio.Event()
+        self._in_turn = False
+
+        rtvi.register_action(
+            RTVIAction(
+                service="system",
+                action="end_turn",
+                result="bool",
+                handler=self._action_end_turn_handler,
+            )
+        )
+
+        @rtvi.event_handler("on_bot_started")
+        async def on_bot_started(rtvi: RTVIProcessor):
+            self._started.set()
+
+    @property
+    def closed(self) -> bool:
+        return self._runner_task is not None and self._runner_task.done()
+
+    @property
+    def in_turn(self) -> bool:
+        return self._in_turn
+
+    @property
+    def message_count(self) -> int:
+        return len(self._context.get_messages_for_persistent_storage())
+
+    def start(self):
+        runner = PipelineRunner(handle_sigint=False)
+        self._runner_task = asyncio.create_task(runner.run(self._task))
+
+    async def run_turn(
+        self,
+        actions: List[RTVIMessage],
+        db: AsyncSession,
+        serializer: FrameSerializer,
+        coalesce_secs: float = 0,
+    ) -> AsyncGenerator[Any, None]:
+        self._in_turn = True
+        self.db = db
+        # The turn's messages are durable once the request commits `db`.
+        self._storage.track_transaction(db)
+        self._output.start_turn(serializer)
+        self._completion.start_turn()
+        self._coalescer.window_secs = coalesce_secs
+
+        await self._started.wait()
+
+        for message in actions:
+            await self._rtvi.handle_message(message)
+
+        # Actions run in order, so this marker follows everything the
+        # actions above pushed into the pipeline. No id, no response.
+        action = RTVIActionRun(service="system", action="end_turn")
+        await self._rtvi.handle_message(RTVIMessage(type="action", id="", data=action.model_dump()))
+
+        async for data in self._output.generator():
+            yield data
+
+        await self._completion.wait()
+        # Make sure this turn's messages are stored with this request's
+        # database session before it is committed.
+        await self._storage.flush()
+
+        self.db = None
+        self.turns += 1
+        self.last_used = time.monotonic()
+        self._in_turn = False
+
+    async def cancel(self):
+        """Stop generating (e.g. the client went away) and store what we have so far."""
+        if self._runner_task is None or self._runner_task.done():
+            return
+
+        logger.info(f"Cancelling bot pipeline for conversation {self.conversation_id}")
+        Metrics.increment("http_bot_cancelled")
+
+        await self._task.cancel()
+        await self._runner_task
+        self._output.stop_turn()
+
+        if self._partial_response.text:
+            Metrics.increment("http_bot_cancelled_partial_responses")
+            self._context.add_message({"role": "assistant", "content": self._partial_response.text})
+            await self._storage.save(self._context)
+        # Stored with the request's database session before the caller commits it.
+        await self._storage.flush()
+        await self._storage.close()
+
+    async def close(self):
+        """Shut the pipeline down once it's idle."""
+        if self._runner_task is not None and not self._runner_task.done():
+            logger.debug(f"Closing bot pipeline for conversation {self.conversation_id}")
+            await self._task.queue_frame(EndFrame())
+            await self._runner_task
+        await self._storage.close()
+
+    async def _action_end_turn_handler(
+        self, rtvi: RTVIProcessor, service: str, arguments: Dict[str, Any]
+    ) -> ActionResult:
+        await rtvi.push_frame(HTTPBotTurnEndFrame())
+        return True
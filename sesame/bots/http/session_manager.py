@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from bots.types import BotConfig
+from common.metrics import Metrics
+from common.models import Service
+from loguru import logger
+
+if TYPE_CHECKING:
+    from bots.http.session import HTTPBotSession
+
+# Maximum number of warm HTTP bot pipelines kept by a single worker process.
+# 0 disables persistent sessions (every request builds and tears down its
+# own pipeline).
+MAX_SESSIONS = int(os.getenv("SESAME_HTTP_BOT_MAX_SESSIONS", "50"))
+# Sessions idle for longer than this are shut down.
+SESSION_IDLE_TIMEOUT_SECONDS = float(os.getenv("SESAME_HTTP_BOT_SESSION_IDLE_TIMEOUT", "300"))
+
+
+def session_fingerprint(config: BotConfig, services: Dict[str, Service]) -> str:
+    """Identifies the configuration a session was built with."""
+    llm = services.get("llm")
+    data = {
+        "config": config.model_dump(mode="json"),
+        "llm": [
+            str(getattr(llm, "service_provider", None)),
+            str(getattr(llm, "api_key", None)),
+            getattr(llm, "options", None),
+        ],
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.session: Optional["HTTPBotSession"] = None
+
+
+class HTTPBotSessionSlot:
+    """A conversation checked out from `HTTPBotSessionManager.checkout()`."""
+
+    def __init__(self, manager: "HTTPBotSessionManager", key: str, entry: _Entry):
+        self._manager = manager
+        self._key = key
+        self._entry = entry
+        self._one_shot: Optional["HTTPBotSession"] = None
+
+    @property
+    def session(self) -> Optional["HTTPBotSession"]:
+        return self._one_shot or self._entry.session
+
+    async def get(
+        self,
+        fingerprint: str,
+        message_count: int,
+        create: Callable[[], Awaitable["HTTPBotSession"]],
+    ) -> "HTTPBotSession":
+        """
+        Return the warm session for this conversation, or build one with `create`.
+
+        An existing session is only reused if it was built with the same
+        configuration and its context has the same number of messages as the
+        database (i.e. nobody else changed the conversation in the meantime).
+        """
+        session = self._entry.session
+        if session is not None:
+            if (
+                not session.closed
+                and session.fingerprint == fingerprint
+                and session.message_count == message_count
+            ):
+                Metrics.increment("http_bot_sessions_reused")
+                return session
+            logger.debug(f"Discarding stale bot session for conversation {session.conversation_id}")
+            self._entry.session = None
+            await session.close()
+
+        session = await create()
+        session.fingerprint = fingerprint
+        session.start()
+
+        if await self._manager._make_room(self._entry):
+            self._entry.session = session
+            Metrics.increment("http_bot_sessions_created")
+        else:
+            # Every warm session is busy, serve this request without keeping it.
+            self._one_shot = session
+            Metrics.increment("http_bot_sessions_one_shot")
+        return session
+
+
+class HTTPBotSessionManager:
+    """
+    Keeps a warm `HTTPBotSession` per active conversation, per worker process.
+
+    Requests for the same conversation are serialized. Sessions are shut down
+    after `idle_timeout` seconds without requests, and at most `max_sessions`
+    are kept: the least recently used idle session is evicted to make room.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT_SECONDS,
+    ):
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    @property
+    def session_count(self) -> int:
+        return sum(1 for entry in self._entries.values() if entry.session is not None)
+
+    @asynccontextmanager
+    async def checkout(self, key: str) -> AsyncIterator[HTTPBotSessionSlot]:
+        if self._reaper_task is None and self._max_sessions > 0 and self._idle_timeout > 0:
+            self._reaper_task = asyncio.create_task(self._reaper())
+
+        entry = self._entries.setdefault(key, _Entry())
+        self._entries.move_to_end(key)
+        entry.users += 1
+        try:
+            async with entry.lock:
+                slot = HTTPBotSessionSlot(self, key, entry)
+                try:
+                    yield slot
+                finally:
+                    session = entry.session
+                    if session is not None and (session.closed or session.in_turn):
+                        # The turn didn't finish (cancelled or failed), the
+                        # pipeline state can't be trusted anymore.
+                        entry.session = None
+                        await asyncio.shield(self._discard(session))
+                    if slot._one_shot is not None:
+                        await asyncio.shield(self._discard(slot._one_shot))
+        finally:
+            entry.users -= 1
+            if entry.users == 0 and entry.session is None:
+                self._entries.pop(key, None)
+
+    async def close(self):
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+        for entry in list(self._entries.values()):
+            if entry.session is not None and not entry.lock.locked():
+                session, entry.session = entry.session, None
+                await self._discard(session)
+
+    async def _make_room(self, entry: _Entry) -> bool:
+        if self.session_count < self._max_sessions:
+            return True
+        # Least recently used first.
+        for key, candidate in list(self._entries.items()):
+            if candidate is entry or candidate.session is None or candidate.lock.locked():
+                continue
+            session, candidate.session = candidate.session, None
+            if candidate.users == 0:
+                self._entries.pop(key, None)
+            Metrics.increment("http_bot_sessions_evicted")
+            await self._discard(session)
+            if self.session_count < self._max_sessions:
+                return True
+        return False
+
+    async def _discard(self, session: "HTTPBotSession"):
+        try:
+            if session.in_turn:
+                await session.cancel()
+            await session.close()
+        except Exception as e:
+            logger.error(f"Error closing bot session for {session.conversation_id}: {e}")
+
+    async def _reaper(self):
+        interval = max(self._idle_timeout / 2, 1)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for key, entry in list(self._entries.items()):
+                session = entry.session
+                if (
+                    session is None
+                    or entry.lock.locked()
+                    or now - session.last_used < self._idle_timeout
+                ):
+                    continue
+                logger.debug(f"Closing idle bot session for conversation {session.conversation_id}")
+                entry.session = None
+                if entry.users == 0:
+                    self._entries.pop(key, None)
+                Metrics.increment("http_bot_sessions_expired")
+                await self._discard(session)
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Optional
+
+from pipecat.frames.frames import CancelFrame, ControlFrame, Frame, TransportMessageUrgentFrame
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+
+class BotLLMTextCoalescer(FrameProcessor):
+    """Merges consecutive `bot-llm-text` messages into a single message.
+
+    Text is buffered until `window_secs` have passed since the first buffered
+    token or `max_chars` have been collected, whichever comes first. Any other
+    message or control frame flushes the buffer first so message order is
+    preserved. A window of 0 disables coalescing.
+    """
+
+    def __init__(self, *, window_secs: float, max_chars: int = 512):
+        super().__init__()
+        self._window_secs = window_secs
+        self._max_chars = max_chars
+        self._buffer: Optional[dict] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def window_secs(self) -> float:
+        return self._window_secs
+
+    @window_secs.setter
+    def window_secs(self, window_secs: float):
+        self._window_secs = window_secs
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if (
+            self._window_secs > 0
+            and direction == FrameDirection.DOWNSTREAM
+            and isinstance(frame, TransportMessageUrgentFrame)
+            and isinstance(frame.message, dict)
+            and frame.message.get("type") == "bot-llm-text"
+        ):
+            await self._buffer_text(frame.message)
+            return
+
+        if isinstance(frame, (TransportMessageUrgentFrame, ControlFrame, CancelFrame)):
+            await self._flush()
+
+        await self.push_frame(frame, direction)
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    async def _buffer_text(self, message: dict):
+        async with self._lock:
+            if self._buffer is None:
+                self._buffer = {**message, "data": {**message.get("data", {})}}
+                self._flush_task = self.get_event_loop().create_task(self._flush_after_window())
+            else:
+                self._buffer["data"]["text"] += message.get("data", {}).get("text", "")
+            full = len(self._buffer["data"].get("text", "")) >= self._max_chars
+
+        if full:
+            await self._flush()
+
+    async def _flush_after_window(self):
+        try:
+            await asyncio.sleep(self._window_secs)
+        except asyncio.CancelledError:
+            return
+        await self._flush(from_timer=True)
+
+    async def _flush(self, from_timer: bool = False):
+        async with self._lock:
+            message, self._buffer = self._buffer, None
+            if self._flush_task and not from_timer:
+                self._flush_task.cancel()
+            self._flush_task = None
+            if message is not None:
+                await self.push_frame(TransportMessageUrgentFrame(message=message))
@@ -0,0 +1,437 @@
+import asyncio
+import os
+import statistics
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple, cast
+
+from bots.types import BotConfig
+from common.circuit_breaker import circuit_breakers
+from common.errors import ServiceUnavailableError
+from common.metrics import Metrics
+from common.models import Service
+from common.service_factory import ServiceFactory, ServiceType
+from loguru import logger
+
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    ErrorFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMMessagesFrame,
+    LLMUpdateSettingsFrame,
+    MetricsFrame,
+    StartFrame,
+    StartInterruptionFrame,
+    SystemFrame,
+    TextFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+# Time to first token is averaged over the responses of this many seconds.
+ROUTING_WINDOW_SECS = float(os.getenv("SESAME_LLM_ROUTING_WINDOW", "300") or 300)
+# A provider that failed is only used when no other one is left for this long.
+ROUTING_FAILURE_COOLDOWN_SECS = float(os.getenv("SESAME_LLM_ROUTING_FAILURE_COOLDOWN", "30") or 0)
+# Ask the next provider too when the first hasn't produced a token by then (0 disables).
+HEDGE_MS = int(os.getenv("SESAME_LLM_HEDGE_MS", "0") or 0)
+
+_MAX_SAMPLES = 50
+
+
+class LLMRoute:
+    def __init__(self, provider: str, llm: LLMService, weight: float = 1.0):
+        self.provider = provider
+        self.llm = llm
+        self.weight = weight if weight > 0 else 1.0
+        # Set for the services `ServiceFactory` made.
+        self.breaker = circuit_breakers.for_service(llm)
+
+
+class LLMLatencyTracker:
+    """
+    Rolling time to first token and recent failures of LLM providers,
+    shared by the sessions of a process.
+    """
+
+    def __init__(
+        self,
+        window_secs: float = ROUTING_WINDOW_SECS,
+        failure_cooldown_secs: float = ROUTING_FAILURE_COOLDOWN_SECS,
+    ):
+        self._window_secs = window_secs
+        self._failure_cooldown_secs = failure_cooldown_secs
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = defaultdict(
+            lambda: deque(maxlen=_MAX_SAMPLES)
+        )
+        self._failed_at: Dict[str, float] = {}
+
+    def record(self, provider: str, ttft: float, now: Optional[float] = None):
+        self._samples[provider].append((time.monotonic() if now is None else now, ttft))
+
+    def record_failure(self, provider: str, now: Optional[float] = None):
+        self._failed_at[provider] = time.monotonic() if now is None else now
+
+    def ttft(self, provider: str, now: Optional[float] = None) -> Optional[float]:
+        """Median time to first token within the window, None without recent responses."""
+        now = time.monotonic() if now is None else now
+        samples = self._samples.get(provider)
+        if not samples:
+            return None
+        while samples and now - samples[0][0] > self._window_secs:
+            samples.popleft()
+        return statistics.median(ttft for _, ttft in samples) if samples else None
+
+    def healthy(self, provider: str, now: Optional[float] = None) -> bool:
+        failed_at = self._failed_at.get(provider)
+        if failed_at is None:
+            return True
+        now = time.monotonic() if now is None else now
+        return now - failed_at > self._failure_cooldown_secs
+
+    def rank(self, routes: List[LLMRoute], now: Optional[float] = None) -> List[LLMRoute]:
+        """
+        Routes to try, best first: healthy before failed ones, then providers
+        without recent responses (in the order given, so each gets measured)
+        and then by time to first token divided by weight.
+        """
+        now = time.monotonic() if now is None else now
+
+        def key(item: Tuple[int, LLMRoute]):
+            index, route = item
+            ttft = self.ttft(route.provider, now)
+            return (
+                not self.healthy(route.provider, now),
+                ttft is not None,
+                (ttft or 0) / route.weight,
+                index,
+            )
+
+        return [route for _, route in sorted(enumerate(routes), key=key)]
+
+
+latency_tracker = LLMLatencyTracker()
+
+
+class _Attempt:
+    def __init__(self, route: LLMRoute, hedge: bool):
+        self.route = route
+        self.hedge = hedge
+        self.sent_at = time.monotonic()
+        # Frames before its response started are left from an earlier request.
+        self.started = False
+        self.frames: List[Frame] = []
+
+
+class _RouteSink(FrameProcessor):
+    """Receives what the LLM service of a route pushes."""
+
+    def __init__(self, router: "LLMRouter", route: LLMRoute):
+        super().__init__()
+        self._router = router
+        self._route = route
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.DOWNSTREAM:
+            await self._router.on_route_frame(self._route, frame)
+        elif isinstance(frame, ErrorFrame):
+            await self._router.on_route_error(self._route, frame)
+
+
+class LLMRouter(FrameProcessor):
+    """
+    Goes where the LLM service would and sends each turn to the provider
+    with the lowest recent time to first token (see `LLMLatencyTracker`).
+
+    With `hedge_secs`, the next provider gets the same request when the
+    first hasn't produced a token by then. The first response to produce
+    one is used and the other is cancelled. A provider failing before its
+    first token hands the turn to the next one, and providers whose circuit
+    is open (see `common.circuit_breaker`) are skipped.
+
+    Settings updates only go to `primary`, the service that made the
+    context aggregators. Counts turns, hedges and hedges that won
+    (`llm_routed_turns`, `llm_hedges`, `llm_hedge_wins`).
+    """
+
+    def __init__(
+        self,
+        routes: List[LLMRoute],
+        primary: LLMService,
+        hedge_secs: float = HEDGE_MS / 1000,
+        tracker: LLMLatencyTracker = latency_tracker,
+    ):
+        super().__init__()
+        self._routes = routes
+        self._primary = primary
+        self._hedge_secs = hedge_secs
+        self._tracker = tracker
+        self._context: Optional[OpenAILLMContext] = None
+        self._candidates: List[LLMRoute] = []
+        self._attempts: Dict[str, _Attempt] = {}
+        self._winner: Optional[_Attempt] = None
+        self._hedge_task: Optional[asyncio.Task] = None
+        self._sinks: List[_RouteSink] = []
+        for route in routes:
+            # One sink after the service for its responses and one before
+            # it for the errors it pushes upstream.
+            upstream, downstream = _RouteSink(self, route), _RouteSink(self, route)
+            upstream.link(route.llm)
+            route.llm.link(downstream)
+            self._sinks += [upstream, downstream]
+
+    @property
+    def providers(self) -> Dict[str, str]:
+        """The provider of each route, by the name of its LLM service."""
+        return {route.llm.name: route.provider for route in self._routes}
+
+    def retry_after(self) -> Optional[float]:
+        """Seconds until the circuit of a route lets requests through, None if one does now."""
+        waits = []
+        for route in self._routes:
+            wait = route.breaker.retry_after() if route.breaker else None
+            if wait is None:
+                return None
+            waits.append(wait)
+        return min(waits)
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._cancel_hedge()
+        for route in self._routes:
+            await route.llm.cleanup()
+        for sink in self._sinks:
+            await sink.cleanup()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction != FrameDirection.DOWNSTREAM:
+            await self.push_frame(frame, direction)
+            return
+
+        if isinstance(frame, (StartFrame, EndFrame, CancelFrame)):
+            for route in self._routes:
+                await route.llm.queue_frame(frame)
+            if isinstance(frame, (EndFrame, CancelFrame)):
+                self._cancel_hedge()
+        elif isinstance(frame, LLMUpdateSettingsFrame):
+            await self._primary.queue_frame(frame)
+        elif isinstance(frame, StartInterruptionFrame):
+            await self._stop_attempts()
+        elif isinstance(frame, OpenAILLMContextFrame):
+            await self._start_turn(frame.context)
+            return
+        elif isinstance(frame, LLMMessagesFrame):
+            await self._start_turn(OpenAILLMContext.from_messages(frame.messages))
+            return
+
+        await self.push_frame(frame, direction)
+
+    async def _start_turn(self, context: OpenAILLMContext):
+        await self._stop_attempts()
+        self._context = context
+        self._winner = None
+        self._candidates = self._tracker.rank(self._routes)
+        Metrics.increment("llm_routed_turns")
+        if not await self._attempt_next(hedge=False):
+            await self.push_error(ErrorFrame("All LLM providers unavailable, try again later"))
+            return
+        if self._hedge_secs > 0 and self._candidates:
+            self._hedge_task = asyncio.create_task(self._hedge())
+
+    async def _attempt_next(self, hedge: bool) -> bool:
+        if not self._context:
+            return False
+        # Providers whose circuit is open are skipped.
+        route = None
+        while self._candidates and not route:
+            route = self._candidates.pop(0)
+            if route.breaker and not route.breaker.allow():
+                logger.debug(f"Circuit of LLM provider {route.provider} is open, skipping it")
+                route = None
+        if not route:
+            return False
+        # Every provider gets its own copy, in the standard format, to
+        # convert to its own.
+        context = OpenAILLMContext(
+            messages=self._context.get_messages_for_persistent_storage(),
+            tools=self._context.tools,
+            tool_choice=self._context.tool_choice,
+        )
+        self._attempts[route.provider] = _Attempt(route, hedge)
+        logger.debug(f"Routing LLM request to {route.provider}{' (hedge)' if hedge else ''}")
+        await route.llm.queue_frame(OpenAILLMContextFrame(context))
+        return True
+
+    async def _hedge(self):
+        await asyncio.sleep(self._hedge_secs)
+        self._hedge_task = None
+        if self._winner or not self._attempts:
+            return
+        if await self._attempt_next(hedge=True):
+            Metrics.increment("llm_hedges")
+
+    def _cancel_hedge(self):
+        if self._hedge_task:
+            self._hedge_task.cancel()
+            self._hedge_task = None
+
+    async def _stop_attempts(self, keep: Optional[_Attempt] = None):
+        self._cancel_hedge()
+        for provider, attempt in list(self._attempts.items()):
+            if attempt is keep:
+                continue
+            del self._attempts[provider]
+            if attempt.route.breaker:
+                attempt.route.breaker.record_abandoned(time.monotonic() - attempt.sent_at)
+            await attempt.route.llm.queue_frame(StartInterruptionFrame())
+
+    async def _win(self, attempt: _Attempt):
+        now = time.monotonic()
+        self._winner = attempt
+        if any(isinstance(frame, TextFrame) for frame in attempt.frames):
+            self._tracker.record(attempt.route.provider, now - attempt.sent_at, now)
+        if attempt.route.breaker:
+            attempt.route.breaker.record_success(now - attempt.sent_at, now)
+        for other in self._attempts.values():
+            if other is not attempt:
+                # Not done yet: its time to first token is at least this.
+                self._tracker.record(other.route.provider, now - other.sent_at, now)
+        if attempt.hedge:
+            Metrics.increment("llm_hedge_wins")
+        await self._stop_attempts(keep=attempt)
+
+        frames, attempt.frames = attempt.frames, []
+        for frame in frames:
+            await self._push_response_frame(attempt, frame)
+
+    async def _push_response_frame(self, attempt: _Attempt, frame: Frame):
+        await self.push_frame(frame)
+        if isinstance(frame, LLMFullResponseEndFrame):
+            self._attempts.pop(attempt.route.provider, None)
+
+    async def on_route_frame(self, route: LLMRoute, frame: Frame):
+        attempt = self._attempts.get(route.provider)
+        if isinstance(frame, (SystemFrame, EndFrame)):
+            # The services' own start, stop and interruption frames. Only
+            # the metrics of the response used are of interest, its time to
+            # first token comes before the token that makes it win (and, as
+            # a system frame, maybe before the start of its response).
+            if isinstance(frame, MetricsFrame) and attempt:
+                if attempt is self._winner:
+                    await self.push_frame(frame)
+                else:
+                    attempt.frames.append(frame)
+            return
+        if not attempt:
+            return
+        if attempt is self._winner:
+            await self._push_response_frame(attempt, frame)
+            return
+
+        if not attempt.started:
+            if not isinstance(frame, LLMFullResponseStartFrame):
+                return
+            attempt.started = True
+        attempt.frames.append(frame)
+        if isinstance(frame, (TextFrame, LLMFullResponseEndFrame)):
+            await self._win(attempt)
+
+    async def on_route_error(self, route: LLMRoute, error: ErrorFrame):
+        logger.warning(f"LLM provider {route.provider} failed: {error.error}")
+        self._tracker.record_failure(route.provider)
+        Metrics.increment("llm_route_failures")
+        attempt = self._attempts.get(route.provider)
+        if not attempt:
+            return
+        if route.breaker and attempt is not self._winner:
+            route.breaker.record_failure()
+        if attempt is self._winner:
+            # Too late to switch, part of the response is out.
+            await self.push_error(error)
+            return
+
+        del self._attempts[route.provider]
+        if self._attempts:
+            # Another provider is on it already.
+            return
+        self._cancel_hedge()
+        if not await self._attempt_next(hedge=False):
+            await self.push_error(ErrorFrame(f"All LLM providers failed, last: {error.error}"))
+
+
+def create_llm_router(
+    config: BotConfig, services: Dict[str, Service], llm: LLMService
+) -> Optional[LLMRouter]:
+    """
+    A router over `llm` (the workspace's `llm` service) and the providers
+    in `config.llm_routing`, whose services are in `services` as
+    `llm:<provider>`. None if routing isn't configured or nothing is left
+    to route to.
+    """
+    routing = config.llm_routing
+    if not routing:
+        return None
+
+    primary = str(services["llm"].service_provider)
+    routes = []
+    for route_config in routing.providers:
+        if route_config.provider == primary:
+            routes.append(LLMRoute(primary, llm, route_config.weight))
+            continue
+        service = services.get(f"llm:{route_config.provider}")
+        if not service:
+            logger.warning(
+                f"No service for LLM provider {route_config.provider}, not routing to it"
+            )
+            continue
+        try:
+            route_llm = cast(
+                LLMService,
+                ServiceFactory.get_service(
+                    route_config.provider,
+                    ServiceType.ServiceLLM,
+                    str(service.api_key),
+                    getattr(service, "options"),
+                    # Skipped by the router while it's open.
+                    check_circuit=False,
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"Unable to create LLM provider {route_config.provider}: {e}")
+            continue
+        routes.append(LLMRoute(route_config.provider, route_llm, route_config.weight))
+
+    if not any(route.llm is llm for route in routes):
+        # Not listed, the workspace's own provider goes first.
+        routes.insert(0, LLMRoute(primary, llm))
+    if len(routes) < 2:
+        return None
+
+    hedge_ms = routing.hedge_ms if routing.hedge_ms is not None else HEDGE_MS
+    return LLMRouter(routes, llm, hedge_secs=hedge_ms / 1000)
+
+
+def check_llm_circuits(provider: str, llm: LLMService, router: Optional[LLMRouter]):
+    """
+    Raises `ServiceUnavailableError` while no provider can take requests:
+    every route of `router` has its circuit open or, without one, `llm` (of
+    `provider`, made with `check_circuit=False`) has.
+    """
+    if router:
+        retry_after = router.retry_after()
+        provider = ", ".join(route.provider for route in router._routes)
+    else:
+        breaker = circuit_breakers.for_service(llm)
+        retry_after = breaker.retry_after() if breaker else None
+    if retry_after is not None:
+        raise ServiceUnavailableError(provider, ServiceType.ServiceLLM.value, retry_after)
@@ -0,0 +1,305 @@
+"""
+Offline stand-ins for the STT, LLM, TTS and transport providers, registered
+in `ServiceFactory` as the `mock` provider of each service type when
+`SESAME_MOCK_SERVICES` is set. Workspaces select them in their `services`
+like any other provider (with a service entry whose API key is ignored)
+and configure them with the service's `options`, so the bot pipelines can
+be benchmarked end to end without calling anyone.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import AsyncGenerator, List, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from pipecat.audio.utils import resample_audio
+from pipecat.frames.frames import (
+    AudioRawFrame,
+    CancelFrame,
+    EndFrame,
+    Frame,
+    InputAudioRawFrame,
+    StartFrame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import LLMTokenUsage
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.services.ai_services import STTService, TTSService
+from pipecat.services.openai import OpenAILLMService
+from pipecat.transcriptions.language import Language
+from pipecat.transports.base_input import BaseInputTransport
+from pipecat.transports.base_output import BaseOutputTransport
+from pipecat.transports.base_transport import BaseTransport, TransportParams
+from pipecat.utils.time import time_now_iso8601
+
+_WORDS = (
+    "the quick brown fox jumps over the lazy dog while a curious student asks "
+    "one more question about the lesson"
+).split()
+# A sentence ends every this many tokens, for the TTS sentence aggregation.
+_SENTENCE_TOKENS = 12
+_AUDIO_IN_CHUNK_SECS = 0.02
+_AUDIO_OUT_CHUNK_SECS = 0.1
+
+
+class MockLLMService(OpenAILLMService):
+    """
+    Streams `tokens` words after `ttft_ms`, at `tokens_per_sec`. Works with
+    the OpenAI context aggregators and settings, without a client.
+    """
+
+    def __init__(
+        self,
+        *,
+        model: str = "mock",
+        tokens: int = 50,
+        tokens_per_sec: float = 50,
+        ttft_ms: int = 300,
+        **kwargs,
+    ):
+        super().__init__(model=model, **kwargs)
+        self._tokens = tokens
+        self._token_interval = 1 / tokens_per_sec if tokens_per_sec > 0 else 0
+        self._ttft = ttft_ms / 1000
+
+    def create_client(self, api_key=None, base_url=None, **kwargs):
+        return None
+
+    def can_generate_metrics(self) -> bool:
+        return True
+
+    async def _process_context(self, context: OpenAILLMContext):
+        await self.start_ttfb_metrics()
+        await asyncio.sleep(self._ttft)
+        await self.stop_ttfb_metrics()
+
+        for i in range(self._tokens):
+            if i:
+                await asyncio.sleep(self._token_interval)
+            word = _WORDS[i % len(_WORDS)]
+            end = "." if (i + 1) % _SENTENCE_TOKENS == 0 or i == self._tokens - 1 else ""
+            await self.push_frame(TextFrame(f"{word}{end} "))
+
+        # About four characters a token.
+        prompt_tokens = len(str(context.get_messages())) // 4
+        await self.start_llm_usage_metrics(
+            LLMTokenUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=self._tokens,
+                total_tokens=prompt_tokens + self._tokens,
+            )
+        )
+
+
+class MockTTSService(TTSService):
+    """Silent audio as long as `words_per_minute` makes the text, after `latency_ms`."""
+
+    def __init__(
+        self,
+        *,
+        voice_id: str = "mock",
+        latency_ms: int = 150,
+        words_per_minute: int = 160,
+        sample_rate: int = 24000,
+        **kwargs,
+    ):
+        super().__init__(sample_rate=sample_rate, **kwargs)
+        self.set_voice(voice_id)
+        self.set_model_name("mock")
+        self._latency = latency_ms / 1000
+        self._words_per_minute = words_per_minute
+
+    def can_generate_metrics(self) -> bool:
+        return True
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        await self.start_ttfb_metrics()
+        await asyncio.sleep(self._latency)
+        await self.start_tts_usage_metrics(text)
+        await self.stop_ttfb_metrics()
+
+        yield TTSStartedFrame()
+        seconds = len(text.split()) * 60 / self._words_per_minute
+        chunk = bytes(int(self.sample_rate * _AUDIO_OUT_CHUNK_SECS) * 2)
+        for _ in range(max(1, round(seconds / _AUDIO_OUT_CHUNK_SECS))):
+            yield TTSAudioRawFrame(audio=chunk, sample_rate=self.sample_rate, num_channels=1)
+        yield TTSStoppedFrame()
+
+
+class MockSTTService(STTService):
+    """
+    Says the user spoke the next of `transcripts` (round robin) every
+    `interval_secs` of input audio.
+    """
+
+    def __init__(
+        self,
+        *,
+        transcripts: Optional[List[str]] = None,
+        interval_secs: float = 5,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.set_model_name("mock")
+        self._transcripts = transcripts or ["Hello, can you help me with my homework?"]
+        self._interval_secs = interval_secs
+        self._audio_secs = 0.0
+        self._transcript_index = 0
+
+    async def set_model(self, model: str):
+        self.set_model_name(model)
+
+    async def set_language(self, language: Language):
+        pass
+
+    async def run_stt(self, audio: bytes) -> AsyncGenerator[Frame, None]:
+        yield UserStartedSpeakingFrame()
+        text = self._transcripts[self._transcript_index % len(self._transcripts)]
+        self._transcript_index += 1
+        yield TranscriptionFrame(text, "mock-user", time_now_iso8601())
+        yield UserStoppedSpeakingFrame()
+
+    async def process_audio_frame(self, frame: AudioRawFrame):
+        if self._muted:
+            return
+        self._audio_secs += len(frame.audio) / (2 * frame.num_channels * frame.sample_rate)
+        if self._audio_secs >= self._interval_secs:
+            self._audio_secs -= self._interval_secs
+            await self.process_generator(self.run_stt(frame.audio))
+
+
+class _MockInputTransport(BaseInputTransport):
+    """Audio at real-time pace: what the output played, or silence."""
+
+    def __init__(self, transport: "MockTransport", params: TransportParams):
+        super().__init__(params)
+        self._transport = transport
+        self._audio_clock_task: Optional[asyncio.Task] = None
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        if not self._audio_clock_task:
+            self._audio_clock_task = asyncio.create_task(self._audio_clock())
+        await self._transport.joined()
+
+    async def stop(self, frame: EndFrame):
+        await self._stop_audio_clock()
+        await super().stop(frame)
+
+    async def cancel(self, frame: CancelFrame):
+        await self._stop_audio_clock()
+        await super().cancel(frame)
+
+    async def _stop_audio_clock(self):
+        if self._audio_clock_task:
+            self._audio_clock_task.cancel()
+            try:
+                await self._audio_clock_task
+            except asyncio.CancelledError:
+                pass
+            self._audio_clock_task = None
+
+    async def _audio_clock(self):
+        sample_rate = self._params.audio_in_sample_rate
+        num_channels = self._params.audio_in_channels
+        size = int(sample_rate * _AUDIO_IN_CHUNK_SECS) * num_channels * 2
+        next_at = time.monotonic()
+        while True:
+            audio = self._transport.loopback_read(size, sample_rate)
+            await self.push_audio_frame(
+                InputAudioRawFrame(audio=audio, sample_rate=sample_rate, num_channels=num_channels)
+            )
+            next_at += _AUDIO_IN_CHUNK_SECS
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+
+class _MockOutputTransport(BaseOutputTransport):
+    """Plays audio by waiting as long as it lasts, and sends it back to the input."""
+
+    def __init__(self, transport: "MockTransport", params: TransportParams):
+        super().__init__(params)
+        self._transport = transport
+
+    async def write_raw_audio_frames(self, frames: bytes):
+        sample_rate = self._params.audio_out_sample_rate
+        self._transport.loopback_write(frames, sample_rate)
+        await asyncio.sleep(len(frames) / (2 * self._params.audio_out_channels * sample_rate))
+
+
+class MockTransport(BaseTransport):
+    """
+    A loopback transport: a participant joins as soon as the pipeline
+    starts and leaves after `session_secs` (0 stays until the bot ends).
+    """
+
+    def __init__(self, params: TransportParams, session_secs: float = 0, **kwargs):
+        super().__init__()
+        self._params = params
+        self._session_secs = session_secs
+        self._input: Optional[_MockInputTransport] = None
+        self._output: Optional[_MockOutputTransport] = None
+        self._loopback = bytearray()
+        self._participant = {"id": str(uuid.uuid4()), "info": {"userName": "mock-user"}}
+        self._leave_task: Optional[asyncio.Task] = None
+        for event in (
+            "on_first_participant_joined",
+            "on_participant_joined",
+            "on_participant_left",
+            "on_call_state_updated",
+        ):
+            self._register_event_handler(event)
+
+    def input(self) -> _MockInputTransport:
+        if not self._input:
+            self._input = _MockInputTransport(self, self._params)
+        return self._input
+
+    def output(self) -> _MockOutputTransport:
+        if not self._output:
+            self._output = _MockOutputTransport(self, self._params)
+        return self._output
+
+    async def capture_participant_video(self, participant_id: str, *args, **kwargs):
+        pass
+
+    def loopback_write(self, audio: bytes, sample_rate: int):
+        if sample_rate != self._params.audio_in_sample_rate:
+            audio = resample_audio(audio, sample_rate, self._params.audio_in_sample_rate)
+        self._loopback.extend(audio)
+
+    def loopback_read(self, size: int, sample_rate: int) -> bytes:
+        audio = bytes(self._loopback[:size])
+        del self._loopback[:size]
+        return audio + bytes(size - len(audio))
+
+    async def joined(self):
+        await self._call_event_handler("on_call_state_updated", "joined")
+        await self._call_event_handler("on_first_participant_joined", self._participant)
+        await self._call_event_handler("on_participant_joined", self._participant)
+        if self._session_secs > 0 and not self._leave_task:
+            self._leave_task = asyncio.create_task(self._leave())
+
+    async def _leave(self):
+        await asyncio.sleep(self._session_secs)
+        logger.debug("Mock participant leaving")
+        await self._call_event_handler("on_participant_left", self._participant, "leftCall")
+
+
+class MockRoom(BaseModel):
+    name: str
+    url: str
+
+
+def create_mock_room() -> Tuple[MockRoom, str, str]:
+    """A room for the mock transport and its (user, bot) tokens, like `voice_bot_create`."""
+    name = f"mock-{uuid.uuid4().hex[:12]}"
+    return MockRoom(name=name, url=f"mock://{name}"), "mock-token", "mock-token"
@@ -1,15 +1,26 @@
 import asyncio
+import os
 from copy import deepcopy
 from typing import Any, Callable, Coroutine, List, Optional
 
+from bots.persistent_wal import PersistentContextWAL
 from deepcompare import compare
 from loguru import logger
 from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from pipecat.frames.frames import EndFrame, Frame, TransportMessageUrgentFrame
 from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
 from pipecat.services.openai import OpenAILLMContext, OpenAILLMContextFrame
 
+# Queued messages are coalesced for up to this many seconds (or until the
+# batch reaches BATCH_MAX_ITEMS messages) and stored with a single call.
+BATCH_WINDOW_SECONDS = float(os.getenv("SESAME_PERSISTENT_CONTEXT_BATCH_WINDOW", "0.25"))
+BATCH_MAX_ITEMS = int(os.getenv("SESAME_PERSISTENT_CONTEXT_BATCH_SIZE", "50"))
+MAX_PERSIST_ATTEMPTS = 3
+PERSIST_RETRY_DELAY_SECONDS = 0.5
+
 
 class RTVIItemStoredMessageData(BaseModel):
     # action: Literal["append", "replace"]
@@ -63,13 +74,30 @@ class PersistentContextProcessor(FrameProcessor):
 
 
 class PersistentContext:
-    def __init__(self, *, context: OpenAILLMContext):
+    def __init__(
+        self,
+        *,
+        context: OpenAILLMContext,
+        wal_key: Optional[str] = None,
+        batch_window: float = BATCH_WINDOW_SECONDS,
+        batch_size: int = BATCH_MAX_ITEMS,
+    ):
         self._context_handler: Optional[Callable[[List[Any]], Coroutine[Any, Any, None]]] = None
         self._worker_task: Optional[asyncio.Task] = None
         initial_messages = context.get_messages_for_persistent_storage()
         self._messages = deepcopy(initial_messages) if initial_messages else []
         self._queue = asyncio.Queue()
         self._running = True
+        self._batch_window = batch_window
+        self._batch_size = batch_size
+        # Batches that have been written to the WAL but not yet stored, in order.
+        self._backlog: List[tuple[Optional[str], List[Any]]] = []
+        # Batches handed to the storage handler whose transaction has not
+        # committed yet (see `track_transaction`).
+        self._stored: List[tuple[Optional[str], List[Any]]] = []
+        self._transactional = False
+        self._wal_key = wal_key
+        self._wal = PersistentContextWAL(wal_key) if wal_key else None
 
     def create_processor(
         self, *, exit_on_endframe: bool = False, push_transport_message_upstream: bool = False
@@ -90,6 +118,45 @@ class PersistentContext:
             self._worker_task = asyncio.create_task(self._worker())
         return func
 
+    def track_transaction(self, db: AsyncSession):
+        """
+        Keep batches stored through `db` in the WAL until its transaction commits.
+
+        Without this, a batch counts as stored once the handler returns. If
+        the transaction rolls back (or the session is closed without
+        committing), its batches are stored again by the next flush.
+        """
+        self._transactional = True
+        for identifier, fn in (
+            ("after_commit", self._on_commit),
+            ("after_transaction_end", self._on_transaction_end),
+        ):
+            if not event.contains(db.sync_session, identifier, fn):
+                event.listen(db.sync_session, identifier, fn)
+
+    def _on_commit(self, session):
+        stored, self._stored = self._stored, []
+        if self._wal and stored:
+            self._wal.commit(*[batch_id for batch_id, _ in stored])
+        if not self._running:
+            self._close_wal()
+
+    def _on_transaction_end(self, session, transaction):
+        if transaction.parent is not None:
+            return
+        if self._stored:
+            # Rolled back, the batches go back in front of the ones waiting.
+            logger.warning(f"{len(self._stored)} stored batch(es) rolled back, storing again")
+            self._backlog[:0] = self._stored
+            self._stored = []
+        if not self._running:
+            self._close_wal()
+
+    def _close_wal(self):
+        # Whatever is still pending stays in the file for a replay.
+        if self._wal is not None and not self._stored:
+            self._wal.close()
+
     async def save(self, context: OpenAILLMContext) -> tuple[str, Optional[List[Any]]]:
         if not self._running:
             return ("0", None)
@@ -122,23 +189,122 @@ class PersistentContext:
             await self.close()
             raise RuntimeError("No on_context_message handler defined")
 
-        while self._running:
+        await self._replay_wal()
+        if self._backlog:
+            await self._flush([])
+
+        while True:
             try:
-                messages = await self._queue.get()
+                count, items = await self._next_batch()
                 try:
-                    await self._context_handler(messages)
-                except Exception as e:
-                    logger.error(f"Persist operation failed: {e}")
+                    await self._flush(items)
                 finally:
-                    self._queue.task_done()
+                    for _ in range(count):
+                        self._queue.task_done()
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Unexpected error in worker: {e}")
 
+    async def _next_batch(self) -> tuple[int, List[Any]]:
+        """Wait for queued items and coalesce them until the window or size limit is hit.
+
+        A `None` entry in the queue is pushed by `close()` and flushes immediately.
+        """
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        count = 1
+        items = list(first) if first is not None else []
+        deadline = loop.time() + self._batch_window
+        while first is not None and len(items) < self._batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout > 0:
+                    next_items = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    next_items = self._queue.get_nowait()
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            count += 1
+            if next_items is None:
+                break
+            items.extend(next_items)
+        return count, items
+
+    async def _flush(self, items: List[Any]):
+        if items:
+            batch_id = await asyncio.to_thread(self._wal.append, items) if self._wal else None
+            self._backlog.append((batch_id, items))
+
+        if not self._backlog:
+            return
+
+        for attempt in range(1, MAX_PERSIST_ATTEMPTS + 1):
+            # Previously failed batches go first so storage order is preserved.
+            # A failure rolls back what was stored earlier in the same
+            # transaction, which `_on_transaction_end` puts back in the backlog.
+            backlog = list(self._backlog)
+            pending = [item for _, batch in backlog for item in batch]
+            try:
+                await self._context_handler(pending)
+            except Exception as e:
+                logger.error(
+                    f"Persist operation failed (attempt {attempt}/{MAX_PERSIST_ATTEMPTS}): {e}"
+                )
+                if attempt < MAX_PERSIST_ATTEMPTS:
+                    await asyncio.sleep(PERSIST_RETRY_DELAY_SECONDS * attempt)
+                continue
+
+            del self._backlog[: len(backlog)]
+            if self._transactional:
+                # Stored, but only durable once the transaction commits.
+                self._stored.extend(backlog)
+            elif self._wal:
+                await asyncio.to_thread(self._wal.commit, *[batch_id for batch_id, _ in backlog])
+            return
+
+        if self._wal:
+            logger.error(
+                f"{len(pending)} message(s) not stored, kept in {self._wal.path} for replay"
+            )
+        else:
+            logger.error(f"{len(pending)} message(s) not stored and no WAL configured")
+
+    async def _replay_wal(self):
+        """Store batches left behind by a previous writer for the same key (e.g. after a crash)."""
+        if not self._wal_key:
+            return
+
+        orphans = await asyncio.to_thread(PersistentContextWAL.claim_orphans, self._wal_key)
+        for path, f, items in orphans:
+            replayed = False
+            try:
+                if items:
+                    # Moved to our own WAL, stored with the next flush.
+                    logger.info(f"Replaying {len(items)} message(s) from {path}")
+                    batch_id = await asyncio.to_thread(self._wal.append, items)
+                    self._backlog.append((batch_id, items))
+                replayed = True
+            except Exception as e:
+                logger.error(f"Unable to replay {path}: {e}")
+            finally:
+                PersistentContextWAL.release_orphan(path, f, replayed)
+
+    async def flush(self):
+        """Wait until everything saved so far has been handed to the storage handler."""
+        if not self._running or self._worker_task is None:
+            return
+        await self._queue.put(None)
+        await self._queue.join()
+
     async def close(self, processor=None):
+        if not self._running:
+            return
         logger.debug("Closing PersistentContext...")
         self._running = False
+        if self._worker_task is not None:
+            # Flush whatever is being coalesced without waiting for the window.
+            await self._queue.put(None)
         await self._queue.join()
         if self._worker_task is not None:
             self._worker_task.cancel()
@@ -146,3 +312,5 @@ class PersistentContext:
                 await self._worker_task
             except asyncio.CancelledError:
                 pass
+        if self._wal is not None and not self._stored:
+            await asyncio.to_thread(self._wal.close)
@@ -0,0 +1,125 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from loguru import logger
+
+WAL_DIR = os.getenv("SESAME_PERSISTENT_CONTEXT_WAL_DIR") or os.path.join(
+    tempfile.gettempdir(), "sesame", "wal"
+)
+
+
+class PersistentContextWAL:
+    """
+    Append-only local log of message batches waiting to be stored.
+
+    Each writer owns one file named `<key>.<writer id>.wal` and holds an
+    exclusive lock on it while open. Records are JSON lines, either
+    `{"op": "append", "id": ..., "items": [...]}` or `{"op": "commit", "id": ...}`.
+    A file whose lock can be acquired belongs to a writer that is gone
+    (closed or crashed), so its uncommitted batches can be replayed.
+    """
+
+    def __init__(self, key: str, directory: Optional[str] = None):
+        self._key = key
+        self._directory = Path(directory or WAL_DIR)
+        self._path = self._directory / f"{key}.{uuid.uuid4().hex}.wal"
+        self._file = None
+        self._pending: set[str] = set()
+        # Appends run in worker threads, commits on the event loop.
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def append(self, items: List[Any]) -> str:
+        batch_id = uuid.uuid4().hex
+        self._write([{"op": "append", "id": batch_id, "items": items}])
+        self._pending.add(batch_id)
+        return batch_id
+
+    def commit(self, *batch_ids: str):
+        if not batch_ids:
+            return
+        self._write([{"op": "commit", "id": batch_id} for batch_id in batch_ids])
+        self._pending.difference_update(batch_ids)
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+            # Everything made it to storage, nothing to replay.
+            if not self._pending:
+                self._path.unlink(missing_ok=True)
+
+    def _write(self, records: List[dict]):
+        with self._lock:
+            if self._file is None:
+                self._directory.mkdir(parents=True, exist_ok=True)
+                self._file = open(self._path, "a", encoding="utf-8")
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            for record in records:
+                self._file.write(json.dumps(record, default=str) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @classmethod
+    def claim_orphans(
+        cls, key: str, directory: Optional[str] = None
+    ) -> List[Tuple[Path, Any, List[Any]]]:
+        """
+        Lock every abandoned WAL file for `key` and return its uncommitted items.
+
+        Returns a list of `(path, locked file, items)`. Callers must pass each
+        entry to `release_orphan` once the items have been stored (or not).
+        """
+        orphans = []
+        for path in sorted(Path(directory or WAL_DIR).glob(f"{key}.*.wal")):
+            try:
+                f = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still owned by a live writer.
+                f.close()
+                continue
+            items = cls._read_pending(f)
+            orphans.append((path, f, items))
+        return orphans
+
+    @staticmethod
+    def release_orphan(path: Path, f: Any, replayed: bool):
+        if replayed:
+            path.unlink(missing_ok=True)
+        f.close()
+
+    @staticmethod
+    def _read_pending(f: Any) -> List[Any]:
+        batches: dict[str, List[Any]] = {}
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-write. The batch it
+                # belonged to was never handed to storage, so drop it.
+                logger.warning(f"Skipping corrupt WAL record in {f.name}")
+                continue
+            if record.get("op") == "append":
+                batches[record["id"]] = record["items"]
+            elif record.get("op") == "commit":
+                batches.pop(record["id"], None)
+        return [item for items in batches.values() for item in items]
@@ -0,0 +1,153 @@
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bots.types import BotConfig
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.frames.frames import Frame, MetricsFrame
+from pipecat.metrics.metrics import LLMUsageMetricsData
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+# Mark the context prefix conversations start with (the workspace's
+# `default_llm_context`) for providers that only cache up to breakpoints,
+# unless the workspace's LLM config sets `enable_prompt_caching_beta`.
+PREFIX_CACHE_ENABLED = bool(int(os.getenv("SESAME_LLM_PREFIX_CACHE", "1") or 0))
+
+# Providers that cache a prompt prefix only where it is marked. The others
+# (OpenAI and the OpenAI compatible ones) cache identical prefixes on their
+# own, all they need is the prefix sent the same every time.
+_BREAKPOINT_PROVIDERS = {"anthropic"}
+
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_breakpoint(message: dict) -> dict:
+    content = message.get("content")
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content and isinstance(content[-1], dict):
+        blocks = list(content)
+    else:
+        return message
+    blocks[-1] = {**blocks[-1], "cache_control": _CACHE_CONTROL}
+    return {**message, "content": blocks}
+
+
+def mark_cached_prefix(messages: List[Any], prefix_length: int) -> List[Any]:
+    """
+    A copy of `messages` with a cache breakpoint at the end of the first
+    `prefix_length` messages, and at the end of the system prompt (sent
+    apart from the messages) if it starts them.
+    """
+    if prefix_length <= 0 or prefix_length > len(messages):
+        return messages
+    marked = list(messages)
+    indices = {prefix_length - 1}
+    if marked[0].get("role") == "system":
+        indices.add(0)
+    for index in indices:
+        marked[index] = _with_breakpoint(marked[index])
+    return marked
+
+
+def _workspace_caching(config: BotConfig) -> Optional[bool]:
+    """The workspace's own `enable_prompt_caching_beta` LLM option, None if it has none."""
+    for service in config.config:
+        if service.service != "llm":
+            continue
+        for option in service.options:
+            if option.name == "enable_prompt_caching_beta":
+                return bool(option.value)
+    return None
+
+
+def cache_context_prefix(
+    llm: LLMService, provider: str, messages: List[Any], prefix_length: int, config: BotConfig
+) -> List[Any]:
+    """
+    The messages to build the context of `llm` with, the first
+    `prefix_length` of which are the same for many conversations. Turns the
+    provider's prompt caching on and marks them, if it needs that and the
+    workspace's `config` doesn't turn caching off.
+    """
+    if not PREFIX_CACHE_ENABLED or provider not in _BREAKPOINT_PROVIDERS:
+        return messages
+    if _workspace_caching(config) is False:
+        return messages
+    settings = getattr(llm, "_settings", {})
+    if "enable_prompt_caching_beta" in settings:
+        settings["enable_prompt_caching_beta"] = True
+    return mark_cached_prefix(messages, prefix_length)
+
+
+# Prompt tokens by (workspace, provider), for the workspaces' owners.
+_workspace_usage: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(
+    lambda: defaultdict(int)
+)
+
+
+def workspace_prompt_cache_usage(workspace_ids: Iterable[str]) -> Dict[str, Dict[str, dict]]:
+    """
+    Prompt tokens read from and written to providers' caches in this
+    process, by workspace (of `workspace_ids`) and provider.
+    """
+    workspace_ids = set(workspace_ids)
+    usage: Dict[str, Dict[str, dict]] = {}
+    for (workspace_id, provider), counts in sorted(_workspace_usage.items()):
+        if workspace_id not in workspace_ids:
+            continue
+        total = counts["llm_prompt_tokens"]
+        read = counts["llm_prompt_cache_read_tokens"]
+        usage.setdefault(workspace_id, {})[provider] = {
+            "prompt_tokens": total,
+            "cache_read_tokens": read,
+            "cache_write_tokens": counts["llm_prompt_cache_write_tokens"],
+            "hit_rate": round(read / total, 3) if total else None,
+        }
+    return usage
+
+
+class PromptCacheUsageProcessor(FrameProcessor):
+    """
+    After the LLM: counts the prompt tokens providers read from their
+    cache, as reported in their usage metrics (`llm_prompt_tokens`,
+    `llm_prompt_cache_read_tokens` and `llm_prompt_cache_write_tokens`,
+    also per provider with a `:<provider>` suffix), and per workspace (see
+    `workspace_prompt_cache_usage()`).
+    """
+
+    def __init__(self, provider: str, workspace_id: Optional[str] = None):
+        super().__init__()
+        self._provider = provider
+        self._workspace_id = workspace_id
+
+    def _count(self, name: str, value: int):
+        Metrics.increment(name, value)
+        Metrics.increment(f"{name}:{self._provider}", value)
+        if self._workspace_id:
+            _workspace_usage[(self._workspace_id, self._provider)][name] += value
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, MetricsFrame):
+            for data in frame.data:
+                if not isinstance(data, LLMUsageMetricsData):
+                    continue
+                usage = data.value
+                read = usage.cache_read_input_tokens or 0
+                written = usage.cache_creation_input_tokens or 0
+                # Anthropic leaves the tokens read from or written to its cache out.
+                total = usage.prompt_tokens + read + written
+                self._count("llm_prompt_tokens", total)
+                self._count("llm_prompt_cache_read_tokens", read)
+                self._count("llm_prompt_cache_write_tokens", written)
+                if total:
+                    logger.debug(
+                        f"{self._provider} read {read} of {total} prompt tokens from its cache"
+                    )
+
+        await self.push_frame(frame, direction)
@@ -39,7 +39,11 @@ async def create_rtvi_processor(
     # RTVI processor
     #
 
-    config = RTVIConfig(config=config) if config else default_config
+    config = (
+        RTVIConfig(config=[RTVIServiceConfig.model_validate(c.model_dump()) for c in config])
+        if config
+        else default_config
+    )
 
     rtvi = RTVIProcessor(config=config)
 
@@ -119,6 +119,10 @@ async def register_rtvi_services(rtvi: RTVIProcessor, user_aggregator: LLMUserCo
             ),
             RTVIServiceOption(name="seed", type="number", handler=config_llm_settings_handler),
             RTVIServiceOption(name="extra", type="object", handler=config_llm_settings_handler),
+            # Anthropic, on by default with `SESAME_LLM_PREFIX_CACHE`.
+            RTVIServiceOption(
+                name="enable_prompt_caching_beta", type="bool", handler=config_llm_settings_handler
+            ),
             RTVIServiceOption(
                 name="initial_messages", type="array", handler=config_llm_messages_handler
             ),
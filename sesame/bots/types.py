@@ -1,19 +1,47 @@
-from typing import Any, Awaitable, Callable, List, Mapping
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Mapping, Optional
 
+from common.models import RTVIServiceConfigModel
 from pydantic import BaseModel
 
-from pipecat.processors.frameworks.rtvi import RTVIMessage, RTVIServiceConfig
+
+class RTVIMessageModel(BaseModel):
+    """Same fields as pipecat's `RTVIMessage`, whose module pulls in most of pipecat."""
+
+    label: Literal["rtvi-ai"] = "rtvi-ai"
+    type: str
+    id: str
+    data: Optional[Dict[str, Any]] = None
+
+
+class LLMRouteConfig(BaseModel):
+    provider: str
+    # Time to first token is divided by this when comparing providers.
+    weight: float = 1.0
+
+
+class LLMRoutingConfig(BaseModel):
+    # In order of preference until their latency is known.
+    providers: List[LLMRouteConfig] = []
+    # Ask the next provider too after this long without a token, None for
+    # `SESAME_LLM_HEDGE_MS` and 0 to disable.
+    hedge_ms: Optional[int] = None
 
 
 class BotConfig(BaseModel):
     services: Mapping[str, str] = {}
-    config: List[RTVIServiceConfig] = []
+    config: List[RTVIServiceConfigModel] = []
+    # Several LLM providers to pick from, `services["llm"]` is one of them.
+    llm_routing: Optional[LLMRoutingConfig] = None
+    # Answer requests at temperature 0 with the same context as an earlier
+    # one from the response cache (see `bots.http.llm_cache`), ignored
+    # with `llm_routing`.
+    llm_response_cache: bool = False
     bot_profile: str = "vision"
 
 
 class BotParams(BaseModel):
     conversation_id: str
-    actions: List[RTVIMessage] = []
+    actions: List[RTVIMessageModel] = []
 
 
 class BotCallbacks(BaseModel):
@@ -21,3 +49,5 @@ class BotCallbacks(BaseModel):
     on_first_participant_joined: Callable[[Mapping[str, Any]], Awaitable[None]]
     on_participant_joined: Callable[[Mapping[str, Any]], Awaitable[None]]
     on_participant_left: Callable[[Mapping[str, Any], str], Awaitable[None]]
+    # Called with the STT, LLM and TTS services once the pipeline is built.
+    on_services_created: Callable[[Mapping[str, Any]], None]
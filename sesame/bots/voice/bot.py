@@ -2,7 +2,7 @@ import asyncio
 import os
 import sys
 from multiprocessing import Process
-from typing import Awaitable, Callable
+from typing import Awaitable, Callable, Optional
 
 import aiohttp
 from bots.types import BotCallbacks, BotConfig, BotParams
@@ -10,6 +10,9 @@ from bots.voice.bot_error_pipeline import bot_error_pipeline_task
 from bots.voice.bot_pipeline_runner import BotPipelineRunner
 from bots.voice.bot_pipeline_vision import vision_bot_pipeline
 from bots.voice.bot_pipeline_voice import voice_bot_pipeline
+from bots.voice.latency import VoiceTurnLatencyTracker
+from bots.voice.room_pool import DailyRoomPool, create_room_tokens, is_pooled
+from bots.voice.transport import is_mock_transport
 from common.auth import Auth, get_authenticated_db_context
 from common.database import DatabaseSessionFactory
 from common.models import Service
@@ -23,14 +26,15 @@ from pipecat.transports.services.helpers.daily_rest import (
     DailyRoomParams,
 )
 
-MAX_SESSION_TIME = int(os.getenv("SESAME_MAX_VOICE_SESSION_TIME", 15 * 60)) or 15 * 60
-
 
 async def _cleanup(room_url: str, config: BotConfig, services: dict[str, Service]):
     async with aiohttp.ClientSession() as session:
         debug_room = os.getenv("USE_DEBUG_ROOM", None)
         if debug_room:
             return
+        # Mock rooms only exist in the bot.
+        if is_mock_transport(services.get("transport")):
+            return
 
         transport_service = services.get("transport")
         transport_api_key = getattr(transport_service, "api_key")
@@ -45,6 +49,9 @@ async def _cleanup(room_url: str, config: BotConfig, services: dict[str, Service
         )
 
         try:
+            # Pooled rooms are created with an expiry, Daily removes them.
+            if is_pooled(await helper.get_room_from_url(room_url)):
+                return
             logger.info(f"Deleting room {room_url}")
             await helper.delete_room_by_url(room_url)
         except Exception as e:
@@ -58,6 +65,7 @@ async def _voice_pipeline_task(
     room_url: str,
     room_token: str,
     db: AsyncSession,
+    latency: VoiceTurnLatencyTracker,
 ) -> Callable[[BotCallbacks], Awaitable[PipelineTask]]:
     # @TODO: load relevant pipeline based on config param
 
@@ -65,11 +73,11 @@ async def _voice_pipeline_task(
         logger.info(f"Running {config.bot_profile} bot pipeline")
         if config.bot_profile == "vision":
             pipeline = await vision_bot_pipeline(
-                params, config, services, callbacks, room_url, room_token, db
+                params, config, services, callbacks, room_url, room_token, db, latency
             )
         else:
             pipeline = await voice_bot_pipeline(
-                params, config, services, callbacks, room_url, room_token, db
+                params, config, services, callbacks, room_url, room_token, db, latency
             )
 
         task = PipelineTask(
@@ -77,6 +85,7 @@ async def _voice_pipeline_task(
             params=PipelineParams(
                 allow_interruptions=True,
                 enable_metrics=True,
+                enable_usage_metrics=True,
                 send_initial_empty_metrics=False,
             ),
         )
@@ -93,26 +102,41 @@ async def _voice_bot_main(
     services: dict[str, Service],
     room_url: str,
     room_token: str,
+    session_factory: Optional[DatabaseSessionFactory] = None,
 ):
-    subprocess_session_factory = DatabaseSessionFactory()
+    # Pool workers keep their own factory (and its connections) across sessions.
+    subprocess_session_factory = session_factory or DatabaseSessionFactory()
     async with get_authenticated_db_context(auth, subprocess_session_factory) as db:
         bot_runner = BotPipelineRunner()
+        latency = VoiceTurnLatencyTracker()
+        # Stored in transactions of their own, the session's one lasts until it ends.
+        latency_stopped = asyncio.Event()
+        latency_flushes = asyncio.create_task(
+            latency.run_flushes(
+                lambda: get_authenticated_db_context(auth, subprocess_session_factory),
+                latency_stopped,
+            )
+        )
         try:
             task_creator = await _voice_pipeline_task(
-                params, config, services, room_url, room_token, db
+                params, config, services, room_url, room_token, db, latency
             )
             await bot_runner.start(task_creator)
         except Exception as e:
             logger.error(f"Error running bot: {e}")
-            task_creator = await bot_error_pipeline_task(
-                room_url, room_token, f"Error running bot: {e}"
-            )
-            await bot_runner.start(task_creator)
-
+            if not is_mock_transport(services.get("transport")):
+                task_creator = await bot_error_pipeline_task(
+                    room_url, room_token, f"Error running bot: {e}"
+                )
+                await bot_runner.start(task_creator)
+
+        latency_stopped.set()
+        await latency_flushes
         await _cleanup(room_url, config, services)
 
         logger.info("Bot has finished. Bye!")
-    await subprocess_session_factory.engine.dispose()
+    if session_factory is None:
+        await subprocess_session_factory.engine.dispose()
 
 
 def _voice_bot_process(
@@ -130,7 +154,18 @@ def _voice_bot_process(
     asyncio.run(_voice_bot_main(auth, params, config, services, room_url, room_token))
 
 
-async def voice_bot_create(daily_api_key: str, daily_api_url: str):
+async def voice_bot_create(
+    daily_api_key: str, daily_api_url: str, room_pool: Optional[DailyRoomPool] = None
+):
+    debug_room = os.getenv("DAILY_USE_DEBUG_ROOM", None)
+    if room_pool and room_pool.enabled and not debug_room:
+        try:
+            return await room_pool.acquire(daily_api_key, daily_api_url)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unable to run bot: {e}"
+            )
+
     async with aiohttp.ClientSession() as session:
         daily_rest_helper = DailyRESTHelper(
             daily_api_key=daily_api_key,
@@ -139,13 +174,11 @@ async def voice_bot_create(daily_api_key: str, daily_api_url: str):
         )
 
         try:
-            debug_room = os.getenv("DAILY_USE_DEBUG_ROOM", None)
             if debug_room:
                 room = await daily_rest_helper.get_room_from_url(debug_room)
             else:
                 room = await daily_rest_helper.create_room(params=DailyRoomParams())
-            bot_token = await daily_rest_helper.get_token(room.url, MAX_SESSION_TIME)
-            user_token = await daily_rest_helper.get_token(room.url, MAX_SESSION_TIME)
+            bot_token, user_token = await create_room_tokens(daily_rest_helper, room.url)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unable to run bot: {e}"
@@ -161,8 +194,9 @@ def voice_bot_launch(
     services: dict[str, Service],
     room_url: str,
     room_token: str,
-):
+) -> Process:
     process = Process(
         target=_voice_bot_process, args=(auth, params, config, services, room_url, room_token)
     )
     process.start()
+    return process
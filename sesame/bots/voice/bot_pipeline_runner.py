@@ -1,13 +1,14 @@
 import asyncio
 import os
 
-from typing import Awaitable, Callable
+from typing import Any, Awaitable, Callable, Mapping, Optional
 
 from pipecat.frames.frames import EndFrame, StartInterruptionFrame
 from pipecat.pipeline.task import PipelineTask
 from pipecat.pipeline.runner import PipelineRunner
 
 from bots.types import BotCallbacks
+from bots.voice.warmup import WARMUP_ENABLED, ServiceWarmup
 
 from loguru import logger
 
@@ -23,8 +24,10 @@ class BotPipelineRunner:
             on_participant_joined=self._on_participant_joined,
             on_participant_left=self._on_participant_left,
             on_call_state_updated=self._on_call_state_updated,
+            on_services_created=self._on_services_created,
         )
         self._task = None
+        self._warmup: Optional[ServiceWarmup] = None
 
     async def start(
         self, create_task: Callable[[BotCallbacks], Awaitable[PipelineTask]], handle_sigint=True
@@ -53,6 +56,8 @@ class BotPipelineRunner:
 
     async def _on_first_participant_joined(self, participant):
         self._participant_joined = True
+        if self._warmup and self._warmup.pending:
+            logger.info("Participant joined before services were warmed up")
 
     async def _on_participant_joined(self, participant):
         logger.info("Participant joined.")
@@ -68,6 +73,16 @@ class BotPipelineRunner:
             if self._task:
                 await self._task.queue_frame(EndFrame())
 
+    #
+    # Warm-up
+    #
+
+    def _on_services_created(self, services: Mapping[str, Any]):
+        # Services connect while we join the room and wait for the participant.
+        if WARMUP_ENABLED:
+            self._warmup = ServiceWarmup(dict(services))
+            self._warmup.start()
+
     #
     # Timeout task
     #
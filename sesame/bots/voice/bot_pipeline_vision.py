@@ -3,13 +3,17 @@ from typing import Any, cast
 from bots.persistent_context import PersistentContext
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotCallbacks, BotConfig, BotParams
+from bots.voice.endpointing import AdaptiveEndpointing, AdaptiveVADAnalyzer
+from bots.voice.latency import VoiceTurnLatencyTracker
+from bots.voice.transport import create_transport
+from bots.voice.tts_cache import cached_tts
+from bots.voice.vision import VisionSession
 from common.models import Conversation, Message, Service
 from common.service_factory import ServiceFactory, ServiceType
 from loguru import logger
 from openai.types.chat import ChatCompletionToolParam
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.audio.vad.vad_analyzer import VADParams
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.processors.frame_processor import FrameDirection
@@ -24,15 +28,7 @@ from pipecat.services.ai_services import (
     LLMService,
     OpenAILLMContext,
 )
-from pipecat.transports.services.daily import DailyParams, DailyTransport
-
-video_participant_id = None
-
-
-async def get_image(function_name, tool_call_id, arguments, llm, context, result_callback):
-    question = arguments["question"]
-    await llm.request_image_frame(user_id=video_participant_id, text_content=question)
-
+from pipecat.transports.services.daily import DailyParams
 
 tools = [
     ChatCompletionToolParam(
@@ -63,6 +59,7 @@ async def vision_bot_pipeline(
     room_url: str,
     room_token: str,
     db: AsyncSession,
+    latency: VoiceTurnLatencyTracker,
 ) -> Pipeline:
     if "transport" not in services:
         raise Exception("Service `llm` not available in provided services.")
@@ -82,7 +79,8 @@ async def vision_bot_pipeline(
             getattr(services["llm"], "options"),
         ),
     )
-    llm.register_function("get_image", get_image)
+    vision = VisionSession()
+    llm.register_function("get_image", vision.get_image)
 
     tts = cast(
         LLMService,
@@ -103,17 +101,20 @@ async def vision_bot_pipeline(
         ),
     )
 
+    # How long the user's silence must last to end their turn, adapted to them.
+    endpointing = AdaptiveEndpointing(stop_secs=0.8)
+
     # Daily API is used in dial-in case only
-    transport = DailyTransport(
+    transport = create_transport(
+        services,
         room_url,
         room_token,
-        "Open Sesame",
         DailyParams(
             audio_out_enabled=True,
             audio_out_sample_rate=tts.sample_rate,
             transcription_enabled=False,
             vad_enabled=True,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.8)),
+            vad_analyzer=AdaptiveVADAnalyzer(endpointing, params=VADParams(stop_secs=0.8)),
             vad_audio_passthrough=True,
         ),
     )
@@ -124,11 +125,21 @@ async def vision_bot_pipeline(
     messages = [getattr(msg, "content") for msg in conversation.messages]
 
     context = OpenAILLMContext(messages, tools)
+    vision.attach(context)
     context_aggregator = llm.create_context_aggregator(context)
     user_aggregator = context_aggregator.user()
     assistant_aggregator = context_aggregator.assistant()
 
-    storage = PersistentContext(context=context)
+    storage = PersistentContext(context=context, wal_key=str(params.conversation_id))
+    # The session's messages are committed with `db` when the bot ends.
+    storage.track_transaction(db)
+    latency.set_session(
+        str(params.conversation_id),
+        str(conversation.workspace_id),
+        services,
+        {llm.name: str(services["llm"].service_provider)},
+        tts,
+    )
 
     #
     # RTVI
@@ -153,23 +164,28 @@ async def vision_bot_pipeline(
 
     processors = [
         transport.input(),
+        vision.create_processor(),
         rtvi,
         rtvi_speaking,
         stt,
         rtvi_user_transcription,
+        endpointing.create_processor(),
+        latency.create_processor(),
         user_aggregator,
         storage.create_processor(),
         llm,
         rtvi_bot_llm,
         rtvi_bot_transcription,
-        tts,
+        cached_tts(tts, str(services["tts"].service_provider)),
         transport.output(),
+        latency.create_processor(),
         rtvi_bot_tts,
         assistant_aggregator,
         storage.create_processor(exit_on_endframe=True, push_transport_message_upstream=True),
     ]
 
     pipeline = Pipeline(processors)
+    callbacks.on_services_created({"stt": stt, "llm": llm, "tts": tts})
 
     @storage.on_context_message
     async def on_context_message(messages: list[Any]):
@@ -194,9 +210,8 @@ async def vision_bot_pipeline(
 
     @transport.event_handler("on_first_participant_joined")
     async def on_first_participant_joined(transport, participant):
-        global video_participant_id
-        video_participant_id = participant["id"]
-        await transport.capture_participant_video(video_participant_id, framerate=0)
+        vision.participant_id = participant["id"]
+        await transport.capture_participant_video(participant["id"], framerate=0)
         await callbacks.on_first_participant_joined(participant)
 
     @transport.event_handler("on_participant_joined")
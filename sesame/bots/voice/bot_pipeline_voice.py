@@ -1,15 +1,22 @@
 from typing import Any, cast
 
+from bots.circuit_breaker import with_circuit_breaker
+from bots.llm_router import check_llm_circuits, create_llm_router
 from bots.persistent_context import PersistentContext
+from bots.prompt_cache import PromptCacheUsageProcessor, cache_context_prefix
 from bots.rtvi import create_rtvi_processor
 from bots.types import BotCallbacks, BotConfig, BotParams
+from bots.voice.endpointing import AdaptiveEndpointing, AdaptiveVADAnalyzer
+from bots.voice.latency import VoiceTurnLatencyTracker
+from bots.voice.speculative import SPECULATIVE_LLM, SpeculativeInference
+from bots.voice.transport import create_transport
+from bots.voice.tts_cache import cached_tts
 from common.models import Conversation, Message, Service
 from common.service_factory import ServiceFactory, ServiceType
 from loguru import logger
 from openai._types import NOT_GIVEN
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.audio.vad.vad_analyzer import VADParams
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.processors.frame_processor import FrameDirection
@@ -24,7 +31,7 @@ from pipecat.services.ai_services import (
     LLMService,
     OpenAILLMContext,
 )
-from pipecat.transports.services.daily import DailyParams, DailyTransport
+from pipecat.transports.services.daily import DailyParams
 
 
 async def voice_bot_pipeline(
@@ -35,6 +42,7 @@ async def voice_bot_pipeline(
     room_url: str,
     room_token: str,
     db: AsyncSession,
+    latency: VoiceTurnLatencyTracker,
 ) -> Pipeline:
     if "transport" not in services:
         raise Exception("Service `llm` not available in provided services.")
@@ -52,6 +60,8 @@ async def voice_bot_pipeline(
             ServiceType.ServiceLLM,
             str(services["llm"].api_key),
             getattr(services["llm"], "options"),
+            # Checked below, with routing the other providers may be up.
+            check_circuit=False,
         ),
     )
     tts = cast(
@@ -73,17 +83,38 @@ async def voice_bot_pipeline(
         ),
     )
 
+    # Picks one of several LLM providers per turn, if the workspace has them.
+    llm_router = create_llm_router(config, services, llm)
+    check_llm_circuits(str(services["llm"].service_provider), llm, llm_router)
+
+    # A second LLM service answering stable interim transcripts. Not with
+    # routing, the turn may go to another provider than the one it asked.
+    speculative_llm = None
+    if SPECULATIVE_LLM and not llm_router:
+        speculative_llm = cast(
+            LLMService,
+            ServiceFactory.get_service(
+                str(services["llm"].service_provider),
+                ServiceType.ServiceLLM,
+                str(services["llm"].api_key),
+                getattr(services["llm"], "options"),
+            ),
+        )
+
+    # How long the user's silence must last to end their turn, adapted to them.
+    endpointing = AdaptiveEndpointing(stop_secs=0.3)
+
     # Daily API is used in dial-in case only
-    transport = DailyTransport(
+    transport = create_transport(
+        services,
         room_url,
         room_token,
-        "Open Sesame",
         DailyParams(
             audio_out_enabled=True,
             audio_out_sample_rate=tts.sample_rate,
             transcription_enabled=False,
             vad_enabled=True,
-            vad_analyzer=SileroVADAnalyzer(params=VADParams(stop_secs=0.3)),
+            vad_analyzer=AdaptiveVADAnalyzer(endpointing, params=VADParams(stop_secs=0.3)),
             vad_audio_passthrough=True,
         ),
     )
@@ -92,6 +123,14 @@ async def voice_bot_pipeline(
     if not conversation:
         raise Exception(f"Conversation {params.conversation_id} not found")
     messages = [getattr(msg, "content") for msg in conversation.messages]
+    if not llm_router:
+        messages = cache_context_prefix(
+            llm,
+            str(services["llm"].service_provider),
+            messages,
+            Message.context_prefix_length(conversation.messages),
+            config,
+        )
 
     tools = NOT_GIVEN  # todo: implement tools in and set here
     context = OpenAILLMContext(messages, tools)
@@ -99,7 +138,23 @@ async def voice_bot_pipeline(
     user_aggregator = context_aggregator.user()
     assistant_aggregator = context_aggregator.assistant()
 
-    storage = PersistentContext(context=context)
+    storage = PersistentContext(context=context, wal_key=str(params.conversation_id))
+    # The session's messages are committed with `db` when the bot ends.
+    storage.track_transaction(db)
+    speculation = SpeculativeInference(context, speculative_llm)
+    # Turns are stored with the provider that answered them.
+    llm_providers = {llm.name: str(services["llm"].service_provider)}
+    if llm_router:
+        llm_providers.update(llm_router.providers)
+    if speculative_llm:
+        llm_providers[speculative_llm.name] = str(services["llm"].service_provider)
+    latency.set_session(
+        str(params.conversation_id),
+        str(conversation.workspace_id),
+        services,
+        llm_providers,
+        tts,
+    )
 
     #
     # RTVI
@@ -128,19 +183,28 @@ async def voice_bot_pipeline(
         rtvi_speaking,
         stt,
         rtvi_user_transcription,
+        endpointing.create_processor(),
+        latency.create_processor(),
+        speculation.create_processor(),
         user_aggregator,
         storage.create_processor(),
-        llm,
+        speculation.create_gate(),
+        llm_router or with_circuit_breaker(llm),
+        PromptCacheUsageProcessor(
+            str(services["llm"].service_provider), str(conversation.workspace_id)
+        ),
         rtvi_bot_llm,
         rtvi_bot_transcription,
-        tts,
+        cached_tts(tts, str(services["tts"].service_provider)),
         transport.output(),
+        latency.create_processor(),
         rtvi_bot_tts,
         assistant_aggregator,
         storage.create_processor(exit_on_endframe=True, push_transport_message_upstream=True),
     ]
 
     pipeline = Pipeline(processors)
+    callbacks.on_services_created({"stt": stt, "llm": llm, "tts": tts})
 
     @storage.on_context_message
     async def on_context_message(messages: list[Any]):
@@ -0,0 +1,433 @@
+import abc
+import asyncio
+import os
+import socket
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from bots.types import BotConfig, BotParams
+from bots.voice.supervisor import MAX_CONCURRENT_BOTS, VoiceBotCapacityError, VoiceBotSupervisor
+from common.auth import Auth, get_authenticated_db_context
+from common.database import DatabaseSessionFactory
+from common.encryption import decrypt_with_secret, encrypt_with_secret
+from common.metrics import Metrics
+from common.models import Conversation, Service, VoiceBotJob, VoiceBotWorker
+from loguru import logger
+
+# `local`: bots run on the webapp's host (or Modal), `remote`: on worker nodes.
+DISPATCH_MODE = os.getenv("SESAME_VOICE_BOT_DISPATCH", "local") or "local"
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("SESAME_VOICE_BOT_HEARTBEAT_INTERVAL", "5"))
+# A node that hasn't sent a heartbeat for this long is considered dead.
+HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("SESAME_VOICE_BOT_HEARTBEAT_TIMEOUT", "15"))
+# How often nodes look for new jobs.
+POLL_INTERVAL_SECONDS = float(os.getenv("SESAME_VOICE_BOT_DISPATCH_POLL", "0.5"))
+# Jobs no node claimed for this long are deleted, the user has given up on them by then.
+JOB_TIMEOUT_SECONDS = float(os.getenv("SESAME_VOICE_BOT_JOB_TIMEOUT", "60"))
+
+
+class VoiceBotJobChannel(abc.ABC):
+    """
+    Where the webapp finds worker nodes and hands them sessions.
+
+    Nodes `register()` their capacity and keep sending `heartbeat()`s with
+    the number of bots they run. A job `submit()`ted to a node waits until
+    the node `claim()`s it.
+    """
+
+    async def register(self, worker_id: str, capacity: int):
+        await self.heartbeat(worker_id, capacity, 0)
+
+    @abc.abstractmethod
+    async def heartbeat(self, worker_id: str, capacity: int, running: int):
+        pass
+
+    @abc.abstractmethod
+    async def unregister(self, worker_id: str) -> int:
+        """Forget a node and the jobs it didn't claim, returns how many jobs were dropped."""
+        pass
+
+    @abc.abstractmethod
+    async def workers(self) -> List[Dict[str, Any]]:
+        """`worker_id`, `capacity`, `running`, `pending` jobs and whether it's `alive`."""
+        pass
+
+    @abc.abstractmethod
+    async def submit(self, worker_id: str, payload: Dict[str, Any]):
+        pass
+
+    @abc.abstractmethod
+    async def claim(self, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+        pass
+
+    @abc.abstractmethod
+    async def reassign(self, from_worker_id: str, to_worker_id: str) -> int:
+        """Move the jobs a node didn't claim to another one."""
+        pass
+
+    @abc.abstractmethod
+    async def expire(self, max_age: float) -> int:
+        """Delete the jobs submitted more than `max_age` seconds ago, returns how many."""
+        pass
+
+
+class PostgresJobChannel(VoiceBotJobChannel):
+    """The default channel, the `voice_bot_workers` and `voice_bot_jobs` tables."""
+
+    def __init__(
+        self,
+        session_factory: DatabaseSessionFactory,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT_SECONDS,
+    ):
+        self._session_factory = session_factory
+        self._heartbeat_timeout = heartbeat_timeout
+
+    async def heartbeat(self, worker_id: str, capacity: int, running: int):
+        async with self._session_factory() as db:
+            async with db.begin():
+                await VoiceBotWorker.upsert(worker_id, capacity, running, db)
+
+    async def unregister(self, worker_id: str) -> int:
+        async with self._session_factory() as db:
+            async with db.begin():
+                return await VoiceBotWorker.delete_worker(worker_id, db)
+
+    async def workers(self) -> List[Dict[str, Any]]:
+        async with self._session_factory() as db:
+            return await VoiceBotWorker.get_workers(self._heartbeat_timeout, db)
+
+    async def submit(self, worker_id: str, payload: Dict[str, Any]):
+        async with self._session_factory() as db:
+            async with db.begin():
+                db.add(VoiceBotJob(worker_id=worker_id, payload=payload))
+
+    async def claim(self, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+        async with self._session_factory() as db:
+            async with db.begin():
+                return await VoiceBotJob.claim(worker_id, limit, db)
+
+    async def reassign(self, from_worker_id: str, to_worker_id: str) -> int:
+        async with self._session_factory() as db:
+            async with db.begin():
+                return await VoiceBotJob.reassign(from_worker_id, to_worker_id, db)
+
+    async def expire(self, max_age: float) -> int:
+        async with self._session_factory() as db:
+            async with db.begin():
+                return await VoiceBotJob.delete_expired(max_age, db)
+
+
+class InMemoryJobChannel(VoiceBotJobChannel):
+    """Stand-in for tests and single process setups, webapp and nodes share it."""
+
+    def __init__(self, heartbeat_timeout: float = HEARTBEAT_TIMEOUT_SECONDS):
+        self._heartbeat_timeout = heartbeat_timeout
+        self._workers: Dict[str, Dict[str, Any]] = {}
+        # Payloads with the time they were submitted.
+        self._jobs: Dict[str, Deque[Tuple[float, Dict[str, Any]]]] = defaultdict(deque)
+
+    async def heartbeat(self, worker_id: str, capacity: int, running: int):
+        self._workers[worker_id] = {
+            "capacity": capacity,
+            "running": running,
+            "heartbeat_at": time.monotonic(),
+        }
+
+    async def unregister(self, worker_id: str) -> int:
+        self._workers.pop(worker_id, None)
+        return len(self._jobs.pop(worker_id, ()))
+
+    async def workers(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "worker_id": worker_id,
+                "capacity": worker["capacity"],
+                "running": worker["running"],
+                "pending": len(self._jobs.get(worker_id, ())),
+                "alive": now - worker["heartbeat_at"] <= self._heartbeat_timeout,
+            }
+            for worker_id, worker in sorted(self._workers.items())
+        ]
+
+    async def submit(self, worker_id: str, payload: Dict[str, Any]):
+        self._jobs[worker_id].append((time.monotonic(), payload))
+
+    async def claim(self, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+        jobs = self._jobs.get(worker_id)
+        claimed = []
+        while jobs and len(claimed) < limit:
+            claimed.append(jobs.popleft()[1])
+        return claimed
+
+    async def reassign(self, from_worker_id: str, to_worker_id: str) -> int:
+        jobs = self._jobs.pop(from_worker_id, deque())
+        self._jobs[to_worker_id].extend(jobs)
+        return len(jobs)
+
+    async def expire(self, max_age: float) -> int:
+        oldest = time.monotonic() - max_age
+        expired = 0
+        for jobs in self._jobs.values():
+            kept = deque(job for job in jobs if job[0] >= oldest)
+            expired += len(jobs) - len(kept)
+            jobs.clear()
+            jobs.extend(kept)
+        return expired
+
+
+def _load(worker: Dict[str, Any]) -> float:
+    return (worker["running"] + worker["pending"]) / worker["capacity"]
+
+
+def _pick(
+    workers: List[Dict[str, Any]], exclude: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """The least loaded live worker with room for another session."""
+    available = [
+        w
+        for w in workers
+        if w["alive"] and w["worker_id"] != exclude and w["running"] + w["pending"] < w["capacity"]
+    ]
+    return min(available, key=_load, default=None)
+
+
+async def _hand_over(channel: VoiceBotJobChannel, worker_id: str, pending: int):
+    """Move the jobs `worker_id` didn't claim to another worker, if any has room."""
+    target = _pick(await channel.workers(), exclude=worker_id)
+    if target:
+        moved = await channel.reassign(worker_id, target["worker_id"])
+        logger.info(f"Moved {moved} job(s) to worker {target['worker_id']}")
+    else:
+        # Nowhere to go, unregistering drops them and the rooms expire unused.
+        logger.error(f"No worker available for {pending} job(s) of {worker_id}")
+
+
+class VoiceBotDispatcher:
+    """
+    Places voice bot sessions on worker nodes, the least loaded first (bots
+    running plus jobs not picked up yet, over capacity).
+
+    Nodes that stop sending heartbeats are left out, and `start()` runs a
+    loop that moves the jobs they didn't pick up to live nodes and forgets
+    them. Sessions a dead node was running are gone with it. The loop also
+    deletes jobs no node claimed within `job_timeout`.
+
+    Room tokens are encrypted in the jobs, they grant access to the room
+    until it expires.
+    """
+
+    def __init__(
+        self,
+        channel: VoiceBotJobChannel,
+        check_interval: float = HEARTBEAT_INTERVAL_SECONDS,
+        job_timeout: float = JOB_TIMEOUT_SECONDS,
+    ):
+        self._channel = channel
+        self._check_interval = check_interval
+        self._job_timeout = job_timeout
+        self._task: Optional[asyncio.Task] = None
+        # Picking a node and submitting to it go together, so sessions
+        # arriving at once see each other's jobs and spread out.
+        self._lock = asyncio.Lock()
+
+    def start(self):
+        self._task = asyncio.create_task(self._check_loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def has_capacity(self) -> bool:
+        return _pick(await self._channel.workers()) is not None
+
+    async def dispatch(self, auth: Auth, params: BotParams, room_url: str, room_token: str) -> str:
+        """Send a session to a node and return its id, raises `VoiceBotCapacityError` if all are full."""
+        payload = {
+            "user_id": auth.user_id,
+            "params": params.model_dump(mode="json"),
+            "room_url": room_url,
+            # The key derivation takes a while, keep it off the event loop.
+            "room_token": await asyncio.to_thread(encrypt_with_secret, room_token),
+        }
+        async with self._lock:
+            worker = _pick(await self._channel.workers())
+            if worker is None:
+                Metrics.increment("voice_bot_rejected")
+                raise VoiceBotCapacityError()
+            await self._channel.submit(worker["worker_id"], payload)
+        Metrics.increment("voice_bot_dispatched")
+        logger.debug(
+            f"Voice bot session for {params.conversation_id} sent to worker {worker['worker_id']}"
+        )
+        return worker["worker_id"]
+
+    async def status(self) -> List[Dict[str, Any]]:
+        return await self._channel.workers()
+
+    async def check_workers(self):
+        workers = await self._channel.workers()
+        for worker in workers:
+            if worker["alive"]:
+                continue
+            logger.warning(f"Voice bot worker {worker['worker_id']} stopped sending heartbeats")
+            Metrics.increment("voice_bot_worker_lost")
+            try:
+                await self._forget(worker)
+            except Exception as e:
+                # Tried again on the next check, the other workers still get handled.
+                logger.error(f"Unable to forget voice bot worker {worker['worker_id']}: {e}")
+        expired = await self._channel.expire(self._job_timeout)
+        if expired:
+            Metrics.increment("voice_bot_jobs_expired", expired)
+            logger.error(f"Deleted {expired} voice bot job(s) no worker claimed")
+
+    async def _forget(self, worker: Dict[str, Any]):
+        async with self._lock:
+            if worker["pending"]:
+                await _hand_over(self._channel, worker["worker_id"], worker["pending"])
+            dropped = await self._channel.unregister(worker["worker_id"])
+        if dropped:
+            Metrics.increment("voice_bot_jobs_dropped", dropped)
+            logger.error(f"Dropped {dropped} job(s) of voice bot worker {worker['worker_id']}")
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self._check_interval)
+            try:
+                await self.check_workers()
+            except Exception as e:
+                logger.error(f"Unable to check voice bot workers: {e}")
+
+
+async def load_session_config(
+    auth: Auth, conversation_id: str, session_factory: DatabaseSessionFactory
+) -> tuple[BotConfig, dict[str, Service]]:
+    """The bot configuration and services of a conversation, as the webapp loads them."""
+    async with get_authenticated_db_context(auth, session_factory) as db:
+        conversation = await Conversation.get_conversation_by_id(conversation_id, db)
+        if not conversation:
+            raise Exception(f"Conversation {conversation_id} not found")
+        config = BotConfig.model_validate(
+            conversation.workspace.config.copy()
+            if getattr(conversation.workspace, "config", None)
+            else {}
+        )
+        workspace_id = getattr(conversation.workspace, "workspace_id")
+        services = await Service.get_services_by_type_map(dict(config.services), db, workspace_id)
+        if config.llm_routing:
+            services.update(
+                await Service.get_llm_route_services(
+                    [route.provider for route in config.llm_routing.providers], db, workspace_id
+                )
+            )
+    return config, services
+
+
+class VoiceBotWorkerNode:
+    """
+    The daemon of a worker node (`sesame voice-worker`): registers with
+    `capacity`, sends heartbeats and runs the sessions placed on it with a
+    local `VoiceBotSupervisor`.
+
+    Jobs only carry who asked for which conversation and the room, the
+    node loads the configuration and service keys itself.
+    """
+
+    def __init__(
+        self,
+        channel: VoiceBotJobChannel,
+        supervisor: VoiceBotSupervisor,
+        session_factory: Optional[DatabaseSessionFactory] = None,
+        worker_id: Optional[str] = None,
+        capacity: int = MAX_CONCURRENT_BOTS,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS,
+        poll_interval: float = POLL_INTERVAL_SECONDS,
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._channel = channel
+        self._supervisor = supervisor
+        self._session_factory = session_factory
+        self._capacity = capacity
+        self._heartbeat_interval = heartbeat_interval
+        self._poll_interval = poll_interval
+        self._stopping = asyncio.Event()
+
+    @property
+    def running(self) -> int:
+        return self._supervisor.in_use
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        own_session_factory = self._session_factory is None
+        if self._session_factory is None:
+            self._session_factory = DatabaseSessionFactory()
+        self._supervisor.start()
+        await self._channel.register(self.worker_id, self._capacity)
+        logger.info(f"Voice bot worker {self.worker_id} ready for {self._capacity} bot(s)")
+        heartbeats = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                free = self._capacity - self.running
+                if free > 0:
+                    for job in await self._channel.claim(self.worker_id, free):
+                        await self._start(job)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeats.cancel()
+            await self._supervisor.drain()
+            await self._leave()
+            if own_session_factory:
+                await self._session_factory.engine.dispose()
+
+    async def _leave(self):
+        """Hand the jobs we didn't claim to another node and unregister."""
+        try:
+            worker = next(
+                (w for w in await self._channel.workers() if w["worker_id"] == self.worker_id), None
+            )
+            if worker and worker["pending"]:
+                await _hand_over(self._channel, self.worker_id, worker["pending"])
+            dropped = await self._channel.unregister(self.worker_id)
+            if dropped:
+                Metrics.increment("voice_bot_jobs_dropped", dropped)
+                logger.error(f"Dropped {dropped} job(s) waiting for worker {self.worker_id}")
+        except Exception as e:
+            # The dispatcher forgets us once our heartbeats are overdue.
+            logger.error(f"Unable to unregister voice bot worker {self.worker_id}: {e}")
+
+    async def _start(self, job: Dict[str, Any]):
+        auth = Auth(job["user_id"])
+        params = BotParams.model_validate(job["params"])
+        try:
+            await self._supervisor.reserve()
+        except VoiceBotCapacityError:
+            logger.error(f"No capacity left for conversation {params.conversation_id}")
+            return
+        try:
+            assert self._session_factory
+            config, services = await load_session_config(
+                auth, str(params.conversation_id), self._session_factory
+            )
+            room_token = await asyncio.to_thread(decrypt_with_secret, job["room_token"])
+            self._supervisor.launch(auth, params, config, services, job["room_url"], room_token)
+        except Exception as e:
+            self._supervisor.release()
+            logger.error(f"Unable to start voice bot for {params.conversation_id}: {e}")
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self._channel.heartbeat(self.worker_id, self._capacity, self.running)
+            except Exception as e:
+                logger.error(f"Unable to send heartbeat: {e}")
+            await asyncio.sleep(self._heartbeat_interval)
@@ -0,0 +1,198 @@
+import os
+import re
+from collections import deque
+from typing import Deque, Optional
+
+from bots.voice.vad import SharedSileroVADAnalyzer
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.audio.vad.vad_analyzer import VADParams, VADState
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    TranscriptionFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+ADAPTIVE_VAD = bool(int(os.getenv("SESAME_VAD_ADAPTIVE", "1") or 0))
+MIN_STOP_SECS = float(os.getenv("SESAME_VAD_MIN_STOP_SECS", "0.2"))
+MAX_STOP_SECS = float(os.getenv("SESAME_VAD_MAX_STOP_SECS", "1.2"))
+# Speech resuming this soon after the end of a turn means we ended it too early.
+PREMATURE_WINDOW_SECS = float(os.getenv("SESAME_VAD_PREMATURE_WINDOW", "1.0"))
+
+# Pauses needed before adapting, and how many of the latest ones we look at.
+_MIN_PAUSES = 8
+_MAX_PAUSES = 50
+# Wait for this share of the user's pauses (plus a margin) before ending a turn.
+_PAUSE_PERCENTILE = 0.9
+_MARGIN_SECS = 0.1
+_SMOOTHING = 0.3
+
+# Transcripts ending like this are probably not finished.
+_INCOMPLETE_RE = re.compile(
+    r"(\b(and|but|or|so|because|then|um+|uh+|like|the|a|to|of|with|if)|,)\s*$", re.IGNORECASE
+)
+_COMPLETE_RE = re.compile(r"[.?!]\s*$")
+
+
+class AdaptiveEndpointing:
+    """
+    Decides how long the user must stay silent before their turn ends.
+
+    Starts at the pipeline's `stop_secs` and moves it, within `min_secs` and
+    `max_secs`, towards the 90th percentile of the user's pauses: the short
+    ones where they went on speaking and the long ones that ended a turn too
+    early (they spoke again within `premature_window`). The last transcript
+    shifts the value for the current pause: a trailing "and", "um" or comma
+    waits longer, a full stop shorter.
+
+    Premature turn ends are counted (`vad_premature_turn_ends` next to
+    `vad_turn_ends`) whether adapting is enabled or not.
+    """
+
+    def __init__(
+        self,
+        stop_secs: float,
+        min_secs: float = MIN_STOP_SECS,
+        max_secs: float = MAX_STOP_SECS,
+        premature_window: float = PREMATURE_WINDOW_SECS,
+        enabled: bool = ADAPTIVE_VAD,
+    ):
+        self._min_secs = min(min_secs, stop_secs)
+        self._max_secs = max(max_secs, stop_secs)
+        self._premature_window = premature_window
+        self._enabled = enabled
+        self._stop_secs = stop_secs
+        self._pauses: Deque[float] = deque(maxlen=_MAX_PAUSES)
+        self._last_text = ""
+        self._last_turn_end: Optional[float] = None
+        self._last_silence = 0.0
+        self.turn_ends = 0
+        self.premature_turn_ends = 0
+
+    @property
+    def base_stop_secs(self) -> float:
+        return self._stop_secs
+
+    def reset(self, stop_secs: float):
+        """The client picked new VAD params, start over from them."""
+        self._stop_secs = stop_secs
+        self._min_secs = min(self._min_secs, stop_secs)
+        self._max_secs = max(self._max_secs, stop_secs)
+        self._pauses.clear()
+
+    def stop_secs(self) -> float:
+        """Silence that ends the current turn."""
+        if not self._enabled:
+            return self._stop_secs
+        stop_secs = self._stop_secs
+        if _INCOMPLETE_RE.search(self._last_text):
+            stop_secs *= 1.5
+        elif _COMPLETE_RE.search(self._last_text):
+            stop_secs *= 0.75
+        return max(self._min_secs, min(self._max_secs, stop_secs))
+
+    def observe_transcript(self, text: str):
+        self._last_text = text
+
+    def observe_pause(self, seconds: float):
+        """The user went quiet for `seconds` and went on speaking."""
+        self._pauses.append(seconds)
+        self._adapt()
+
+    def observe_turn_end(self, now: float, silence: float):
+        self.turn_ends += 1
+        Metrics.increment("vad_turn_ends")
+        self._last_turn_end = now
+        self._last_silence = silence
+        self._last_text = ""
+
+    def observe_speech_start(self, now: float):
+        if self._last_turn_end is None:
+            return
+        gap = now - self._last_turn_end
+        self._last_turn_end = None
+        if gap <= self._premature_window:
+            self.premature_turn_ends += 1
+            Metrics.increment("vad_premature_turn_ends")
+            # The whole silence was a pause, not the end of the turn.
+            self.observe_pause(self._last_silence + gap)
+
+    def _adapt(self):
+        if not self._enabled or len(self._pauses) < _MIN_PAUSES:
+            return
+        pauses = sorted(self._pauses)
+        index = min(len(pauses) - 1, int(len(pauses) * _PAUSE_PERCENTILE))
+        target = max(self._min_secs, min(self._max_secs, pauses[index] + _MARGIN_SECS))
+        self._stop_secs += (target - self._stop_secs) * _SMOOTHING
+
+    def create_processor(self) -> "EndpointingTranscriptProcessor":
+        return EndpointingTranscriptProcessor(self)
+
+
+class EndpointingTranscriptProcessor(FrameProcessor):
+    """Hands transcripts to the endpointing, goes after the STT service."""
+
+    def __init__(self, endpointing: AdaptiveEndpointing):
+        super().__init__()
+        self._endpointing = endpointing
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, (TranscriptionFrame, InterimTranscriptionFrame)):
+            self._endpointing.observe_transcript(frame.text)
+        elif isinstance(frame, (EndFrame, CancelFrame)):
+            endpointing = self._endpointing
+            logger.info(
+                f"Turn ends: {endpointing.turn_ends}, premature: {endpointing.premature_turn_ends}, "
+                f"stop_secs: {endpointing.base_stop_secs:.2f}"
+            )
+
+        await self.push_frame(frame, direction)
+
+
+class AdaptiveVADAnalyzer(SharedSileroVADAnalyzer):
+    """Silero VAD whose stop time comes from `AdaptiveEndpointing`."""
+
+    def __init__(
+        self,
+        endpointing: AdaptiveEndpointing,
+        *,
+        sample_rate: int = 16000,
+        params: VADParams = VADParams(),
+    ):
+        self._endpointing = endpointing
+        # Audio analyzed so far, in seconds, our clock for pauses.
+        self._audio_secs = 0.0
+        super().__init__(sample_rate=sample_rate, params=params)
+
+    def set_params(self, params: VADParams):
+        super().set_params(params)
+        if self._endpointing.base_stop_secs != params.stop_secs:
+            self._endpointing.reset(params.stop_secs)
+
+    def analyze_audio(self, buffer) -> VADState:
+        frame_secs = self._vad_frames / self.sample_rate
+        self._vad_stop_frames = max(1, round(self._endpointing.stop_secs() / frame_secs))
+
+        previous = self._vad_state
+        stopping_count = self._vad_stopping_count
+        buffered = len(self._vad_buffer) + len(buffer)
+
+        state = super().analyze_audio(buffer)
+
+        if buffered >= self._vad_frames_num_bytes:
+            self._audio_secs += frame_secs
+        if previous == VADState.STOPPING and state == VADState.SPEAKING:
+            self._endpointing.observe_pause(stopping_count * frame_secs)
+        elif previous in (VADState.SPEAKING, VADState.STOPPING) and state == VADState.QUIET:
+            silence = (stopping_count + 1) * frame_secs
+            self._endpointing.observe_turn_end(self._audio_secs, silence)
+        elif previous in (VADState.QUIET, VADState.STARTING) and state == VADState.SPEAKING:
+            # Speech started `start_secs` before it was confirmed.
+            self._endpointing.observe_speech_start(self._audio_secs - self.params.start_secs)
+        return state
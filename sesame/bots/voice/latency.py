@@ -0,0 +1,185 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncContextManager, Callable, Deque, Dict, List, Mapping, Optional
+
+from common.models import Service, VoiceTurnLatency
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    Frame,
+    MetricsFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import TTFBMetricsData
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+# Seconds between writes of the turns of a running session.
+FLUSH_INTERVAL_SECONDS = float(os.getenv("SESAME_VOICE_LATENCY_FLUSH_INTERVAL", "30"))
+
+# The frames the tracker looks at.
+_TRACKED_FRAMES = (
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+    TranscriptionFrame,
+    MetricsFrame,
+    BotStartedSpeakingFrame,
+)
+
+
+class _Turn:
+    def __init__(self):
+        self.stopped_at: Optional[float] = None
+        self.transcribed_at: Optional[float] = None
+        self.llm_ttfb: Optional[float] = None
+        self.tts_ttfb: Optional[float] = None
+        # The provider that answered, when it isn't the workspace's `llm`.
+        self.llm_provider: Optional[str] = None
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return None if seconds is None else round(seconds * 1000)
+
+
+class VoiceTurnLatencyProcessor(FrameProcessor):
+    def __init__(self, tracker: "VoiceTurnLatencyTracker"):
+        super().__init__()
+        self._tracker = tracker
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.DOWNSTREAM:
+            self._tracker.on_frame(frame)
+
+        await self.push_frame(frame, direction)
+
+
+class VoiceTurnLatencyTracker:
+    """
+    Breaks the latency of each voice turn down into:
+
+    - STT: the user stopped speaking (as decided by the VAD) to the last
+      final transcription (0 if it arrived earlier),
+    - LLM and TTS time to first byte, from the services' TTFB metrics, with
+      the LLM provider that answered (with routing, not always `llm`),
+    - end to end: the user stopped speaking to the bot started speaking.
+
+    Transcriptions are only seen before the user aggregator and metrics only
+    after the services, so a processor (`create_processor()`) goes after the
+    STT service and another one after the output transport. Turns the user
+    interrupts are dropped. They are stored with `save()`, every
+    `FLUSH_INTERVAL_SECONDS` while the session runs (see `run_flushes()`).
+    """
+
+    def __init__(self):
+        self.turns: List[dict] = []
+        self._session: Optional[dict] = None
+        self._llm_providers: Dict[str, str] = {}
+        self._tts_name: Optional[str] = None
+        self._turn: Optional[_Turn] = None
+        # Frames reach both processors, only handle them once. Only tracked
+        # frames are remembered, the others (e.g. audio) would push them out.
+        self._seen: Deque[int] = deque(maxlen=64)
+
+    def set_session(
+        self,
+        conversation_id: str,
+        workspace_id: str,
+        services: dict[str, Service],
+        llm_providers: Mapping[str, str],
+        tts: FrameProcessor,
+    ):
+        """`llm_providers` has the provider of every LLM service, by name."""
+        self._session = {
+            "conversation_id": conversation_id,
+            "workspace_id": workspace_id,
+            "stt_provider": str(services["stt"].service_provider),
+            "llm_provider": str(services["llm"].service_provider),
+            "tts_provider": str(services["tts"].service_provider),
+        }
+        self._llm_providers = dict(llm_providers)
+        self._tts_name = tts.name
+
+    def create_processor(self) -> VoiceTurnLatencyProcessor:
+        return VoiceTurnLatencyProcessor(self)
+
+    def on_frame(self, frame: Frame):
+        if not isinstance(frame, _TRACKED_FRAMES) or frame.id in self._seen:
+            return
+        self._seen.append(frame.id)
+
+        now = time.monotonic()
+        turn = self._turn
+        if isinstance(frame, UserStartedSpeakingFrame):
+            self._turn = _Turn()
+        elif turn is None:
+            return
+        elif isinstance(frame, TranscriptionFrame):
+            turn.transcribed_at = now
+        elif isinstance(frame, UserStoppedSpeakingFrame):
+            turn.stopped_at = now
+        elif turn.stopped_at is None:
+            return
+        elif isinstance(frame, MetricsFrame):
+            for data in frame.data:
+                if not isinstance(data, TTFBMetricsData):
+                    continue
+                if data.processor in self._llm_providers and turn.llm_ttfb is None:
+                    turn.llm_ttfb = data.value
+                    turn.llm_provider = self._llm_providers[data.processor]
+                elif data.processor == self._tts_name and turn.tts_ttfb is None:
+                    turn.tts_ttfb = data.value
+        elif isinstance(frame, BotStartedSpeakingFrame):
+            self._turn = None
+            self._add_turn(turn, now)
+
+    async def save(self, db: AsyncSession):
+        # Turns ending while they are written go in the next write.
+        turns, self.turns = self.turns, []
+        if turns:
+            await VoiceTurnLatency.save_turns(turns, db)
+
+    async def run_flushes(
+        self,
+        db_context: Callable[[], AsyncContextManager[AsyncSession]],
+        stopped: asyncio.Event,
+        interval: float = FLUSH_INTERVAL_SECONDS,
+    ):
+        """
+        Saves the turns every `interval` seconds, each time in a transaction
+        of its own from `db_context`, and a last time once `stopped` is set.
+        """
+        while not stopped.is_set():
+            try:
+                await asyncio.wait_for(stopped.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                async with db_context() as db:
+                    await self.save(db)
+            except Exception as e:
+                logger.error(f"Error storing voice turn latencies: {e}")
+
+    def _add_turn(self, turn: _Turn, now: float):
+        assert turn.stopped_at is not None
+        stt = None
+        if turn.transcribed_at is not None:
+            stt = max(0.0, turn.transcribed_at - turn.stopped_at)
+        latency = {
+            "stt_ms": _ms(stt),
+            "llm_ttfb_ms": _ms(turn.llm_ttfb),
+            "tts_ttfb_ms": _ms(turn.tts_ttfb),
+            "end_to_end_ms": _ms(now - turn.stopped_at),
+        }
+        logger.debug(f"Voice turn latency: {latency}")
+        if self._session:
+            row = {**self._session, **latency}
+            if turn.llm_provider:
+                row["llm_provider"] = turn.llm_provider
+            self.turns.append(row)
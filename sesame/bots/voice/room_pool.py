@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+import aiohttp
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.transports.services.helpers.daily_rest import (
+    DailyRESTHelper,
+    DailyRoomObject,
+    DailyRoomParams,
+    DailyRoomProperties,
+)
+
+# Rooms kept ready per transport API key. 0 disables the pool, rooms are
+# then created on connect and deleted when the bot is done.
+ROOM_POOL_SIZE = int(os.getenv("SESAME_DAILY_ROOM_POOL_SIZE", "0") or 0)
+# Pooled rooms expire (and are cleaned up by Daily) this many seconds after
+# being created instead of being deleted by the bot.
+ROOM_TTL_SECONDS = int(os.getenv("SESAME_DAILY_ROOM_TTL", "3600") or 3600)
+MAX_SESSION_TIME = int(os.getenv("SESAME_MAX_VOICE_SESSION_TIME", 15 * 60)) or 15 * 60
+
+# A room must outlive the longest session it can be handed to by this much.
+_EXPIRY_MARGIN_SECONDS = 60
+
+
+async def create_room_tokens(helper: DailyRESTHelper, room_url: str) -> Tuple[str, str]:
+    """Bot and user tokens for a room, requested at the same time."""
+    bot_token, user_token = await asyncio.gather(
+        helper.get_token(room_url, MAX_SESSION_TIME),
+        helper.get_token(room_url, MAX_SESSION_TIME),
+    )
+    return bot_token, user_token
+
+
+class _RoomQueue:
+    def __init__(self, helper: DailyRESTHelper):
+        self.helper = helper
+        self.rooms: Deque[DailyRoomObject] = deque()
+        self.refill_task: Optional[asyncio.Task] = None
+
+
+def is_pooled(room: DailyRoomObject) -> bool:
+    """Whether a room came from the pool, only those expire on their own."""
+    return room.config.exp is not None
+
+
+class DailyRoomPool:
+    """
+    Keeps `size` Daily rooms created ahead of time for each transport API key.
+
+    Connecting then only costs the two meeting tokens (requested
+    concurrently). Pooled rooms are created with an expiry and are never
+    reused once handed out: Daily removes them when they expire. Rooms
+    returned unused with `recycle()` go back to the pool, and rooms too
+    close to expiry to host a full session are dropped. A queue is
+    refilled in the background after every `acquire()`.
+
+    Queues are created on the first `acquire()` for an API key, nothing is
+    created at startup (that would need every user's transport key). The
+    first connect per key after a restart is a miss and pays for creating
+    its room, later ones are served from the pool.
+    """
+
+    def __init__(self, size: int = ROOM_POOL_SIZE, room_ttl: int = ROOM_TTL_SECONDS):
+        if size > 0 and room_ttl < MAX_SESSION_TIME + _EXPIRY_MARGIN_SECONDS:
+            raise ValueError("Room TTL must be longer than the maximum voice session time")
+        self._size = size
+        self._room_ttl = room_ttl
+        self._queues: Dict[Tuple[str, str], _RoomQueue] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._size > 0
+
+    def available(self, api_key: str, api_url: str) -> int:
+        queue = self._queues.get((api_key, api_url))
+        return len(queue.rooms) if queue else 0
+
+    async def acquire(self, api_key: str, api_url: str) -> Tuple[DailyRoomObject, str, str]:
+        """A room for a new session with its user and bot tokens."""
+        queue = self._queue(api_key, api_url)
+
+        room = self._pop_fresh(queue)
+        if room:
+            Metrics.increment("daily_room_pool_hits")
+        else:
+            Metrics.increment("daily_room_pool_misses")
+            room = await self._create_room(queue.helper)
+        self._refill(queue)
+
+        try:
+            bot_token, user_token = await create_room_tokens(queue.helper, room.url)
+        except BaseException:
+            # One of the tokens may have been issued, the room isn't handed
+            # to anyone else. It expires on its own.
+            Metrics.increment("daily_room_pool_discarded")
+            logger.debug(f"Discarding room {room.name}, its tokens could not be created")
+            raise
+        return room, user_token, bot_token
+
+    def recycle(self, api_key: str, api_url: str, room: DailyRoomObject):
+        """Give back a room nobody joined."""
+        queue = self._queues.get((api_key, api_url))
+        if queue and is_pooled(room) and len(queue.rooms) < self._size and self._is_fresh(room):
+            queue.rooms.append(room)
+
+    async def close(self):
+        for queue in self._queues.values():
+            if queue.refill_task:
+                queue.refill_task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queues.clear()
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    def _queue(self, api_key: str, api_url: str) -> _RoomQueue:
+        queue = self._queues.get((api_key, api_url))
+        if queue is None:
+            if self._session is None:
+                self._session = aiohttp.ClientSession()
+            helper = DailyRESTHelper(
+                daily_api_key=api_key,
+                daily_api_url=api_url,
+                aiohttp_session=self._session,
+            )
+            queue = self._queues[(api_key, api_url)] = _RoomQueue(helper)
+        return queue
+
+    def _is_fresh(self, room: DailyRoomObject) -> bool:
+        exp = room.config.exp
+        return exp is None or exp - time.time() > MAX_SESSION_TIME + _EXPIRY_MARGIN_SECONDS
+
+    def _pop_fresh(self, queue: _RoomQueue) -> Optional[DailyRoomObject]:
+        while queue.rooms:
+            room = queue.rooms.popleft()
+            if self._is_fresh(room):
+                return room
+            Metrics.increment("daily_room_pool_expired")
+            logger.debug(f"Dropping pooled room {room.name}, it expires too soon")
+        return None
+
+    async def _create_room(self, helper: DailyRESTHelper) -> DailyRoomObject:
+        params = DailyRoomParams(
+            properties=DailyRoomProperties(exp=time.time() + self._room_ttl)
+        )
+        return await helper.create_room(params=params)
+
+    def _refill(self, queue: _RoomQueue):
+        if queue.refill_task is None or queue.refill_task.done():
+            queue.refill_task = asyncio.create_task(self._fill(queue))
+            self._tasks.add(queue.refill_task)
+            queue.refill_task.add_done_callback(self._tasks.discard)
+
+    async def _fill(self, queue: _RoomQueue):
+        missing = self._size - len(queue.rooms)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(
+            *(self._create_room(queue.helper) for _ in range(missing)), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning(f"Unable to create pooled room: {result}")
+            elif len(queue.rooms) < self._size:
+                queue.rooms.append(result)
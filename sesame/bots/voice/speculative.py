@@ -0,0 +1,350 @@
+import asyncio
+import copy
+import os
+import re
+from typing import List, Optional
+
+from bots.circuit_breaker import with_circuit_breaker
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.frames.frames import (
+    CancelFrame,
+    EndFrame,
+    ErrorFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMUpdateSettingsFrame,
+    MetricsFrame,
+    StartFrame,
+    StartInterruptionFrame,
+    SystemFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+SPECULATIVE_LLM = bool(int(os.getenv("SESAME_LLM_SPECULATIVE", "0") or 0))
+# An interim transcript that hasn't changed for this long is worth answering.
+SPECULATIVE_STABLE_SECS = int(os.getenv("SESAME_LLM_SPECULATIVE_STABLE_MS", "250") or 250) / 1000
+
+# Shorter interim transcripts are rarely what the user ends up saying.
+_MIN_WORDS = 2
+_MAX_PER_TURN = 3
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_PUNCTUATION_RE.sub(" ", text.lower()).split())
+
+
+class _Speculation:
+    def __init__(self, text: str):
+        self.text = _normalize(text)
+        self.committed = False
+        self.done = False
+        self.frames: List[Frame] = []
+        # The final context, in case the response fails after all.
+        self.context_frame: Optional[OpenAILLMContextFrame] = None
+
+
+class SpeculativeInference:
+    """
+    Starts answering the user while the STT service is still finalizing.
+
+    Once an interim transcript stays the same for `stable_secs` (or the user
+    stops speaking), a second instance of the LLM service (`shadow`) gets the
+    context with that text as the user's message, and its response is held
+    back. When the user aggregator pushes the context with the final
+    transcript and it says the same (ignoring case and punctuation), the
+    held back response goes on instead of a new LLM request; otherwise it is
+    cancelled. With no `shadow` both processors only pass frames on.
+
+    `create_processor()` goes after the STT service, where interim
+    transcripts are still seen, and `create_gate()` right before the LLM
+    service. Speculations, hits and wasted ones are counted
+    (`llm_speculations`, `llm_speculation_hits`, `llm_speculation_misses`).
+    """
+
+    def __init__(
+        self,
+        context: OpenAILLMContext,
+        shadow: Optional[LLMService],
+        stable_secs: float = SPECULATIVE_STABLE_SECS,
+    ):
+        self._context = context
+        self._shadow = shadow
+        self.stable_secs = stable_secs
+        self._gate: Optional["SpeculationGate"] = None
+        self._speculation: Optional[_Speculation] = None
+        self._finals: List[str] = []
+        self._turn_speculations = 0
+        self.speculations = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._shadow is not None
+
+    def create_processor(self) -> "SpeculationTranscriptProcessor":
+        return SpeculationTranscriptProcessor(self)
+
+    def create_gate(self) -> "SpeculationGate":
+        self._gate = SpeculationGate(self, self._shadow)
+        return self._gate
+
+    #
+    # Transcripts, from `SpeculationTranscriptProcessor`
+    #
+
+    def on_user_started_speaking(self):
+        # Like the user aggregator, a new start drops what wasn't sent yet.
+        self._finals = []
+        self._turn_speculations = 0
+
+    def on_final_transcript(self, text: str):
+        self._finals.append(text)
+
+    async def speculate(self, interim: str):
+        if not self._gate or self._turn_speculations >= _MAX_PER_TURN:
+            return
+        text = " ".join(self._finals + [interim])
+        if len(_normalize(text).split()) < _MIN_WORDS:
+            return
+        current = self._speculation
+        if current and not current.committed and current.text == _normalize(text):
+            return
+        if self._context.tools:
+            # Functions could run twice, or for something never said.
+            return
+
+        await self._cancel()
+
+        context = copy.copy(self._context)
+        context._messages = copy.deepcopy(self._context.messages)
+        context.add_message({"role": "user", "content": text})
+
+        logger.debug(f"Speculating on [{text}]")
+        self._speculation = _Speculation(text)
+        self._turn_speculations += 1
+        self.speculations += 1
+        Metrics.increment("llm_speculations")
+        await self._gate.start_speculation(OpenAILLMContextFrame(context))
+
+    #
+    # LLM, from `SpeculationGate`
+    #
+
+    async def on_context(self, frame: OpenAILLMContextFrame) -> bool:
+        """The user aggregator sent the final transcript, True if it's answered already."""
+        speculation = self._speculation
+        if not speculation or speculation.committed:
+            return False
+        if speculation.text != _normalize(" ".join(self._finals)):
+            await self._cancel()
+            return False
+
+        logger.debug(f"Speculative response for [{speculation.text}] committed")
+        speculation.committed = True
+        speculation.context_frame = frame
+        self.hits += 1
+        Metrics.increment("llm_speculation_hits")
+        assert self._gate
+        for buffered in speculation.frames:
+            await self._gate.push_frame(buffered)
+        speculation.frames = []
+        if speculation.done:
+            self._speculation = None
+        return True
+
+    async def on_interruption(self):
+        # Anything the user says now makes the current speculation stale.
+        await self._cancel()
+
+    async def on_shadow_frame(self, frame: Frame):
+        speculation = self._speculation
+        if not speculation:
+            return
+        # Of its own system frames, only its metrics (e.g. time to first
+        # token) go with the response.
+        if isinstance(frame, EndFrame) or (
+            isinstance(frame, SystemFrame) and not isinstance(frame, MetricsFrame)
+        ):
+            return
+        if speculation.committed:
+            assert self._gate
+            await self._gate.push_frame(frame)
+        else:
+            speculation.frames.append(frame)
+        if isinstance(frame, LLMFullResponseEndFrame):
+            speculation.done = True
+            if speculation.committed:
+                self._speculation = None
+
+    async def on_shadow_error(self, error: ErrorFrame):
+        speculation = self._speculation
+        if not speculation:
+            return
+        logger.warning(f"Speculative response for [{speculation.text}] failed: {error.error}")
+        self._speculation = None
+        if speculation.committed:
+            # Too late to skip the LLM service, ask it after all.
+            assert self._gate and speculation.context_frame
+            await self._gate.push_frame(speculation.context_frame)
+        else:
+            self.misses += 1
+            Metrics.increment("llm_speculation_misses")
+
+    async def _cancel(self):
+        speculation = self._speculation
+        if not speculation:
+            return
+        self._speculation = None
+        if not speculation.committed:
+            logger.debug(f"Speculative response for [{speculation.text}] dropped")
+            self.misses += 1
+            Metrics.increment("llm_speculation_misses")
+        if not speculation.done and self._gate:
+            await self._gate.stop_speculation()
+
+    def log_summary(self):
+        if not self.speculations:
+            return
+        logger.info(
+            f"Speculative LLM responses: {self.speculations}, hits: {self.hits} "
+            f"({self.hits / self.speculations:.0%}), wasted: {self.misses} "
+            f"({self.misses / self.speculations:.0%})"
+        )
+
+
+class SpeculationTranscriptProcessor(FrameProcessor):
+    """Watches transcripts for stable ones, goes after the STT service."""
+
+    def __init__(self, speculation: SpeculativeInference):
+        super().__init__()
+        self._speculation = speculation
+        self._interim = ""
+        self._stable_task: Optional[asyncio.Task] = None
+
+    async def cleanup(self):
+        await super().cleanup()
+        self._cancel_stable_task()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if self._speculation.enabled:
+            if isinstance(frame, UserStartedSpeakingFrame):
+                self._interim = ""
+                self._cancel_stable_task()
+                self._speculation.on_user_started_speaking()
+            elif isinstance(frame, InterimTranscriptionFrame):
+                if frame.text != self._interim:
+                    self._interim = frame.text
+                    self._cancel_stable_task()
+                    self._stable_task = asyncio.create_task(self._speculate_when_stable())
+            elif isinstance(frame, TranscriptionFrame):
+                self._interim = ""
+                self._cancel_stable_task()
+                self._speculation.on_final_transcript(frame.text)
+            elif isinstance(frame, UserStoppedSpeakingFrame) and self._interim:
+                # The final transcript is still to come, no need to wait.
+                self._cancel_stable_task()
+                await self._speculation.speculate(self._interim)
+
+        await self.push_frame(frame, direction)
+
+    async def _speculate_when_stable(self):
+        await asyncio.sleep(self._speculation.stable_secs)
+        self._stable_task = None
+        await self._speculation.speculate(self._interim)
+
+    def _cancel_stable_task(self):
+        if self._stable_task:
+            self._stable_task.cancel()
+            self._stable_task = None
+
+
+class _SpeculationSink(FrameProcessor):
+    """Receives what the shadow LLM service pushes, in either direction."""
+
+    def __init__(self, speculation: SpeculativeInference):
+        super().__init__()
+        self._speculation = speculation
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if direction == FrameDirection.DOWNSTREAM:
+            await self._speculation.on_shadow_frame(frame)
+        elif isinstance(frame, ErrorFrame):
+            await self._speculation.on_shadow_error(frame)
+
+
+class SpeculationGate(FrameProcessor):
+    """
+    Goes right before the LLM service. Runs the shadow LLM service next to
+    the pipeline and skips the final context when its response is used, the
+    response then passes through the LLM service untouched.
+
+    The shadow goes through the circuit breaker of its provider, so
+    speculating stops while the circuit is open and its requests count
+    towards the provider's health.
+    """
+
+    def __init__(self, speculation: SpeculativeInference, shadow: Optional[LLMService]):
+        super().__init__()
+        self._speculation = speculation
+        self._shadow: Optional[FrameProcessor] = None
+        self._sinks: List[_SpeculationSink] = []
+        if shadow:
+            self._shadow = with_circuit_breaker(shadow)
+            # One sink after the shadow for its responses and one before it
+            # for the errors it pushes upstream.
+            upstream, downstream = _SpeculationSink(speculation), _SpeculationSink(speculation)
+            upstream.link(self._shadow)
+            self._shadow.link(downstream)
+            self._sinks = [upstream, downstream]
+
+    async def start_speculation(self, frame: OpenAILLMContextFrame):
+        assert self._shadow
+        await self._shadow.queue_frame(frame)
+
+    async def stop_speculation(self):
+        assert self._shadow
+        # Cancels the request in progress, the sink drops what is left.
+        await self._shadow.queue_frame(StartInterruptionFrame())
+
+    async def cleanup(self):
+        await super().cleanup()
+        if self._shadow:
+            await self._shadow.cleanup()
+        for sink in self._sinks:
+            await sink.cleanup()
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if not self._shadow or direction != FrameDirection.DOWNSTREAM:
+            await self.push_frame(frame, direction)
+            return
+
+        if isinstance(frame, (StartFrame, EndFrame, CancelFrame, LLMUpdateSettingsFrame)):
+            await self._shadow.queue_frame(frame)
+            if isinstance(frame, (EndFrame, CancelFrame)):
+                self._speculation.log_summary()
+        elif isinstance(frame, StartInterruptionFrame):
+            await self._speculation.on_interruption()
+        elif isinstance(frame, OpenAILLMContextFrame) and await self._speculation.on_context(frame):
+            return
+
+        await self.push_frame(frame, direction)
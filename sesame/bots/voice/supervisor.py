@@ -0,0 +1,310 @@
+import asyncio
+import os
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+from multiprocessing.connection import wait
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import psutil
+from bots.types import BotConfig, BotParams
+from bots.voice.worker_pool import VoiceBotWorkerPool
+from common.auth import Auth
+from common.metrics import Metrics
+from common.models import Service
+from loguru import logger
+
+# Voice bots allowed to run at the same time by one webapp process (`sesame
+# run` starts one). With several uvicorn workers, each one gets this many.
+MAX_CONCURRENT_BOTS = int(os.getenv("SESAME_VOICE_BOT_MAX_CONCURRENT", "20") or 20)
+# Requests allowed to wait for a free slot, and for how long (seconds).
+QUEUE_SIZE = int(os.getenv("SESAME_VOICE_BOT_QUEUE_SIZE", "10") or 0)
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("SESAME_VOICE_BOT_QUEUE_TIMEOUT", "10"))
+# Sent as `Retry-After` when the host is saturated.
+RETRY_AFTER_SECONDS = int(os.getenv("SESAME_VOICE_BOT_RETRY_AFTER", "15") or 15)
+# How long shutdown waits for running bots before terminating them.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("SESAME_VOICE_BOT_DRAIN_TIMEOUT", "30"))
+
+
+class VoiceBotCapacityError(Exception):
+    def __init__(self, retry_after: int = RETRY_AFTER_SECONDS):
+        super().__init__("No voice bot capacity available")
+        self.retry_after = retry_after
+
+
+class _Bot:
+    def __init__(
+        self,
+        pid: int,
+        user_id: str,
+        conversation_id: str,
+        process: Optional[Process] = None,
+    ):
+        self.pid = pid
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.process = process
+        self.started_at = time.time()
+        self._ps: Optional[psutil.Process] = None
+
+    def status(self) -> Dict[str, Any]:
+        rss = cpu = None
+        try:
+            if self._ps is None:
+                self._ps = psutil.Process(self.pid)
+                # The first reading is always 0, it starts the measurement.
+                self._ps.cpu_percent(interval=None)
+            rss = self._ps.memory_info().rss
+            cpu = self._ps.cpu_percent(interval=None)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return {
+            "pid": self.pid,
+            "kind": "process" if self.process else "worker",
+            "uptime": round(time.time() - self.started_at, 1),
+            "rss_bytes": rss,
+            "cpu_percent": cpu,
+        }
+
+
+class VoiceBotSupervisor:
+    """
+    Runs and keeps track of the voice bots started by this process.
+
+    At most `max_concurrent` bots run at once. Above that, up to `queue_size`
+    requests wait (for `queue_timeout` seconds) for a bot to finish and the
+    rest are refused with `VoiceBotCapacityError`. Bots run on the worker
+    pool when a worker is idle, otherwise in a new process. Exited processes
+    are reaped and their exit codes recorded.
+
+    `reserve()` must be called before creating the room for a bot and be
+    followed by `launch()` or `release()`.
+
+    Counts are kept in memory, so the limit applies to one webapp process.
+    To share a host between several processes, split the budget between
+    them (`SESAME_VOICE_BOT_MAX_CONCURRENT` is per process) or dispatch to
+    worker nodes, which each enforce their own capacity.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[VoiceBotWorkerPool] = None,
+        max_concurrent: int = MAX_CONCURRENT_BOTS,
+        queue_size: int = QUEUE_SIZE,
+        queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+    ):
+        self._pool = pool
+        self._max_concurrent = max_concurrent
+        self._queue_size = queue_size
+        self._queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        # By ("process", pid) or, on the pool, ("worker", session id): a worker's
+        # pid is the next session's too.
+        self._bots: Dict[Tuple[str, int], _Bot] = {}
+        self._reserved = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._exits: Deque[Dict[str, Any]] = deque(maxlen=50)
+        self._accepting = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._monitor: Optional[threading.Thread] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._accepting = True
+        if self._pool:
+            self._pool.on_session_end = self._on_session_end
+            self._pool.start()
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="voice-bot-supervisor", daemon=True
+        )
+        self._monitor.start()
+
+    async def reserve(self):
+        """Wait for a free slot, raises `VoiceBotCapacityError` if there's none."""
+        with self._lock:
+            if not self._accepting:
+                raise VoiceBotCapacityError()
+            if self._in_use() < self._max_concurrent:
+                self._reserved += 1
+                return
+            if len(self._waiters) >= self._queue_size:
+                Metrics.increment("voice_bot_rejected")
+                raise VoiceBotCapacityError()
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+
+        Metrics.increment("voice_bot_queued")
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self._queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                    Metrics.increment("voice_bot_rejected")
+                    raise VoiceBotCapacityError()
+            # A slot was handed to us just as we gave up, take it.
+        except asyncio.CancelledError:
+            with self._lock:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+                else:
+                    self._release_locked()
+            raise
+
+    def release(self):
+        """Give back a slot from `reserve()` that won't be used."""
+        with self._lock:
+            self._release_locked()
+
+    def launch(
+        self,
+        auth: Auth,
+        params: BotParams,
+        config: BotConfig,
+        services: dict[str, Service],
+        room_url: str,
+        room_token: str,
+    ):
+        """Start a bot in a reserved slot. The slot is given back if the bot can't be started."""
+        with self._lock:
+            process = None
+            session = None
+            try:
+                if self._pool:
+                    session = self._pool.launch(
+                        auth, params, config, services, room_url, room_token
+                    )
+                if session is None:
+                    from bots.voice.bot import voice_bot_launch
+
+                    logger.debug("Spawning voice bot as process")
+                    process = voice_bot_launch(
+                        auth, params, config, services, room_url, room_token
+                    )
+            except BaseException:
+                self._release_locked()
+                raise
+            self._reserved -= 1
+            if session is not None:
+                session_id, pid = session
+                key = ("worker", session_id)
+            else:
+                pid = process.pid
+                key = ("process", pid)
+            self._bots[key] = _Bot(pid, auth.user_id, params.conversation_id, process)
+        Metrics.increment("voice_bot_launched")
+
+    @property
+    def in_use(self) -> int:
+        """Bots running or about to."""
+        with self._lock:
+            return self._in_use()
+
+    def status(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            bots = list(self._bots.values())
+            status = {
+                "accepting": self._accepting,
+                "max_concurrent": self._max_concurrent,
+                "running": len(bots),
+                "reserved": self._reserved,
+                "queued": len(self._waiters),
+                "idle_workers": self._pool.idle_workers if self._pool else 0,
+                "recent_exits": list(self._exits),
+            }
+        status["bots"] = []
+        for bot in bots:
+            bot_status = bot.status()
+            # Only show which conversation a bot belongs to to its owner.
+            if user_id is not None and bot.user_id == user_id:
+                bot_status["conversation_id"] = bot.conversation_id
+            status["bots"].append(bot_status)
+        return status
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        """Stop admitting bots and wait for running ones, terminating them after `timeout`."""
+        with self._lock:
+            self._accepting = False
+            waiters, self._waiters = list(self._waiters), deque()
+        for future in waiters:
+            if not future.done():
+                future.set_exception(VoiceBotCapacityError())
+
+        deadline = time.monotonic() + timeout
+        while self._bots and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+
+        with self._lock:
+            remaining = list(self._bots.values())
+        for bot in remaining:
+            logger.warning(f"Terminating voice bot {bot.pid} ({bot.conversation_id})")
+            try:
+                os.kill(bot.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        if self._pool:
+            await asyncio.to_thread(self._pool.stop)
+        if self._monitor:
+            await asyncio.to_thread(self._monitor.join, 5)
+
+    def _in_use(self) -> int:
+        return len(self._bots) + self._reserved
+
+    def _release_locked(self):
+        self._reserved -= 1
+        # Hand the slot straight to the next waiting request.
+        while self._waiters and self._in_use() < self._max_concurrent:
+            future = self._waiters.popleft()
+            self._reserved += 1
+            if self._loop:
+                self._loop.call_soon_threadsafe(self._wake, future)
+
+    @staticmethod
+    def _wake(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _on_session_end(self, session_id: int, exitcode: Optional[int]):
+        self._on_bot_exit(("worker", session_id), exitcode)
+
+    def _on_bot_exit(self, key: Tuple[str, int], exitcode: Optional[int]):
+        with self._lock:
+            bot = self._bots.pop(key, None)
+            if bot is None:
+                return
+            self._exits.append(
+                {
+                    "pid": bot.pid,
+                    "exitcode": exitcode,
+                    "duration": round(time.time() - bot.started_at, 1),
+                    "ended_at": time.time(),
+                }
+            )
+            # The slot of the bot becomes a reservation for the next waiter, if any.
+            self._reserved += 1
+            self._release_locked()
+
+        if exitcode:
+            Metrics.increment("voice_bot_failed")
+            logger.warning(
+                f"Voice bot {bot.pid} for conversation {bot.conversation_id} "
+                f"exited with code {exitcode}"
+            )
+
+    def _monitor_loop(self):
+        """Reap bots running in their own process."""
+        while self._accepting or self._bots:
+            with self._lock:
+                processes: List[Process] = [
+                    bot.process for bot in self._bots.values() if bot.process
+                ]
+            if not processes:
+                time.sleep(1)
+                continue
+            for sentinel in wait([p.sentinel for p in processes], timeout=1):
+                process = next(p for p in processes if p.sentinel == sentinel)
+                process.join()
+                self._on_bot_exit(("process", process.pid), process.exitcode)
@@ -0,0 +1,23 @@
+from typing import Optional
+
+from common.models import Service
+from common.service_factory import MOCK_SERVICE_NAME
+
+from pipecat.transports.base_transport import BaseTransport
+from pipecat.transports.services.daily import DailyParams, DailyTransport
+
+
+def is_mock_transport(transport_service: Optional[Service]) -> bool:
+    return getattr(transport_service, "service_provider", None) == MOCK_SERVICE_NAME
+
+
+def create_transport(
+    services: dict[str, Service], room_url: str, room_token: str, params: DailyParams
+) -> BaseTransport:
+    """The transport of a voice bot: Daily, or the loopback of the mock provider."""
+    transport_service = services.get("transport")
+    if is_mock_transport(transport_service):
+        from bots.mock_services import MockTransport
+
+        return MockTransport(params, **(getattr(transport_service, "options", None) or {}))
+    return DailyTransport(room_url, room_token, "Open Sesame", params)
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from common.metrics import Metrics
+from loguru import logger
+
+from pipecat.frames.frames import (
+    ControlFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    StartInterruptionFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    TTSSpeakFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import TTSService
+
+TTS_CACHE_ENABLED = bool(int(os.getenv("SESAME_TTS_CACHE", "1") or 0))
+TTS_CACHE_DIR = os.getenv("SESAME_TTS_CACHE_DIR") or os.path.join(
+    tempfile.gettempdir(), "sesame-tts-cache"
+)
+TTS_CACHE_MAX_BYTES = int(os.getenv("SESAME_TTS_CACHE_MAX_MB", "256") or 256) * 1024 * 1024
+
+# sample rate, number of channels
+_HEADER = struct.Struct("<II")
+# 100ms of 16-bit audio per frame at the cached sample rate.
+_CHUNK_SECONDS = 0.1
+# How long a phrase waits to find out whether the TTS service is idle before
+# it is synthesized without the cache.
+_IDLE_PROBE_TIMEOUT_SECS = 10
+
+
+class TTSAudioCache:
+    """
+    Synthesized phrases stored on disk, shared by the bot processes of a host.
+
+    Each entry is a file with a small header and the raw PCM audio. It is
+    read through a memory map, and each frame-sized chunk is copied out as
+    it is played, so the whole entry is never loaded at once. Reading an
+    entry bumps its modification time and the least recently used entries
+    are removed once the directory grows past `max_bytes`.
+    """
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(
+        provider: str, voice_id: str, sample_rate: int, settings: Any, text: str
+    ) -> str:
+        data = json.dumps(
+            [provider, voice_id, sample_rate, settings, text], sort_keys=True, default=str
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[mmap.mmap, int, int]]:
+        """The memory map of an entry (audio after the header), its sample rate and channels."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        sample_rate, num_channels = _HEADER.unpack_from(audio)
+        return audio, sample_rate, num_channels
+
+    def put(self, key: str, audio: bytes, sample_rate: int, num_channels: int):
+        path = self._path(key)
+        # Write aside and rename, readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(sample_rate, num_channels))
+            f.write(audio)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.pcm")
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self._directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pcm"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+                Metrics.increment("tts_cache_evictions")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+@dataclass
+class _TTSIdleProbeFrame(ControlFrame):
+    """
+    Sent through the TTS service ahead of a phrase. When it reaches the
+    recorder, everything queued before it has been handed to the service,
+    and `idle` is resolved with whether all of it has been spoken.
+    """
+
+    idle: asyncio.Future
+
+
+class _TTSCacheRecorder(FrameProcessor):
+    """After the TTS service: records new phrases and plays cached ones."""
+
+    def __init__(self, cache: TTSAudioCache):
+        super().__init__()
+        self._cache = cache
+        self._key: Optional[str] = None
+        self._audio: List[bytes] = []
+        self._sample_rate = 0
+        self._num_channels = 1
+        self._recording = False
+        # TTSStartedFrames without their TTSStoppedFrame yet. Websocket
+        # services keep sending audio after the LLM response has ended.
+        self._outstanding = 0
+
+    def expect(self, key: str):
+        self._key = key
+        self._audio = []
+        self._recording = False
+
+    def abort(self):
+        self._key = None
+        self._audio = []
+        self._recording = False
+
+    async def play(self, text: str, audio: mmap.mmap, sample_rate: int, num_channels: int):
+        chunk_size = int(sample_rate * _CHUNK_SECONDS) * num_channels * 2
+        await self.push_frame(TTSStartedFrame())
+        for start in range(_HEADER.size, len(audio), chunk_size):
+            chunk = audio[start : start + chunk_size]
+            await self.push_frame(
+                TTSAudioRawFrame(audio=chunk, sample_rate=sample_rate, num_channels=num_channels)
+            )
+        audio.close()
+        await self.push_frame(TTSStoppedFrame())
+        await self.push_frame(TextFrame(text))
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, _TTSIdleProbeFrame):
+            if not frame.idle.done():
+                frame.idle.set_result(self._outstanding == 0)
+            return
+
+        if isinstance(frame, StartInterruptionFrame):
+            # Whatever was being synthesized is dropped.
+            self._outstanding = 0
+        elif direction == FrameDirection.DOWNSTREAM and isinstance(frame, TTSStartedFrame):
+            self._outstanding += 1
+        elif direction == FrameDirection.DOWNSTREAM and isinstance(frame, TTSStoppedFrame):
+            self._outstanding = max(0, self._outstanding - 1)
+
+        if self._key and direction == FrameDirection.DOWNSTREAM:
+            if isinstance(frame, TTSStartedFrame):
+                if self._recording:
+                    # Something else is being spoken at the same time.
+                    self.abort()
+                else:
+                    self._recording = True
+            elif isinstance(frame, TTSAudioRawFrame) and self._recording:
+                self._audio.append(frame.audio)
+                self._sample_rate = frame.sample_rate
+                self._num_channels = frame.num_channels
+            elif isinstance(frame, TTSStoppedFrame) and self._recording:
+                try:
+                    if self._audio:
+                        audio = b"".join(self._audio)
+                        self._cache.put(self._key, audio, self._sample_rate, self._num_channels)
+                except OSError as e:
+                    logger.warning(f"Unable to cache TTS audio: {e}")
+                self.abort()
+            elif isinstance(frame, StartInterruptionFrame):
+                self.abort()
+
+        await self.push_frame(frame, direction)
+
+
+class _TTSCacheLookup(FrameProcessor):
+    """
+    Before the TTS service: answers phrases from the cache when the service is idle.
+
+    Idle means every TTSStartedFrame that reached the recorder has been
+    followed by its TTSStoppedFrame, checked with a probe frame sent through
+    the service so the answer covers everything queued before the phrase.
+    Frames after the phrase wait until it has been decided.
+    """
+
+    def __init__(
+        self,
+        tts: TTSService,
+        provider: str,
+        cache: TTSAudioCache,
+        recorder: _TTSCacheRecorder,
+    ):
+        super().__init__()
+        self._tts = tts
+        self._cache = cache
+        self._provider = provider
+        self._recorder = recorder
+        self._in_llm_response = False
+
+    def _key(self, text: str) -> str:
+        return TTSAudioCache.key(
+            self._provider,
+            getattr(self._tts, "_voice_id", ""),
+            self._tts.sample_rate,
+            [self._tts.model_name, getattr(self._tts, "_settings", {})],
+            text,
+        )
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, LLMFullResponseStartFrame):
+            self._in_llm_response = True
+        elif isinstance(frame, (LLMFullResponseEndFrame, StartInterruptionFrame)):
+            self._in_llm_response = False
+
+        if not isinstance(frame, TTSSpeakFrame) or not frame.text.strip():
+            await self.push_frame(frame, direction)
+            return
+
+        # Only while nothing else is being synthesized, otherwise we can't
+        # tell which audio is whose.
+        if self._in_llm_response or not await self._tts_idle():
+            Metrics.increment("tts_cache_bypassed")
+            await self.push_frame(frame, direction)
+            return
+
+        key = self._key(frame.text)
+        cached = self._cache.get(key)
+        if cached:
+            Metrics.increment("tts_cache_hits")
+            logger.debug(f"Playing cached TTS audio for [{frame.text}]")
+            await self._recorder.play(frame.text, *cached)
+        else:
+            Metrics.increment("tts_cache_misses")
+            self._recorder.expect(key)
+            await self.push_frame(frame, direction)
+
+    async def _tts_idle(self) -> bool:
+        idle = asyncio.get_running_loop().create_future()
+        await self.push_frame(_TTSIdleProbeFrame(idle=idle))
+        try:
+            return await asyncio.wait_for(idle, _IDLE_PROBE_TIMEOUT_SECS)
+        except asyncio.TimeoutError:
+            return False
+
+
+def cached_tts(
+    tts: TTSService, provider: str, cache: Optional[TTSAudioCache] = None
+) -> FrameProcessor:
+    """
+    Wraps a TTS service so phrases spoken with `TTSSpeakFrame` (greetings,
+    `tts:say`, ...) are synthesized once per voice and settings and then
+    played from the cache, without a request to the provider.
+    """
+    if not TTS_CACHE_ENABLED and cache is None:
+        return tts
+    cache = cache or TTSAudioCache()
+    recorder = _TTSCacheRecorder(cache)
+    lookup = _TTSCacheLookup(tts, provider, cache, recorder)
+    return Pipeline([lookup, tts, recorder])
@@ -0,0 +1,57 @@
+import threading
+from importlib import resources
+from typing import Optional
+
+from loguru import logger
+
+from pipecat.audio.vad.silero import SileroOnnxModel, SileroVADAnalyzer, onnxruntime
+from pipecat.audio.vad.vad_analyzer import VADAnalyzer, VADParams
+
+_session: Optional[onnxruntime.InferenceSession] = None
+_session_lock = threading.Lock()
+
+
+def get_silero_session() -> onnxruntime.InferenceSession:
+    """The process-wide Silero ONNX session, loaded on first use.
+
+    The model state is passed in and out of every inference call, so one
+    session can serve any number of analyzers.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            logger.debug("Loading shared Silero VAD model...")
+            path = str(resources.files("pipecat.audio.vad.data").joinpath("silero_vad.onnx"))
+            opts = onnxruntime.SessionOptions()
+            opts.inter_op_num_threads = 1
+            opts.intra_op_num_threads = 1
+            _session = onnxruntime.InferenceSession(
+                path, providers=["CPUExecutionProvider"], sess_options=opts
+            )
+        return _session
+
+
+def preload_silero_vad():
+    get_silero_session()
+
+
+class SharedSileroOnnxModel(SileroOnnxModel):
+    """Silero model with its own state on top of the shared ONNX session."""
+
+    def __init__(self, session: onnxruntime.InferenceSession):
+        self.session = session
+        self.reset_states()
+        self.sample_rates = [8000, 16000]
+
+
+class SharedSileroVADAnalyzer(SileroVADAnalyzer):
+    """`SileroVADAnalyzer` that doesn't load the model for every session."""
+
+    def __init__(self, *, sample_rate: int = 16000, params: VADParams = VADParams()):
+        VADAnalyzer.__init__(self, sample_rate=sample_rate, num_channels=1, params=params)
+
+        if sample_rate != 16000 and sample_rate != 8000:
+            raise ValueError("Silero VAD sample rate needs to be 16000 or 8000")
+
+        self._model = SharedSileroOnnxModel(get_silero_session())
+        self._last_reset_time = 0
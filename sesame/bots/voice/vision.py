@@ -0,0 +1,204 @@
+import base64
+import io
+import os
+import sys
+import time
+from typing import Optional, Tuple
+
+from common.metrics import Metrics
+from loguru import logger
+from PIL import Image
+
+from pipecat.frames.frames import (
+    Frame,
+    UserImageRawFrame,
+    UserImageRequestFrame,
+    UserStartedSpeakingFrame,
+)
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+# Longest side of the camera frames the LLM gets, in pixels (0 keeps them as they are).
+IMAGE_MAX_SIZE = int(os.getenv("SESAME_VISION_IMAGE_MAX_SIZE", "768") or 0)
+IMAGE_FORMAT = (os.getenv("SESAME_VISION_IMAGE_FORMAT") or "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("SESAME_VISION_IMAGE_QUALITY", "75") or 75)
+# Tool calls this soon after the last camera frame get that frame again.
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("SESAME_VISION_IMAGE_CACHE_TTL", "3") or 0)
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def downscale_image(
+    image: bytes, size: Tuple[int, int], format: str, max_size: int = IMAGE_MAX_SIZE
+) -> Tuple[bytes, Tuple[int, int]]:
+    """Raw image bytes and size, with the longest side at most `max_size`."""
+    if not max_size or max(size) <= max_size:
+        return image, size
+    img = Image.frombytes(format, size, image)
+    img.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+    return img.tobytes(), img.size
+
+
+def encode_image(
+    image: bytes,
+    size: Tuple[int, int],
+    format: str,
+    image_format: str = IMAGE_FORMAT,
+    quality: int = IMAGE_QUALITY,
+) -> Tuple[bytes, str]:
+    """A raw image compressed as `image_format`, with its MIME type."""
+    if image_format not in _MIME_TYPES:
+        logger.warning(f"Unsupported image format {image_format}, using JPEG")
+        image_format = "JPEG"
+    buffer = io.BytesIO()
+    Image.frombytes(format, size, image).convert("RGB").save(
+        buffer, format=image_format, quality=quality
+    )
+    return buffer.getvalue(), _MIME_TYPES[image_format]
+
+
+def _is_anthropic_context(context: OpenAILLMContext) -> bool:
+    # Only Anthropic's LLM service makes Anthropic contexts, so its module is loaded by then.
+    anthropic = sys.modules.get("pipecat.services.anthropic")
+    return anthropic is not None and isinstance(context, anthropic.AnthropicLLMContext)
+
+
+def add_image_message(
+    context: OpenAILLMContext, data: bytes, mime_type: str, text: Optional[str] = None
+) -> bool:
+    """
+    Adds an encoded image to `context` in its provider's format. Returns
+    False for contexts whose format isn't known here.
+    """
+    encoded_image = base64.b64encode(data).decode("utf-8")
+    if _is_anthropic_context(context):
+        # Anthropic wants the image before the text.
+        content = [
+            {
+                "type": "image",
+                "source": {"type": "base64", "media_type": mime_type, "data": encoded_image},
+            }
+        ]
+        if text:
+            content.append({"type": "text", "text": text})
+    elif type(context).add_image_frame_message is OpenAILLMContext.add_image_frame_message:
+        content = []
+        if text:
+            content.append({"type": "text", "text": text})
+        content.append(
+            {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_image}"}},
+        )
+    else:
+        return False
+    context.add_message({"role": "user", "content": content})
+    return True
+
+
+class VisionSession:
+    """
+    State of a vision bot session: the participant whose camera the
+    `get_image` tool looks at and the last frame it got.
+
+    `create_processor()` goes right after the input transport. Camera frames
+    are downscaled and encoded there, and an image requested within
+    `cache_ttl` of the last one (and in the same user turn) is answered with
+    that one instead of a new frame from the transport.
+
+    `attach()` has the LLM context send the encoded frames. It hooks the
+    context instance rather than subclassing it, because LLM services like
+    Anthropic's change the class of the context they are given.
+    """
+
+    def __init__(
+        self,
+        cache_ttl: float = IMAGE_CACHE_TTL_SECONDS,
+        max_size: int = IMAGE_MAX_SIZE,
+        image_format: str = IMAGE_FORMAT,
+        quality: int = IMAGE_QUALITY,
+    ):
+        self.participant_id: Optional[str] = None
+        self._cache_ttl = cache_ttl
+        self._max_size = max_size
+        self._image_format = image_format
+        self._quality = quality
+        self._last_image: Optional[UserImageRawFrame] = None
+        self._last_image_time = 0.0
+        self._last_encoded: Optional[Tuple[bytes, str]] = None
+
+    async def get_image(self, function_name, tool_call_id, arguments, llm, context, result_callback):
+        question = arguments["question"]
+        await llm.request_image_frame(user_id=self.participant_id, text_content=question)
+
+    def attach(self, context: OpenAILLMContext):
+        def add_image_frame_message(
+            *, format: str, size: tuple[int, int], image: bytes, text: Optional[str] = None
+        ):
+            data, mime_type = self.encoded_image(image, size, format)
+            if not add_image_message(context, data, mime_type, text):
+                # The context's own class, whichever it is by now.
+                type(context).add_image_frame_message(
+                    context, format=format, size=size, image=image, text=text
+                )
+
+        context.add_image_frame_message = add_image_frame_message
+
+    def create_processor(self) -> "VisionImageProcessor":
+        return VisionImageProcessor(self)
+
+    def cached_image(self, user_id: str) -> Optional[UserImageRawFrame]:
+        image = self._last_image
+        if not image or image.user_id != user_id:
+            return None
+        if time.monotonic() - self._last_image_time > self._cache_ttl:
+            return None
+        return UserImageRawFrame(
+            user_id=image.user_id, image=image.image, size=image.size, format=image.format
+        )
+
+    def on_image(self, frame: UserImageRawFrame) -> UserImageRawFrame:
+        image, size = downscale_image(frame.image, frame.size, frame.format, self._max_size)
+        if size != frame.size:
+            logger.debug(f"Camera frame downscaled from {frame.size} to {size}")
+            frame = UserImageRawFrame(
+                user_id=frame.user_id, image=image, size=size, format=frame.format
+            )
+        self._last_image = frame
+        self._last_image_time = time.monotonic()
+        self._last_encoded = self._encode(frame.image, frame.size, frame.format)
+        return frame
+
+    def encoded_image(self, image: bytes, size: Tuple[int, int], format: str) -> Tuple[bytes, str]:
+        """The frame encoded by the processor, or `image` encoded now if it's another one."""
+        if self._last_image and self._last_encoded and image is self._last_image.image:
+            return self._last_encoded
+        return self._encode(image, size, format)
+
+    def _encode(self, image: bytes, size: Tuple[int, int], format: str) -> Tuple[bytes, str]:
+        return encode_image(image, size, format, self._image_format, self._quality)
+
+    def on_new_turn(self):
+        self._last_image = None
+        self._last_encoded = None
+
+
+class VisionImageProcessor(FrameProcessor):
+    def __init__(self, session: VisionSession):
+        super().__init__()
+        self._session = session
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+
+        if isinstance(frame, UserImageRequestFrame):
+            cached = self._session.cached_image(frame.user_id)
+            if cached:
+                Metrics.increment("vision_image_cache_hits")
+                await self.push_frame(cached, FrameDirection.DOWNSTREAM)
+                return
+            Metrics.increment("vision_image_cache_misses")
+        elif isinstance(frame, UserImageRawFrame):
+            frame = self._session.on_image(frame)
+        elif isinstance(frame, UserStartedSpeakingFrame):
+            self._session.on_new_turn()
+
+        await self.push_frame(frame, direction)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+from loguru import logger
+
+from pipecat.services.ai_services import AIService, LLMService
+
+WARMUP_ENABLED = bool(int(os.getenv("SESAME_VOICE_BOT_WARMUP", "1") or 0))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("SESAME_VOICE_BOT_WARMUP_TIMEOUT", "5"))
+
+
+class ServiceWarmup:
+    """
+    Connects the services of a voice bot while it joins the room and waits
+    for the participant, so the first utterance doesn't pay for it.
+
+    Websocket services (Deepgram, Cartesia, ...) open their connection
+    right away instead of when the `StartFrame` reaches them, and the
+    pipeline's own connect then reuses it. LLM services get a request to
+    their API host so the HTTP client has a connection ready. Services
+    with neither are left alone.
+
+    `timings` holds the seconds each warmed up service took (None if it
+    failed).
+    """
+
+    def __init__(self, services: Dict[str, AIService], timeout: float = WARMUP_TIMEOUT_SECONDS):
+        self._services = services
+        self._timeout = timeout
+        self._tasks: Set[asyncio.Task] = set()
+        self._report_task: Optional[asyncio.Task] = None
+        self.timings: Dict[str, Optional[float]] = {}
+
+    def start(self):
+        for name, service in self._services.items():
+            if hasattr(service, "_connect"):
+                self._warm_up_connection(name, service)
+            elif isinstance(service, LLMService):
+                client = getattr(service, "_client", None)
+                http_client = getattr(client, "_client", None)
+                if isinstance(http_client, httpx.AsyncClient):
+                    # Any answer will do, we only want a connection in the pool.
+                    url = str(getattr(client, "base_url"))
+                    self._create_task(name, lambda c=http_client, u=url: c.head(u))
+        if self._tasks:
+            self._report_task = asyncio.create_task(self._report())
+
+    @property
+    def pending(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def wait(self):
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _create_task(self, name: str, warm_up: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.create_task(self._timed(name, warm_up))
+        self._tasks.add(task)
+        return task
+
+    async def _timed(self, name: str, warm_up: Callable[[], Awaitable[Any]]):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(warm_up(), self._timeout)
+            self.timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Unable to warm up {name}: {e}")
+            self.timings[name] = None
+
+    def _warm_up_connection(self, name: str, service: AIService):
+        connect = getattr(service, "_connect")
+
+        async def connect_and_check():
+            await connect()
+            # Some services (Cartesia) log connection errors and carry on
+            # without a websocket instead of raising.
+            if hasattr(service, "_websocket") and getattr(service, "_websocket") is None:
+                raise ConnectionError("no websocket after connecting")
+
+        task = self._create_task(name, connect_and_check)
+
+        async def connect_once():
+            # Called by the service when the pipeline starts, later calls
+            # (e.g. reconnecting) go to the original method again.
+            setattr(service, "_connect", connect)
+            await task
+            if self.timings.get(name) is None:
+                await connect()
+
+        setattr(service, "_connect", connect_once)
+
+    async def _report(self):
+        await self.wait()
+        report = ", ".join(
+            f"{name} {'failed' if seconds is None else f'{seconds:.3f}s'}"
+            for name, seconds in self.timings.items()
+        )
+        logger.info(f"Services warmed up: {report}")
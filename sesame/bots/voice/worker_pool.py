@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from multiprocessing.connection import Connection, wait
+from multiprocessing.reduction import ForkingPickler
+from typing import Any, Callable, List, Optional, Tuple
+
+from bots.types import BotConfig, BotParams
+from common.auth import Auth
+from common.database import DatabaseSessionFactory
+from common.models import Service
+from common.service_factory import SERVICE_PRELOAD, preload_services
+from loguru import logger
+
+# Number of pre-started voice bot processes. 0 disables the pool and every
+# session gets a freshly started process.
+POOL_SIZE = int(os.getenv("SESAME_VOICE_BOT_WORKERS", "0") or 0)
+# A worker is replaced after running this many sessions.
+MAX_SESSIONS_PER_WORKER = int(os.getenv("SESAME_VOICE_BOT_WORKER_MAX_SESSIONS", "20") or 20)
+
+
+def _preload():
+    """Load what every session needs before the first session arrives."""
+    from bots.voice.vad import preload_silero_vad
+
+    preload_silero_vad()
+
+
+async def _worker_main(conn: Connection, max_sessions: int):
+    # Only workers need the bot pipelines, the webapp doesn't import them.
+    from bots.voice.bot import _voice_bot_main
+
+    _preload()
+    session_factory = DatabaseSessionFactory()
+    if SERVICE_PRELOAD != "none":
+        try:
+            await preload_services(session_factory)
+        except Exception as e:
+            logger.warning(f"Unable to preload services: {e}")
+    conn.send(("ready", 0))
+    try:
+        sessions = 0
+        while sessions < max_sessions:
+            job = await asyncio.to_thread(conn.recv)
+            if job is None:
+                break
+            session_id, args = job
+            sessions += 1
+            try:
+                await _voice_bot_main(*args, session_factory=session_factory)
+            except Exception as e:
+                logger.error(f"Voice bot session failed: {e}")
+            conn.send(("done", session_id))
+    except EOFError:
+        # The supervisor went away.
+        pass
+    finally:
+        await session_factory.engine.dispose()
+
+
+def _worker_process(conn: Connection, max_sessions: int):
+    logger.remove()
+    logger.add(sys.stderr, level=os.getenv("SESAME_BOT_LOG_LEVEL", "INFO"))
+
+    asyncio.run(_worker_main(conn, max_sessions))
+
+
+class _Worker:
+    def __init__(self, process: multiprocessing.process.BaseProcess, conn: Connection):
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.busy = False
+        self.closed = False
+        self.sessions = 0
+        # The id of the session it runs, while busy.
+        self.session_id: Optional[int] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+
+class VoiceBotWorkerPool:
+    """
+    Keeps `size` voice bot processes started ahead of time.
+
+    Workers import pipecat, connect to the database and load the VAD model
+    once, then wait for sessions on a pipe. A worker runs one session at a
+    time and is replaced after `max_sessions_per_worker` sessions (or when it
+    dies). A monitor thread tracks worker state and reaps exited workers.
+
+    `on_session_end(session_id, exitcode)` is called from the monitor thread
+    when a worker finishes a session (`exitcode` is None) or dies during
+    one. Sessions are told apart by the id `launch()` returned, not by the
+    pid, which the next session on the worker has too.
+    `target(conn, max_sessions)` is what the worker processes run: it gets
+    `(session_id, args)` jobs and answers `("done", session_id)`.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        max_sessions_per_worker: int = MAX_SESSIONS_PER_WORKER,
+        on_session_end: Optional[Callable[[int, Optional[int]], None]] = None,
+        target: Callable[[Connection, int], None] = _worker_process,
+    ):
+        self._size = size
+        self._target = target
+        self._max_sessions = max_sessions_per_worker
+        self.on_session_end = on_session_end
+        # Workers must not inherit the webapp's event loop and threads.
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._monitor: Optional[threading.Thread] = None
+        self._session_ids = itertools.count(1)
+
+    @property
+    def idle_workers(self) -> int:
+        with self._lock:
+            return sum(1 for w in self._workers if self._available(w))
+
+    def start(self):
+        if self._running or self._size <= 0:
+            return
+        logger.info(f"Starting {self._size} voice bot worker(s)")
+        self._running = True
+        with self._lock:
+            for _ in range(self._size):
+                self._workers.append(self._spawn())
+        self._monitor = threading.Thread(
+            target=self._monitor_loop, name="voice-bot-pool", daemon=True
+        )
+        self._monitor.start()
+
+    def stop(self, timeout: float = 5):
+        """Stop accepting sessions, let idle workers exit and busy ones finish their session."""
+        if not self._running:
+            return
+        self._running = False
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in workers:
+            if not worker.busy:
+                worker.process.join(timeout)
+        if self._monitor:
+            self._monitor.join(timeout)
+
+    def launch(
+        self,
+        auth: Auth,
+        params: BotParams,
+        config: BotConfig,
+        services: dict[str, Service],
+        room_url: str,
+        room_token: str,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Hand a session to an idle worker and return the session's id and the
+        worker's pid, or None if none is available.
+        """
+        if not self.idle_workers:
+            return None
+        session_id = next(self._session_ids)
+        # Pickled before taking the worker and sent after letting go of the
+        # lock, which the monitor thread needs to track the other workers.
+        args = (auth, params, config, services, room_url, room_token)
+        job = bytes(ForkingPickler.dumps((session_id, args)))
+        with self._lock:
+            worker = next((w for w in self._workers if self._available(w)), None)
+            if worker is None:
+                return None
+            worker.busy = True
+            worker.session_id = session_id
+            worker.sessions += 1
+        try:
+            # An idle worker is blocked reading the pipe, this doesn't wait on it.
+            worker.conn.send_bytes(job)
+        except (OSError, ValueError) as e:
+            logger.error(f"Unable to hand session to voice bot worker {worker.pid}: {e}")
+            with self._lock:
+                worker.ready = False
+                worker.busy = False
+                worker.session_id = None
+            return None
+        logger.debug(f"Voice bot session for {params.conversation_id} sent to worker {worker.pid}")
+        return session_id, worker.pid
+
+    def _available(self, worker: _Worker) -> bool:
+        return (
+            self._running
+            and worker.ready
+            and not worker.busy
+            and worker.sessions < self._max_sessions
+        )
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=self._target, args=(child_conn, self._max_sessions), daemon=False
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _monitor_loop(self):
+        while True:
+            with self._lock:
+                workers = list(self._workers)
+            if not workers:
+                return
+
+            objects: List[Any] = [w.conn for w in workers if not w.closed]
+            objects += [w.process.sentinel for w in workers]
+            for obj in wait(objects, timeout=1):
+                worker = next(w for w in workers if obj is w.conn or obj == w.process.sentinel)
+                if obj is worker.conn:
+                    try:
+                        event, session_id = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # Closed, the sentinel tells us when the process is gone.
+                        worker.closed = True
+                        continue
+                    with self._lock:
+                        if event == "ready":
+                            worker.ready = True
+                        elif event == "done" and session_id == worker.session_id:
+                            worker.busy = False
+                            worker.session_id = None
+                    if event == "done" and self.on_session_end:
+                        self.on_session_end(session_id, None)
+                else:
+                    self._reap(worker)
+
+    def _reap(self, worker: _Worker):
+        worker.process.join()
+        exitcode = worker.process.exitcode
+        if exitcode:
+            logger.warning(f"Voice bot worker {worker.pid} exited with code {exitcode}")
+        else:
+            logger.debug(f"Voice bot worker {worker.pid} exited after {worker.sessions} session(s)")
+        worker.conn.close()
+        if worker.busy and self.on_session_end and worker.session_id is not None:
+            self.on_session_end(worker.session_id, exitcode)
+        with self._lock:
+            self._workers.remove(worker)
+            if self._running:
+                self._workers.append(self._spawn())
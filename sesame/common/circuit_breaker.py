@@ -0,0 +1,188 @@
+import hashlib
+import os
+import time
+import weakref
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from common.metrics import Metrics
+from loguru import logger
+
+CIRCUIT_BREAKER_ENABLED = bool(int(os.getenv("SESAME_CIRCUIT_BREAKER", "1") or 0))
+# Open once at least this many of the requests of the window (seconds) were
+# made and this share of them failed or were slower than SLOW_SECS.
+CIRCUIT_MIN_REQUESTS = int(os.getenv("SESAME_CIRCUIT_MIN_REQUESTS", "5") or 5)
+CIRCUIT_ERROR_RATE = float(os.getenv("SESAME_CIRCUIT_ERROR_RATE", "0.5") or 0.5)
+CIRCUIT_WINDOW_SECS = float(os.getenv("SESAME_CIRCUIT_WINDOW", "60") or 60)
+CIRCUIT_SLOW_SECS = float(os.getenv("SESAME_CIRCUIT_SLOW_SECS", "10") or 10)
+# Requests fail fast for this long, then a single one probes the provider.
+CIRCUIT_OPEN_SECS = float(os.getenv("SESAME_CIRCUIT_OPEN_SECS", "30") or 30)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Health of one provider and API key, from the outcome of its requests.
+
+    Closed, requests go through while their error rate (failures and
+    responses slower than `slow_secs`) stays below `error_rate`. Open,
+    `allow()` refuses them for `open_secs`. Half-open, one request probes
+    the provider: its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_requests: int = CIRCUIT_MIN_REQUESTS,
+        error_rate: float = CIRCUIT_ERROR_RATE,
+        window_secs: float = CIRCUIT_WINDOW_SECS,
+        slow_secs: float = CIRCUIT_SLOW_SECS,
+        open_secs: float = CIRCUIT_OPEN_SECS,
+    ):
+        self.name = name
+        self._min_requests = min_requests
+        self._error_rate = error_rate
+        self._window_secs = window_secs
+        self._slow_secs = slow_secs
+        self._open_secs = open_secs
+        self.state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        # When the half-open probe was let through, None while there is none.
+        self._probe_at: Optional[float] = None
+        # (time, failed, latency)
+        self._outcomes: Deque[Tuple[float, bool, Optional[float]]] = deque()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.state == CircuitState.OPEN:
+            if now - self._opened_at < self._open_secs:
+                Metrics.increment("circuit_rejections")
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self._probe_at = None
+            logger.info(f"Circuit {self.name} half-open, probing")
+        if self.state == CircuitState.HALF_OPEN:
+            # Another probe if the last one never got an answer.
+            if self._probe_at is not None and now - self._probe_at < self._open_secs:
+                Metrics.increment("circuit_rejections")
+                return False
+            self._probe_at = now
+        return True
+
+    def retry_after(self, now: Optional[float] = None) -> Optional[float]:
+        """Seconds until requests are let through again, None if they are now."""
+        now = time.monotonic() if now is None else now
+        if self.state != CircuitState.OPEN or now - self._opened_at >= self._open_secs:
+            return None
+        return self._open_secs - (now - self._opened_at)
+
+    def record_success(self, latency: float, now: Optional[float] = None):
+        if latency > self._slow_secs:
+            self._record(True, latency, now)
+            return
+        self._record(False, latency, now)
+        if self.state == CircuitState.HALF_OPEN:
+            logger.info(f"Circuit {self.name} closed")
+            self.state = CircuitState.CLOSED
+            self._probe_at = None
+            self._outcomes.clear()
+
+    def record_failure(self, now: Optional[float] = None):
+        self._record(True, None, now)
+
+    def record_abandoned(self, elapsed: float, now: Optional[float] = None):
+        """A request given up on (e.g. interrupted) `elapsed` seconds before an answer."""
+        if elapsed > self._slow_secs:
+            self.record_failure(now)
+        elif self.state == CircuitState.HALF_OPEN:
+            # Tells nothing, let another request probe.
+            self._probe_at = None
+
+    def _record(self, failed: bool, latency: Optional[float], now: Optional[float]):
+        now = time.monotonic() if now is None else now
+        self._outcomes.append((now, failed, latency))
+        self._expire(now)
+        if not failed:
+            return
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and len(self._outcomes) >= self._min_requests
+            and self.error_rate() >= self._error_rate
+        ):
+            self._open(now)
+
+    def _open(self, now: float):
+        logger.warning(f"Circuit {self.name} open, error rate {self.error_rate():.0%}")
+        Metrics.increment("circuit_opened")
+        self.state = CircuitState.OPEN
+        self._opened_at = now
+        self._probe_at = None
+
+    def _expire(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self._window_secs:
+            self._outcomes.popleft()
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(failed for _, failed, _ in self._outcomes) / len(self._outcomes)
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._expire(time.monotonic())
+        latencies = sorted(latency for _, _, latency in self._outcomes if latency is not None)
+        return {
+            "state": self.state.value,
+            "requests": len(self._outcomes),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_latency_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+        }
+
+
+def key_fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+class CircuitBreakers:
+    """
+    The circuit breakers of a process, by service type, provider and API
+    key, and the breaker of each service instance `ServiceFactory` made.
+    """
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._services: "weakref.WeakKeyDictionary[Any, CircuitBreaker]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @staticmethod
+    def key(service_type: str, provider: str, api_key: str) -> str:
+        return f"{service_type}/{provider}/{key_fingerprint(api_key or '')}"
+
+    def get(self, service_type: str, provider: str, api_key: str) -> CircuitBreaker:
+        key = self.key(service_type, provider, api_key)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(key)
+        return breaker
+
+    def find(self, service_type: str, provider: str, api_key: str) -> Optional[CircuitBreaker]:
+        return self._breakers.get(self.key(service_type, provider, api_key))
+
+    def attach(self, service: Any, breaker: CircuitBreaker):
+        try:
+            self._services[service] = breaker
+        except TypeError:
+            # Not weakly referenceable, its requests aren't tracked.
+            pass
+
+    def for_service(self, service: Any) -> Optional[CircuitBreaker]:
+        return self._services.get(service)
+
+
+circuit_breakers = CircuitBreakers()
@@ -1,10 +1,15 @@
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
 
+from common.metrics import Metrics
 from dotenv import load_dotenv
+from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
 
 load_dotenv()
 
@@ -42,13 +47,37 @@ def construct_database_url():
     return db_url
 
 
+class _TimedQueue(AsyncAdaptedQueue):
+    def get(self, block=True, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            Metrics.increment("db_pool_wait_us", int((time.perf_counter() - start) * 1_000_000))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Counts the time sessions wait for a free connection (`db_pool_wait_us`)
+    and the connections they get (`db_pool_checkouts`).
+    """
+
+    _queue_class = _TimedQueue
+
+
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    Metrics.increment("db_pool_checkouts")
+
+
 class DatabaseSessionFactory:
     def __init__(self):
         self.engine = create_async_engine(
             construct_database_url(),
+            poolclass=TimedQueuePool,
             pool_pre_ping=True,
             echo=bool(int(os.getenv("SESAME_DATABASE_ECHO_OUTPUT", "0"))),
         )
+        event.listen(self.engine.sync_engine.pool, "checkout", _count_checkout)
         self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
 
     @asynccontextmanager
@@ -1,5 +1,6 @@
 import os
 from base64 import b64encode
+from functools import lru_cache
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -8,14 +9,19 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 def get_encryption_key(salt: bytes) -> bytes:
     """Derive a key from SESAME_APP_SECRET using PBKDF2"""
+    return _derive_key(os.environ["SESAME_APP_SECRET"].encode(), salt)
+
+
+@lru_cache(maxsize=8)
+def _derive_key(secret: bytes, salt: bytes) -> bytes:
+    # Deriving takes a good part of a second, and every bot session decrypts its keys.
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
         iterations=480000,
     )
-    key = kdf.derive(os.environ["SESAME_APP_SECRET"].encode())
-    return b64encode(key)
+    return b64encode(kdf.derive(secret))
 
 
 def encrypt_with_secret(string: str) -> str:
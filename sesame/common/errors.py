@@ -40,3 +40,14 @@ class InvalidServiceTypeError(ServiceFactoryError):
         super().__init__(
             f"Invalid service type '{service_type}'. " f"Must be one of: {', '.join(valid_types)}"
         )
+
+
+class ServiceUnavailableError(ServiceFactoryError):
+    def __init__(self, service_name: str, service_type: str, retry_after: float):
+        self.service_name = service_name
+        self.service_type = service_type
+        self.retry_after = retry_after
+        super().__init__(
+            f"The {service_type} service '{service_name}' is failing, "
+            f"retry in {retry_after:.0f}s"
+        )
@@ -0,0 +1,539 @@
+"""
+Load generator for `/rtvi/action`, run by `sesame load-test` against a
+running webapp (started with `SESAME_MOCK_SERVICES=1` for the default
+`mock` LLM, so providers are left out of the measurements).
+
+It creates users (straight in the database), then logs them in and creates
+their workspaces, LLM services and conversations through the API. Many
+streams then send actions at once, each pausing for a think time between
+its requests, until the run's duration is over. A JSON and an HTML report
+are written, optionally compared with the report of an earlier run.
+"""
+
+import asyncio
+import json
+import random
+import secrets
+import statistics
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from argon2 import PasswordHasher
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+SYSTEM_PROMPT = "You are a friendly tutor. Keep your answers short."
+USER_PROMPTS = [
+    "Tell me a story about a unicorn!",
+    "Can you explain how photosynthesis works?",
+    "What is the difference between weather and climate?",
+    "Help me practice my multiplication tables.",
+]
+
+# Requests running at once while users, workspaces and conversations are created.
+SETUP_CONCURRENCY = 20
+# A run's error rate may be this much above the baseline's, whatever the tolerance.
+ERROR_RATE_TOLERANCE = 0.01
+
+
+@dataclass
+class LoadTestConfig:
+    base_url: str = "http://localhost:8000"
+    users: int = 10
+    conversations_per_user: int = 10
+    # Action streams running at once.
+    streams: int = 100
+    duration_secs: float = 60
+    # Mean pause between the requests of a stream (exponentially distributed).
+    think_time_secs: float = 1.0
+    # Streams start evenly over this time.
+    ramp_up_secs: float = 10
+    provider: str = "mock"
+    api_key: str = "mock"
+    service_options: Dict[str, Any] = field(
+        default_factory=lambda: {"tokens": 50, "tokens_per_sec": 50, "ttft_ms": 300}
+    )
+    timeout_secs: float = 60
+
+
+@dataclass
+class RequestResult:
+    # Seconds since the run started.
+    started_at: float
+    status: Optional[int] = None
+    latency: Optional[float] = None
+    ttfb: Optional[float] = None
+    ttft: Optional[float] = None
+    tokens: int = 0
+    tokens_per_sec: Optional[float] = None
+    error: Optional[str] = None
+
+
+def percentiles(values: Sequence[float], scale: float = 1.0) -> Dict[str, Optional[float]]:
+    """p50/p90/p95/p99, mean and max of `values` times `scale`, rounded."""
+    if not values:
+        return {"p50": None, "p90": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def at(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * scale, 1)
+
+    return {
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "mean": round(statistics.fmean(ordered) * scale, 1),
+        "max": round(ordered[-1] * scale, 1),
+    }
+
+
+def _counter_delta(before: Dict[str, Any], after: Dict[str, Any], name: str) -> int:
+    return after.get("counters", {}).get(name, 0) - before.get("counters", {}).get(name, 0)
+
+
+def summarize(
+    config: LoadTestConfig,
+    results: List[RequestResult],
+    started_at: datetime,
+    wall_secs: float,
+    server_before: Optional[Dict[str, Any]] = None,
+    server_after: Optional[Dict[str, Any]] = None,
+    peak_checked_out: Optional[int] = None,
+) -> Dict[str, Any]:
+    """The report of a run, as written to the JSON file."""
+    ok = [r for r in results if not r.error]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result.error:
+            errors[result.error] = errors.get(result.error, 0) + 1
+
+    db_pool = None
+    if server_before is not None and server_after is not None:
+        checkouts = _counter_delta(server_before, server_after, "db_pool_checkouts")
+        wait_ms = _counter_delta(server_before, server_after, "db_pool_wait_us") / 1000
+        db_pool = {
+            "size": server_after.get("db_pool", {}).get("size"),
+            "peak_checked_out": peak_checked_out,
+            "checkouts": checkouts,
+            "wait_ms_total": round(wait_ms, 1),
+            "wait_ms_mean": round(wait_ms / checkouts, 3) if checkouts else None,
+        }
+
+    timeline: Dict[int, List[RequestResult]] = {}
+    for result in results:
+        timeline.setdefault(int(result.started_at), []).append(result)
+
+    return {
+        "started_at": started_at.isoformat(),
+        "config": {name: value for name, value in asdict(config).items() if name != "api_key"},
+        "duration_secs": round(wall_secs, 2),
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else None,
+        "requests_per_sec": round(len(ok) / wall_secs, 2) if wall_secs else None,
+        "latency_ms": percentiles([r.latency for r in ok if r.latency is not None], 1000),
+        "ttfb_ms": percentiles([r.ttfb for r in ok if r.ttfb is not None], 1000),
+        "ttft_ms": percentiles([r.ttft for r in ok if r.ttft is not None], 1000),
+        "tokens_per_sec": {
+            "per_request": percentiles([r.tokens_per_sec for r in ok if r.tokens_per_sec]),
+            "total": round(sum(r.tokens for r in ok) / wall_secs, 1) if wall_secs else None,
+        },
+        "errors_by_kind": errors,
+        "db_pool": db_pool,
+        "timeline": [
+            {
+                "second": second,
+                "requests": len(bucket),
+                "errors": sum(1 for r in bucket if r.error),
+                "latency_ms_p95": percentiles(
+                    [r.latency for r in bucket if not r.error and r.latency is not None], 1000
+                )["p95"],
+            }
+            for second, bucket in sorted(timeline.items())
+        ],
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """What got worse than in `baseline` by more than `tolerance` (a fraction)."""
+    regressions = []
+
+    def worse(name: str, now: Optional[float], then: Optional[float], higher_is_better: bool):
+        if now is None or not then:
+            return
+        change = (now - then) / then
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{name}: {then} -> {now} ({change:+.0%})")
+
+    worse("requests_per_sec", report["requests_per_sec"], baseline.get("requests_per_sec"), True)
+    worse(
+        "tokens_per_sec",
+        report["tokens_per_sec"]["total"],
+        baseline.get("tokens_per_sec", {}).get("total"),
+        True,
+    )
+    for metric in ("latency_ms", "ttfb_ms", "ttft_ms"):
+        worse(
+            f"{metric} p95",
+            report[metric]["p95"],
+            baseline.get(metric, {}).get("p95"),
+            False,
+        )
+    error_rate, baseline_error_rate = report["error_rate"] or 0, baseline.get("error_rate") or 0
+    if error_rate > baseline_error_rate + ERROR_RATE_TOLERANCE:
+        regressions.append(f"error_rate: {baseline_error_rate} -> {error_rate}")
+    return regressions
+
+
+def _table(rows: Sequence[Tuple[str, Any]]) -> str:
+    cells = "".join(
+        f"<tr><th>{escape(str(name))}</th><td>{escape(str(value))}</td></tr>"
+        for name, value in rows
+    )
+    return f"<table>{cells}</table>"
+
+
+def render_html(report: Dict[str, Any], regressions: Optional[List[str]] = None) -> str:
+    """The report of a run as a page without outside resources."""
+    percentile_rows = "".join(
+        f"<tr><th>{escape(label)}</th>"
+        + "".join(f"<td>{values[p]}</td>" for p in ("p50", "p90", "p95", "p99", "max"))
+        + "</tr>"
+        for label, values in (
+            ("Latency (ms)", report["latency_ms"]),
+            ("TTFB (ms)", report["ttfb_ms"]),
+            ("TTFT (ms)", report["ttft_ms"]),
+            ("Tokens/s per request", report["tokens_per_sec"]["per_request"]),
+        )
+    )
+    most = max((bucket["requests"] for bucket in report["timeline"]), default=0) or 1
+    timeline_rows = "".join(
+        f"<tr><td>{bucket['second']}</td><td>{bucket['requests']}</td><td>{bucket['errors']}</td>"
+        f"<td>{bucket['latency_ms_p95']}</td><td><div class='bar' "
+        f"style='width:{100 * bucket['requests'] // most}%'></div></td></tr>"
+        for bucket in report["timeline"]
+    )
+    regressions_html = ""
+    if regressions is not None:
+        items = "".join(f"<li>{escape(r)}</li>" for r in regressions) or "<li>None</li>"
+        regressions_html = f"<h2>Regressions against the baseline</h2><ul>{items}</ul>"
+    db_pool = report["db_pool"] or {}
+    summary = _table(
+        [
+            ("Started", report["started_at"]),
+            ("Duration (s)", report["duration_secs"]),
+            ("Streams", report["config"]["streams"]),
+            ("Think time (s)", report["config"]["think_time_secs"]),
+            ("Requests", report["requests"]),
+            ("Requests/s", report["requests_per_sec"]),
+            ("Tokens/s", report["tokens_per_sec"]["total"]),
+            ("Error rate", report["error_rate"]),
+            ("DB pool checkouts", db_pool.get("checkouts")),
+            ("DB pool wait, mean (ms)", db_pool.get("wait_ms_mean")),
+            ("DB pool peak checked out", db_pool.get("peak_checked_out")),
+        ]
+    )
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Load test {escape(report['started_at'])}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}
+th {{ text-align: left; background: #f4f4f4; }}
+.bar {{ background: #4a7bd0; height: 10px; }}
+</style>
+</head>
+<body>
+<h1>/rtvi/action load test</h1>
+{regressions_html}
+<h2>Summary</h2>
+{summary}
+<h2>Percentiles</h2>
+<table>
+<tr><th></th><th>p50</th><th>p90</th><th>p95</th><th>p99</th><th>max</th></tr>
+{percentile_rows}
+</table>
+<h2>Errors</h2>
+{_table(sorted(report["errors_by_kind"].items()))}
+<h2>Timeline</h2>
+<table>
+<tr><th>Second</th><th>Requests</th><th>Errors</th><th>p95 latency (ms)</th><th></th></tr>
+{timeline_rows}
+</table>
+</body>
+</html>
+"""
+
+
+def write_report(
+    report: Dict[str, Any], output: Path, regressions: Optional[List[str]] = None
+) -> Tuple[Path, Path]:
+    """Writes `<output>.json` and `<output>.html`."""
+    json_path, html_path = output.with_suffix(".json"), output.with_suffix(".html")
+    report = {**report, "regressions": regressions}
+    json_path.write_text(json.dumps(report, indent=2))
+    html_path.write_text(render_html(report, regressions))
+    return json_path, html_path
+
+
+class LoadTest:
+    def __init__(self, config: LoadTestConfig, admin_database_url: str):
+        self._config = config
+        self._admin_database_url = admin_database_url
+        self._run_id = uuid.uuid4().hex[:8]
+        self._user_ids: List[str] = []
+        # (token, conversation_id) of every conversation created.
+        self._conversations: List[Tuple[str, str]] = []
+        self._results: List[RequestResult] = []
+        self._start = 0.0
+        self._peak_checked_out: Optional[int] = None
+
+    async def run(self, keep_data: bool = False) -> Dict[str, Any]:
+        config = self._config
+        limits = httpx.Limits(max_connections=config.streams + SETUP_CONCURRENCY)
+        timeout = httpx.Timeout(config.timeout_secs, connect=10)
+        async with httpx.AsyncClient(
+            base_url=config.base_url, limits=limits, timeout=timeout
+        ) as client:
+            try:
+                tokens = await self._create_users(client)
+                await self._create_conversations(client, tokens)
+                if len(self._conversations) < config.streams:
+                    logger.warning(
+                        f"{len(self._conversations)} conversations for {config.streams} streams, "
+                        "streams sharing a conversation wait for each other"
+                    )
+                return await self._drive(client, tokens[0])
+            finally:
+                if not keep_data:
+                    await self._delete_users()
+
+    async def _create_users(self, client: httpx.AsyncClient) -> List[str]:
+        """Inserts the users and logs them in, returns their tokens."""
+        password = secrets.token_urlsafe(16)
+        # One hash for all of them, hashing is slow on purpose.
+        password_hash = PasswordHasher().hash(password)
+        users = [
+            {
+                "user_id": uuid.uuid4().hex,
+                "email": f"load-test-{self._run_id}-{i}@example.com",
+                "password_hash": password_hash,
+            }
+            for i in range(self._config.users)
+        ]
+        engine = create_async_engine(self._admin_database_url)
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(
+                    text(
+                        "INSERT INTO users (user_id, email, password_hash) "
+                        "VALUES (:user_id, :email, :password_hash)"
+                    ),
+                    users,
+                )
+        finally:
+            await engine.dispose()
+        self._user_ids = [user["user_id"] for user in users]
+
+        async def login(email: str) -> str:
+            response = await client.post(
+                "/api/auth/login", json={"email": email, "password": password}
+            )
+            response.raise_for_status()
+            return response.json()["token"]
+
+        tokens = await self._gather([login(user["email"]) for user in users])
+        logger.info(f"Created {len(tokens)} users")
+        return tokens
+
+    async def _create_conversations(self, client: httpx.AsyncClient, tokens: List[str]):
+        config = self._config
+
+        async def setup_user(token: str):
+            headers = {"Authorization": f"Bearer {token}"}
+            response = await client.post(
+                "/api/workspaces",
+                headers=headers,
+                json={
+                    "title": f"Load test {self._run_id}",
+                    "config": {
+                        "services": {"llm": config.provider},
+                        "default_llm_context": [
+                            {"content": {"role": "system", "content": SYSTEM_PROMPT}}
+                        ],
+                    },
+                },
+            )
+            response.raise_for_status()
+            workspace_id = response.json()["workspace_id"]
+            response = await client.post(
+                "/api/services",
+                headers=headers,
+                json={
+                    "title": "Load test LLM",
+                    "service_type": "llm",
+                    "service_provider": config.provider,
+                    "api_key": config.api_key,
+                    "workspace_id": workspace_id,
+                    "options": config.service_options,
+                },
+            )
+            response.raise_for_status()
+            for i in range(config.conversations_per_user):
+                response = await client.post(
+                    "/api/conversations",
+                    headers=headers,
+                    json={"workspace_id": workspace_id, "title": f"Load test {i}"},
+                )
+                response.raise_for_status()
+                self._conversations.append((token, response.json()["conversation_id"]))
+
+        await self._gather([setup_user(token) for token in tokens])
+        logger.info(f"Created {len(self._conversations)} conversations")
+
+    async def _gather(self, coroutines) -> List[Any]:
+        semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(limited(coroutine) for coroutine in coroutines))
+
+    async def _delete_users(self):
+        if not self._user_ids:
+            return
+        engine = create_async_engine(self._admin_database_url)
+        try:
+            async with engine.begin() as conn:
+                # Workspaces aren't removed with their user, the rest is.
+                for table in ("workspaces", "users"):
+                    await conn.execute(
+                        text(f"DELETE FROM {table} WHERE user_id = ANY(:user_ids)"),
+                        {"user_ids": self._user_ids},
+                    )
+        finally:
+            await engine.dispose()
+        logger.info(f"Deleted the {len(self._user_ids)} load test users and their data")
+
+    async def _server_metrics(self, client: httpx.AsyncClient, token: str) -> Optional[Dict]:
+        try:
+            response = await client.get(
+                "/api/bots/metrics", headers={"Authorization": f"Bearer {token}"}
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.warning(f"Unable to read the server's metrics: {e}")
+            return None
+
+    async def _sample_pool(self, client: httpx.AsyncClient, token: str):
+        while True:
+            await asyncio.sleep(1)
+            metrics = await self._server_metrics(client, token)
+            if metrics:
+                checked_out = metrics["db_pool"]["checked_out"]
+                self._peak_checked_out = max(self._peak_checked_out or 0, checked_out)
+
+    async def _drive(self, client: httpx.AsyncClient, token: str) -> Dict[str, Any]:
+        config = self._config
+        before = await self._server_metrics(client, token)
+        sampler = asyncio.create_task(self._sample_pool(client, token))
+        started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        deadline = self._start + config.duration_secs
+        logger.info(f"Running {config.streams} streams for {config.duration_secs}s")
+        await asyncio.gather(*(self._stream(client, i, deadline) for i in range(config.streams)))
+        wall_secs = time.perf_counter() - self._start
+        sampler.cancel()
+        after = await self._server_metrics(client, token)
+        return summarize(
+            config, self._results, started_at, wall_secs, before, after, self._peak_checked_out
+        )
+
+    async def _stream(self, client: httpx.AsyncClient, index: int, deadline: float):
+        config = self._config
+        await asyncio.sleep(config.ramp_up_secs * index / config.streams)
+        token, conversation_id = self._conversations[index % len(self._conversations)]
+        while time.perf_counter() < deadline:
+            self._results.append(await self._send_action(client, token, conversation_id))
+            if config.think_time_secs > 0:
+                await asyncio.sleep(random.expovariate(1 / config.think_time_secs))
+
+    async def _send_action(
+        self, client: httpx.AsyncClient, token: str, conversation_id: str
+    ) -> RequestResult:
+        body = {
+            "conversation_id": conversation_id,
+            "actions": [
+                {
+                    "label": "rtvi-ai",
+                    "type": "action",
+                    "id": uuid.uuid4().hex[:8],
+                    "data": {
+                        "service": "llm",
+                        "action": "append_to_messages",
+                        "arguments": [
+                            {
+                                "name": "messages",
+                                "value": [{"role": "user", "content": random.choice(USER_PROMPTS)}],
+                            },
+                            {"name": "run_immediately", "value": True},
+                        ],
+                    },
+                }
+            ],
+        }
+        start = time.perf_counter()
+        result = RequestResult(started_at=start - self._start)
+        first_token_at = last_token_at = None
+        try:
+            async with client.stream(
+                "POST",
+                "/api/rtvi/action",
+                # One event per token.
+                params={"stream_format": "json", "coalesce_ms": 0},
+                headers={"Authorization": f"Bearer {token}"},
+                json=body,
+            ) as response:
+                result.status = response.status_code
+                if response.status_code != 200:
+                    await response.aread()
+                    result.error = f"HTTP {response.status_code}"
+                else:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        now = time.perf_counter()
+                        if result.ttfb is None:
+                            result.ttfb = now - start
+                        message = json.loads(line[len("data: ") :])
+                        if message.get("type") == "bot-llm-text":
+                            first_token_at = first_token_at or now
+                            last_token_at = now
+                            result.tokens += 1
+                        elif message.get("type") in ("error", "error-response"):
+                            result.error = "RTVI error"
+        except httpx.TimeoutException:
+            result.error = "Timeout"
+        except httpx.HTTPError as e:
+            result.error = type(e).__name__
+        result.latency = time.perf_counter() - start
+        if first_token_at:
+            result.ttft = first_token_at - start
+            if last_token_at and result.tokens > 1 and last_token_at > first_token_at:
+                result.tokens_per_sec = (result.tokens - 1) / (last_token_at - first_token_at)
+        elif not result.error:
+            result.error = "No response"
+        return result
@@ -0,0 +1,20 @@
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """Process-wide counters for events worth keeping an eye on."""
+
+    _counters: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def increment(cls, name: str, value: int = 1) -> None:
+        cls._counters[name] += value
+
+    @classmethod
+    def get(cls, name: str) -> int:
+        return cls._counters.get(name, 0)
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, int]:
+        return dict(cls._counters)
@@ -2,7 +2,7 @@ import base64
 import os
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Sequence
 
 from common.encryption import decrypt_with_secret
 from common.errors import ServiceConfigurationError
@@ -10,6 +10,7 @@ from common.service_factory import ServiceType
 from pydantic import BaseModel, Field, Json
 from sqlalchemy import (
     TIMESTAMP,
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
@@ -18,9 +19,11 @@ from sqlalchemy import (
     Integer,
     String,
     UniqueConstraint,
+    delete,
     func,
     select,
     text,
+    update,
 )
 from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 from sqlalchemy.exc import IntegrityError
@@ -34,8 +37,6 @@ from sqlalchemy.orm import (
 )
 from sqlalchemy.sql import expression
 
-from pipecat.processors.frameworks.rtvi import RTVIServiceConfig
-
 Base = declarative_base()
 
 # ==========================
@@ -196,6 +197,19 @@ class Workspace(Base):
         )
         return result.scalars().all()
 
+    @classmethod
+    async def get_workspace_ids(cls, user_id: str, db: AsyncSession) -> List[str]:
+        result = await db.execute(
+            select(Workspace.workspace_id).where(Workspace.user_id == user_id)
+        )
+        return [str(workspace_id) for workspace_id in result.scalars()]
+
+    @classmethod
+    async def get_configured_services(cls, db: AsyncSession) -> List[tuple[str, str]]:
+        """(service type, provider) pairs any workspace is configured with."""
+        result = await db.execute(text("SELECT * FROM get_configured_services()"))
+        return [(row.service_type, row.service_provider) for row in result.fetchall()]
+
 
 class Conversation(Base):
     __tablename__ = "conversations"
@@ -213,7 +227,10 @@ class Conversation(Base):
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
 
     workspace: Mapped["Workspace"] = relationship("Workspace", back_populates="conversations")
-    messages: Mapped[List["Message"]] = relationship("Message", back_populates="conversation")
+    # In order, so the context built from them starts the same every time.
+    messages: Mapped[List["Message"]] = relationship(
+        "Message", back_populates="conversation", order_by="Message.message_number"
+    )
     attachments: Mapped[List["Attachment"]] = relationship(
         "Attachment", 
         back_populates="conversation"
@@ -280,6 +297,20 @@ class Message(Base):
         return normalized
     """
 
+    # Set in the metadata of the messages copied from the workspace's
+    # `default_llm_context` when a conversation is created.
+    CONTEXT_PREFIX_KEY = "llm_context_prefix"
+
+    @classmethod
+    def context_prefix_length(cls, messages: Sequence["Message"]) -> int:
+        """How many of `messages` (in order) are the workspace's default context."""
+        length = 0
+        for message in messages:
+            if not (message.extra_metadata or {}).get(cls.CONTEXT_PREFIX_KEY):
+                break
+            length += 1
+        return length
+
     @classmethod
     async def get_messages_by_conversation_id(cls, conversation_id: str, db: AsyncSession):
         result = await db.execute(
@@ -289,6 +320,15 @@ class Message(Base):
         )
         return result.scalars().all()
 
+    @classmethod
+    async def count_messages_by_conversation_id(cls, conversation_id: str, db: AsyncSession) -> int:
+        result = await db.execute(
+            select(func.count())
+            .select_from(Message)
+            .where(Message.conversation_id == conversation_id)
+        )
+        return result.scalar_one()
+
     @classmethod
     async def save_messages(
         cls, conversation_id: str, language_code: str, messages: List[Any], db: AsyncSession
@@ -379,6 +419,191 @@ class Attachment(Base):
         return None
 
 
+class VoiceTurnLatency(Base):
+    __tablename__ = "voice_turn_latencies"
+
+    latency_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    conversation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.conversation_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    workspace_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("workspaces.workspace_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    stt_provider = Column(String(64), nullable=False)
+    llm_provider = Column(String(64), nullable=False)
+    tts_provider = Column(String(64), nullable=False)
+    # Milliseconds, NULL when the turn didn't report it.
+    stt_ms = Column(Integer, nullable=True)
+    llm_ttfb_ms = Column(Integer, nullable=True)
+    tts_ttfb_ms = Column(Integer, nullable=True)
+    end_to_end_ms = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("idx_voice_turn_latencies_workspace_created", "workspace_id", "created_at"),
+    )
+
+    @classmethod
+    async def save_turns(cls, turns: List[dict], db: AsyncSession):
+        db.add_all([cls(**turn) for turn in turns])
+        await db.flush()
+
+    @classmethod
+    async def get_percentiles(
+        cls, since: datetime, db: AsyncSession, workspace_id: Optional[str] = None
+    ) -> dict[str, List[dict]]:
+        """p50/p95/p99 of each latency per workspace and the provider it depends on."""
+        stages = {
+            "stt": (cls.stt_ms, [cls.stt_provider]),
+            "llm_ttfb": (cls.llm_ttfb_ms, [cls.llm_provider]),
+            "tts_ttfb": (cls.tts_ttfb_ms, [cls.tts_provider]),
+            "end_to_end": (
+                cls.end_to_end_ms,
+                [cls.stt_provider, cls.llm_provider, cls.tts_provider],
+            ),
+        }
+        percentiles = {}
+        for stage, (column, providers) in stages.items():
+            query = (
+                select(
+                    cls.workspace_id,
+                    *providers,
+                    func.count(column),
+                    *[func.percentile_cont(p).within_group(column) for p in (0.5, 0.95, 0.99)],
+                )
+                .where(column.isnot(None), cls.created_at >= since)
+                .group_by(cls.workspace_id, *providers)
+            )
+            if workspace_id:
+                query = query.where(cls.workspace_id == workspace_id)
+            result = await db.execute(query)
+
+            percentiles[stage] = []
+            for row in result.all():
+                workspace, *names, turns, p50, p95, p99 = row
+                percentiles[stage].append(
+                    {
+                        "workspace_id": str(workspace),
+                        "provider": "/".join(names),
+                        "turns": turns,
+                        "p50": round(p50),
+                        "p95": round(p95),
+                        "p99": round(p99),
+                    }
+                )
+        return percentiles
+
+
+class VoiceBotWorker(Base):
+    """A node running voice bots, kept alive by its heartbeats."""
+
+    __tablename__ = "voice_bot_workers"
+
+    worker_id = Column(String(255), primary_key=True)
+    capacity = Column(Integer, nullable=False)
+    running = Column(Integer, nullable=False, default=0)
+    started_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    heartbeat_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    @classmethod
+    async def upsert(cls, worker_id: str, capacity: int, running: int, db: AsyncSession):
+        await db.execute(
+            text(
+                """
+                INSERT INTO voice_bot_workers (worker_id, capacity, running)
+                VALUES (:worker_id, :capacity, :running)
+                ON CONFLICT (worker_id) DO UPDATE
+                SET capacity = :capacity, running = :running, heartbeat_at = NOW()
+                """
+            ),
+            {"worker_id": worker_id, "capacity": capacity, "running": running},
+        )
+
+    @classmethod
+    async def get_workers(cls, timeout: float, db: AsyncSession) -> List[dict]:
+        """Every worker, `alive` if it sent a heartbeat within `timeout` seconds."""
+        alive = cls.heartbeat_at >= func.now() - timedelta(seconds=timeout)
+        pending = (
+            select(func.count(VoiceBotJob.job_id))
+            .where(VoiceBotJob.worker_id == cls.worker_id)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(cls.worker_id, cls.capacity, cls.running, pending, alive).order_by(
+                cls.worker_id
+            )
+        )
+        return [
+            {
+                "worker_id": worker_id,
+                "capacity": capacity,
+                "running": running,
+                "pending": pending,
+                "alive": alive,
+            }
+            for worker_id, capacity, running, pending, alive in result.all()
+        ]
+
+    @classmethod
+    async def delete_worker(cls, worker_id: str, db: AsyncSession) -> int:
+        """Delete the worker with the jobs it didn't claim and return how many jobs there were."""
+        result = await db.execute(delete(VoiceBotJob).where(VoiceBotJob.worker_id == worker_id))
+        await db.execute(delete(cls).where(cls.worker_id == worker_id))
+        return result.rowcount
+
+
+class VoiceBotJob(Base):
+    """
+    A voice bot session placed on a worker that hasn't picked it up yet.
+    Claiming a job deletes it, and the room token in its payload is encrypted.
+    """
+
+    __tablename__ = "voice_bot_jobs"
+
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    worker_id = Column(
+        String(255), ForeignKey("voice_bot_workers.worker_id"), nullable=False
+    )
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index("idx_voice_bot_jobs_worker_created", "worker_id", "created_at"),)
+
+    @classmethod
+    async def claim(cls, worker_id: str, limit: int, db: AsyncSession) -> List[dict]:
+        """Remove and return up to `limit` of the worker's jobs, oldest first."""
+        claimed = (
+            select(cls.job_id)
+            .where(cls.worker_id == worker_id)
+            .order_by(cls.created_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            delete(cls).where(cls.job_id.in_(claimed)).returning(cls.payload)
+        )
+        return [payload for payload in result.scalars().all()]
+
+    @classmethod
+    async def delete_expired(cls, max_age: float, db: AsyncSession) -> int:
+        """Delete the jobs older than `max_age` seconds and return how many there were."""
+        result = await db.execute(
+            delete(cls).where(cls.created_at < func.now() - timedelta(seconds=max_age))
+        )
+        return result.rowcount
+
+    @classmethod
+    async def reassign(cls, from_worker_id: str, to_worker_id: str, db: AsyncSession) -> int:
+        result = await db.execute(
+            update(cls).where(cls.worker_id == from_worker_id).values(worker_id=to_worker_id)
+        )
+        return result.rowcount
+
+
 class Service(Base):
     __tablename__ = "services"
 
@@ -536,6 +761,31 @@ class Service(Base):
 
         return final_services
 
+    @classmethod
+    async def get_llm_route_services(
+        cls,
+        providers: List[str],
+        db: AsyncSession,
+        workspace_id: Optional[uuid.UUID] = None,
+    ) -> dict[str, "Service"]:
+        """
+        Services of the LLM providers a workspace routes to, keyed
+        `llm:<provider>`. Providers without one are left out.
+        """
+        services: dict[str, Service] = {}
+        for provider in providers:
+            try:
+                found = await cls.get_services_by_type_map(
+                    {ServiceType.ServiceLLM.value: provider},
+                    db,
+                    workspace_id,
+                    ServiceType.ServiceLLM,
+                )
+            except ServiceConfigurationError:
+                continue
+            services[f"llm:{provider}"] = found[ServiceType.ServiceLLM.value]
+        return services
+
 
 # ==========================
 # Pydantic Models
@@ -578,8 +828,20 @@ class MessageCreateModel(BaseModel):
     }
 
 
+# Same fields as pipecat's `RTVIServiceOptionConfig` and `RTVIServiceConfig`,
+# whose module pulls in most of pipecat.
+class RTVIServiceOptionConfigModel(BaseModel):
+    name: str
+    value: Any
+
+
+class RTVIServiceConfigModel(BaseModel):
+    service: str
+    options: List[RTVIServiceOptionConfigModel]
+
+
 class WorkspaceDefaultConfigModel(BaseModel):
-    config: Optional[List[RTVIServiceConfig]] = None
+    config: Optional[List[RTVIServiceConfigModel]] = None
     api_keys: Optional[dict] = None
     services: Optional[dict] = None
     default_llm_context: Optional[list[MessageCreateModel]] = Field(default_factory=list)
@@ -710,6 +972,20 @@ class ServiceModel(BaseModel):
         "from_attributes": True,
     }
 
+
+class ServiceHealthModel(BaseModel):
+    """A service and the state of its circuit breaker in this process."""
+
+    service_id: uuid.UUID
+    title: str
+    service_type: str
+    service_provider: Optional[str]
+    state: str = "closed"
+    requests: int = 0
+    error_rate: float = 0.0
+    p50_latency_ms: Optional[int] = None
+
+
 class FileParseResponse(BaseModel):
     attachment_id: uuid.UUID
     content: List[Any]
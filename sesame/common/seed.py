@@ -0,0 +1,401 @@
+"""
+Synthetic data for scale tests, loaded by `sesame seed`: users with their
+services, workspaces, conversations, messages and attachments, sized like
+production data (most conversations are short, a few are very long; user
+messages are a sentence or two, the bot's answers several paragraphs).
+
+Worker processes each generate the data of a share of the users and load
+it with COPY over their own connection, with triggers disabled
+(`session_replication_role = replica`, which takes a superuser, like the
+admin user of a local Postgres). What the triggers would have filled in
+(message numbers, the search vector, `updated_at`) is written along with
+the rows. Statistics are refreshed with ANALYZE at the end.
+"""
+
+import asyncio
+import json
+import math
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+from common.models import Message
+
+# Tables in load order (parents first) and the columns written to them.
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "users": ("user_id", "email", "password_hash", "created_at", "updated_at"),
+    "workspaces": ("workspace_id", "user_id", "title", "config", "created_at", "updated_at"),
+    "services": (
+        "service_id",
+        "user_id",
+        "workspace_id",
+        "title",
+        "service_type",
+        "service_provider",
+        "api_key",
+        "options",
+        "created_at",
+        "updated_at",
+    ),
+    "conversations": (
+        "conversation_id",
+        "workspace_id",
+        "title",
+        "archived",
+        "language_code",
+        "created_at",
+        "updated_at",
+    ),
+    "messages": (
+        "message_id",
+        "conversation_id",
+        "message_number",
+        "content",
+        "language_code",
+        "created_at",
+        "updated_at",
+        "token_count",
+        "extra_metadata",
+    ),
+    "attachments": (
+        "attachment_id",
+        "conversation_id",
+        "message_id",
+        "content",
+        "file_name",
+        "file_type",
+        "file_url",
+        "created_at",
+    ),
+}
+
+SERVICES = {"llm": "openai", "tts": "cartesia", "stt": "deepgram", "transport": "daily"}
+
+_WORDS = (
+    "the a of and to in is you that it he was for on are as with his they at be this have from "
+    "or one had by word but not what all were we when your can said there use an each which she "
+    "do how their if will up other about out many then them these so some her would make like "
+    "him into time has look two more write go see number no way could people my than first water "
+    "been call who oil its now find long down day did get come made may part over new sound take "
+    "only little work know place year live me back give most very after thing our just name good "
+    "sentence man think say great where help through much before line right too mean old any same "
+    "tell boy follow came want show also around form three small set put end does another well "
+    "large must big even such because turn here why ask went men read need land different home "
+    "us move try kind hand picture again change off play spell air away animal house point page "
+    "letter mother answer found study still learn should america world photosynthesis equation "
+    "fraction history planet energy molecule grammar paragraph essay theorem chapter homework"
+).split()
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    workspaces_per_user: int = 2
+    conversations_per_workspace: int = 50
+    # Median messages of a conversation (lengths are log-normal, with a long tail).
+    messages_per_conversation: int = 30
+    # Share of conversations with PDF attachments.
+    attachment_rate: float = 0.05
+    workers: int = 4
+    # Messages generated before their rows are copied.
+    batch_messages: int = 20_000
+    # Makes the data the same on every run, whatever the workers: the
+    # conversations, texts and sizes, and the dates relative to the run's.
+    # Ids and emails are new on every run, runs can go in the same database.
+    random_seed: Optional[int] = None
+
+    def estimated_messages(self) -> int:
+        """Messages the data will have, about (the mean of the log-normal lengths)."""
+        mean = self.messages_per_conversation * math.exp(_CONVERSATION_SIGMA**2 / 2)
+        return int(self.users * self.workspaces_per_user * self.conversations_per_workspace * mean)
+
+
+_CONVERSATION_SIGMA = 0.9
+
+
+def _lognormal(rng: random.Random, median: float, sigma: float, low: int, high: int) -> int:
+    return max(low, min(high, int(rng.lognormvariate(math.log(median), sigma))))
+
+
+class SyntheticData:
+    """Rows of the users `first_user` to `last_user` (exclusive), by table."""
+
+    def __init__(
+        self,
+        config: SeedConfig,
+        run_id: str,
+        password_hash: str,
+        encrypted_api_key: str,
+        rng: random.Random,
+    ):
+        self._config = config
+        self._run_id = run_id
+        self._password_hash = password_hash
+        self._api_key = encrypted_api_key
+        self._rng = rng
+        self._now = datetime.now(timezone.utc)
+        # Texts are made of these, cheaper than a word at a time.
+        self._sentences = [self._sentence() for _ in range(5000)]
+
+    def _sentence(self) -> str:
+        words = self._rng.choices(_WORDS, k=self._rng.randint(4, 18))
+        return " ".join(words).capitalize() + self._rng.choice([".", ".", ".", "?", "!"])
+
+    def _text(self, chars: int) -> str:
+        # Sentences are about 60 characters.
+        return " ".join(self._rng.choices(self._sentences, k=max(1, chars // 60)))
+
+    def _after(self, start: datetime, max_secs: float) -> datetime:
+        return start + timedelta(seconds=self._rng.uniform(0, max_secs))
+
+    def user(self, index: int) -> Dict[str, List[tuple]]:
+        if self._config.random_seed is not None:
+            # Seeded per user, the same whichever share of the users is generated.
+            self._rng = random.Random(f"{self._config.random_seed}-{index}")
+        rng = self._rng
+        rows: Dict[str, List[tuple]] = {table: [] for table in COLUMNS}
+        user_id = uuid.uuid4().hex
+        created = self._now - timedelta(days=rng.uniform(1, 730))
+        email = f"seed-{self._run_id}-{index}@example.com"
+        rows["users"].append((user_id, email, self._password_hash, created, created))
+
+        for service_type, provider in SERVICES.items():
+            rows["services"].append(
+                (
+                    uuid.uuid4(),
+                    user_id,
+                    None,
+                    f"{provider} {service_type}",
+                    service_type,
+                    provider,
+                    self._api_key,
+                    "{}",
+                    created,
+                    created,
+                )
+            )
+
+        for w in range(self._config.workspaces_per_user):
+            self._workspace(rows, user_id, w, self._after(created, 86400 * 30))
+        return rows
+
+    def _workspace(self, rows: Dict[str, List[tuple]], user_id: str, index: int, created: datetime):
+        rng = self._rng
+        workspace_id = uuid.uuid4()
+        system_prompt = {"role": "system", "content": self._text(rng.randint(200, 1500))}
+        config = {
+            "services": SERVICES,
+            "config": [{"service": "llm", "options": [{"name": "model", "value": "gpt-4o-mini"}]}],
+            "default_llm_context": [{"content": system_prompt}],
+        }
+        span = max(60.0, (self._now - created).total_seconds())
+        last_activity = created
+        for c in range(self._config.conversations_per_workspace):
+            started = self._after(created, span)
+            last_activity = max(
+                last_activity, self._conversation(rows, workspace_id, c, started, system_prompt)
+            )
+        rows["workspaces"].append(
+            (
+                workspace_id,
+                user_id,
+                f"Workspace {index + 1}",
+                json.dumps(config),
+                created,
+                last_activity,
+            )
+        )
+
+    def _conversation(
+        self,
+        rows: Dict[str, List[tuple]],
+        workspace_id: uuid.UUID,
+        index: int,
+        created: datetime,
+        system_prompt: dict,
+    ) -> datetime:
+        rng = self._rng
+        conversation_id = uuid.uuid4()
+        length = _lognormal(
+            rng, self._config.messages_per_conversation, _CONVERSATION_SIGMA, 1, 5000
+        )
+        at = created
+        prefix = json.dumps({Message.CONTEXT_PREFIX_KEY: True})
+        user_message_ids = []
+        for number in range(1, length + 1):
+            if number == 1:
+                content, metadata = system_prompt, prefix
+            elif number % 2 == 0:
+                text = self._text(_lognormal(rng, 80, 0.9, 2, 4000))
+                content, metadata = {"role": "user", "content": text}, None
+            else:
+                text = self._text(_lognormal(rng, 700, 0.8, 20, 12000))
+                content, metadata = {"role": "assistant", "content": text}, None
+            message_id = uuid.uuid4()
+            if content["role"] == "user":
+                user_message_ids.append((message_id, at))
+            rows["messages"].append(
+                (
+                    message_id,
+                    conversation_id,
+                    number,
+                    json.dumps(content),
+                    "english",
+                    at,
+                    at,
+                    len(content["content"]) // 4,
+                    metadata,
+                )
+            )
+            at += timedelta(seconds=rng.uniform(2, 120))
+
+        if user_message_ids and rng.random() < self._config.attachment_rate:
+            for _ in range(rng.randint(1, 3)):
+                message_id, sent = rng.choice(user_message_ids)
+                pages = [
+                    self._text(_lognormal(rng, 2000, 0.5, 200, 8000))
+                    for _ in range(_lognormal(rng, 5, 1.0, 1, 200))
+                ]
+                rows["attachments"].append(
+                    (
+                        uuid.uuid4(),
+                        conversation_id,
+                        message_id,
+                        json.dumps(pages),
+                        f"document-{rng.randint(1, 10**6)}",
+                        "pdf",
+                        None,
+                        sent,
+                    )
+                )
+
+        rows["conversations"].append(
+            (
+                conversation_id,
+                workspace_id,
+                f"Conversation {index + 1}",
+                rng.random() < 0.1,
+                "english",
+                created,
+                at,
+            )
+        )
+        return at
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """A SQLAlchemy URL (`postgresql+asyncpg://...`) as asyncpg takes it."""
+    scheme, rest = database_url.split("://", 1)
+    return f"{scheme.split('+')[0]}://{rest}"
+
+
+async def _copy(conn: asyncpg.Connection, rows: Dict[str, List[tuple]]):
+    async with conn.transaction():
+        for table, columns in COLUMNS.items():
+            if not rows[table]:
+                continue
+            if table == "messages":
+                # Through a temporary table, to fill in the search vector as
+                # the trigger would.
+                await conn.copy_records_to_table(
+                    "seed_messages", records=rows[table], columns=columns
+                )
+                await conn.execute(
+                    f"INSERT INTO messages ({', '.join(columns)}, content_tsv) "
+                    f"SELECT {', '.join(columns)}, to_tsvector(language_code::regconfig, "
+                    "unaccent(COALESCE(content->>'content', ''))) FROM seed_messages"
+                )
+                await conn.execute("TRUNCATE seed_messages")
+            else:
+                await conn.copy_records_to_table(table, records=rows[table], columns=columns)
+
+
+async def _load_users(
+    dsn: str,
+    config: SeedConfig,
+    first_user: int,
+    last_user: int,
+    run_id: str,
+    password_hash: str,
+    encrypted_api_key: str,
+) -> Dict[str, int]:
+    rng = random.Random(config.random_seed)
+    data = SyntheticData(config, run_id, password_hash, encrypted_api_key, rng)
+    counts = {table: 0 for table in COLUMNS}
+    conn = await asyncpg.connect(dsn)
+    try:
+        # No triggers (nor foreign key checks) while loading.
+        await conn.execute("SET session_replication_role = replica")
+        await conn.execute("CREATE TEMP TABLE seed_messages (LIKE messages INCLUDING DEFAULTS)")
+        pending: Dict[str, List[tuple]] = {table: [] for table in COLUMNS}
+        for index in range(first_user, last_user):
+            for table, rows in data.user(index).items():
+                pending[table].extend(rows)
+            if len(pending["messages"]) >= config.batch_messages or index == last_user - 1:
+                await _copy(conn, pending)
+                for table, rows in pending.items():
+                    counts[table] += len(rows)
+                    rows.clear()
+    finally:
+        await conn.close()
+    return counts
+
+
+def _load_users_process(*args) -> Dict[str, int]:
+    return asyncio.run(_load_users(*args))
+
+
+def seed(
+    database_url: str,
+    config: SeedConfig,
+    run_id: str,
+    password_hash: str,
+    encrypted_api_key: str,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Loads the data of `config.users` users in `config.workers` processes,
+    then analyzes the tables. Returns the rows added, by table.
+    `on_progress` is called with the users loaded so far and the total.
+    """
+    dsn = asyncpg_dsn(database_url)
+    # Slices small enough to keep every worker busy until the end.
+    size = max(1, min(100, config.users // (config.workers * 8) or 1))
+    slices = [(first, min(first + size, config.users)) for first in range(0, config.users, size)]
+    counts = {table: 0 for table in COLUMNS}
+    loaded = 0
+    with ProcessPoolExecutor(max_workers=config.workers) as executor:
+        futures = {
+            executor.submit(
+                _load_users_process,
+                dsn,
+                config,
+                first,
+                last,
+                run_id,
+                password_hash,
+                encrypted_api_key,
+            ): last - first
+            for first, last in slices
+        }
+        for future in as_completed(futures):
+            for table, count in future.result().items():
+                counts[table] += count
+            loaded += futures[future]
+            if on_progress:
+                on_progress(loaded, config.users)
+
+    asyncio.run(_analyze(dsn))
+    return counts
+
+
+async def _analyze(dsn: str):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(f"ANALYZE {', '.join(COLUMNS)}")
+    finally:
+        await conn.close()
@@ -1,11 +1,36 @@
+import os
+import time
 from enum import Enum
-from typing import Any, Dict, List, Mapping, Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping, Optional
 
-from common.errors import InvalidServiceTypeError, UnsupportedServiceError
-from pipecat.services.ai_services import AIService
-from pipecat.utils.text.markdown_text_filter import MarkdownTextFilter
+from common.circuit_breaker import CIRCUIT_BREAKER_ENABLED, circuit_breakers
+from common.errors import (
+    InvalidServiceTypeError,
+    ServiceUnavailableError,
+    UnsupportedServiceError,
+)
+from loguru import logger
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    from pipecat.services.ai_services import AIService
+
+# Import service modules when the process starts: "none" (on first use),
+# "used" (the providers workspaces are configured with) or "all".
+SERVICE_PRELOAD = (os.getenv("SESAME_SERVICE_PRELOAD") or "none").lower()
+
+
+class LazyParam:
+    """
+    A default parameter built, from the class at `class_path`, for every
+    service instance. Keeps the class's module from being imported until
+    a service needs it.
+    """
+
+    def __init__(self, class_path: str, **kwargs: Any):
+        self.class_path = class_path
+        self.kwargs = kwargs
+
 
 class ServiceDefinition(BaseModel):
     class_path: str
@@ -42,6 +67,9 @@ class ServiceFactory:
     """A factory class for creating and managing AI services."""
 
     _services: Dict[tuple[str, ServiceType], ServiceDefinition] = {}
+    # Resolved classes and the seconds it took to import them, by class path.
+    _classes: Dict[str, type] = {}
+    _import_times: Dict[str, float] = {}
 
     @classmethod
     def register_service(
@@ -88,9 +116,15 @@ class ServiceFactory:
         service_type: ServiceType,
         api_key: str,
         service_options: Optional[Mapping[str, Mapping[str, Any]]] = None,
-    ) -> AIService:
+        check_circuit: bool = True,
+    ) -> "AIService":
         """
         Create and return an instance of the requested service.
+
+        Raises `ServiceUnavailableError` while the circuit of an LLM
+        provider and API key is open (see `common.circuit_breaker`), unless
+        `check_circuit` is False, e.g. for callers with other providers to
+        fall back on.
         """
         service_key = (service_name, service_type)
         if service_key not in cls._services:
@@ -100,8 +134,22 @@ class ServiceFactory:
 
         service_info = cls._services[service_key]
 
+        breaker = None
+        # Only LLM services report the outcome of their requests (see
+        # `bots.circuit_breaker`), a breaker of another type would never open.
+        if CIRCUIT_BREAKER_ENABLED and service_type == ServiceType.ServiceLLM:
+            breaker = circuit_breakers.get(service_type.value, service_name, api_key)
+            retry_after = breaker.retry_after() if check_circuit else None
+            if retry_after is not None:
+                raise ServiceUnavailableError(service_name, service_type.value, retry_after)
+
         # Start with default params
-        kwargs = service_info.default_params.copy()
+        kwargs = {
+            key: cls._resolve_class(value.class_path)(**value.kwargs)
+            if isinstance(value, LazyParam)
+            else value
+            for key, value in service_info.default_params.items()
+        }
 
         # Handle API key
         if service_info.requires_api_key:
@@ -130,11 +178,61 @@ class ServiceFactory:
                     kwargs[key] = value
 
         # Instantiate the service
-        module_name, class_name = service_info.class_path.rsplit(":", 1)
-        module = __import__(module_name, fromlist=[class_name])
-        service_class = getattr(module, class_name)
+        service_class = cls._resolve_class(service_info.class_path)
+
+        service = service_class(**kwargs)
+        if breaker:
+            circuit_breakers.attach(service, breaker)
+        return service
+
+    @classmethod
+    def _resolve_class(cls, class_path: str) -> type:
+        service_class = cls._classes.get(class_path)
+        if service_class is None:
+            module_name, class_name = class_path.rsplit(":", 1)
+            start = time.perf_counter()
+            module = __import__(module_name, fromlist=[class_name])
+            service_class = getattr(module, class_name)
+            cls._import_times[class_path] = time.perf_counter() - start
+            cls._classes[class_path] = service_class
+        return service_class
+
+    @classmethod
+    def preload(
+        cls, services: Optional[Iterable[tuple[str, ServiceType]]] = None
+    ) -> Dict[str, float]:
+        """
+        Import the modules of the given (name, type) services, or of all
+        registered ones, now rather than on first use. Services that fail to
+        import are skipped. Returns the import time of each, in seconds.
+        """
+        times = {}
+        for service_name, service_type in list(cls._services if services is None else services):
+            service_info = cls._services.get((service_name, service_type))
+            if not service_info:
+                logger.warning(f"Unable to preload unknown service '{service_name}'")
+                continue
+            try:
+                cls._resolve_class(service_info.class_path)
+                for value in service_info.default_params.values():
+                    if isinstance(value, LazyParam):
+                        cls._resolve_class(value.class_path)
+            except Exception as e:
+                # pipecat raises a bare Exception when a provider's extra isn't installed.
+                logger.warning(f"Unable to preload service '{service_name}': {e}")
+                continue
+            times[f"{service_type.value}/{service_name}"] = cls._import_times[
+                service_info.class_path
+            ]
+        return times
 
-        return service_class(**kwargs)
+    @classmethod
+    def get_import_times(cls) -> Dict[str, Optional[float]]:
+        """Seconds each registered service took to import, None until it is."""
+        return {
+            f"{type_.value}/{name}": cls._import_times.get(service.class_path)
+            for (name, type_), service in cls._services.items()
+        }
 
     @classmethod
     def get_service_defintion(
@@ -204,6 +302,35 @@ class ServiceFactory:
         return True
 
 
+async def preload_services(session_factory, mode: str = SERVICE_PRELOAD) -> Dict[str, float]:
+    """Preload service modules as `SESAME_SERVICE_PRELOAD` says."""
+    if mode == "all":
+        services = None
+    elif mode == "used":
+        from common.models import Workspace
+
+        async with session_factory() as db:
+            configured = await Workspace.get_configured_services(db)
+        services = []
+        for service_type, service_name in configured:
+            try:
+                services.append((service_name, ServiceType(service_type)))
+            except ValueError:
+                continue
+    else:
+        if mode != "none":
+            logger.warning(f"Unknown service preload mode '{mode}', loading services lazily")
+        return {}
+
+    start = time.perf_counter()
+    times = ServiceFactory.preload(services)
+    logger.info(
+        f"Preloaded {len(times)} services in {time.perf_counter() - start:.2f}s: "
+        + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in times.items())
+    )
+    return times
+
+
 # Transport services
 ServiceFactory.register_service(
     "pipecat.transports.services.daily:DailyTransport",
@@ -276,7 +403,7 @@ ServiceFactory.register_service(
     optional_params=["voice_id"],
     default_params={
         "voice_id": "79a125e8-cd45-4c13-8a67-188112f4dd22",
-        "text_filter": MarkdownTextFilter(),
+        "text_filter": LazyParam("pipecat.utils.text.markdown_text_filter:MarkdownTextFilter"),
     },
 )
 
@@ -287,7 +414,7 @@ ServiceFactory.register_service(
     optional_params=["voice_id"],
     default_params={
         "voice_id": "pFZP5JQG7iQjIQuC4Bku",
-        "text_filter": MarkdownTextFilter(),
+        "text_filter": LazyParam("pipecat.utils.text.markdown_text_filter:MarkdownTextFilter"),
     },
 )
 
@@ -299,7 +426,7 @@ ServiceFactory.register_service(
     optional_params=["voice_id"],
     default_params={
         "voice_id": "s3://voice-cloning-zero-shot/820da3d2-3a3b-42e7-844d-e68db835a206/sarah/manifest.json",
-        "text_filter": MarkdownTextFilter(),
+        "text_filter": LazyParam("pipecat.utils.text.markdown_text_filter:MarkdownTextFilter"),
     },
 )
 
@@ -311,7 +438,7 @@ ServiceFactory.register_service(
     optional_params=["voice_id"],
     default_params={
         "voice_id": "en-US-SaraNeural",
-        "text_filter": MarkdownTextFilter(),
+        "text_filter": LazyParam("pipecat.utils.text.markdown_text_filter:MarkdownTextFilter"),
     },
 )
 """
@@ -323,6 +450,26 @@ ServiceFactory.register_service(
     optional_params=["sample_rate"],
     default_params={
         "voice_id": "nova",
-        "text_filter": MarkdownTextFilter(),
+        "text_filter": LazyParam("pipecat.utils.text.markdown_text_filter:MarkdownTextFilter"),
     },
 )
+
+# Mock services, for load tests on a machine without provider access (see
+# `bots.mock_services`). Workspaces select them as the `mock` provider.
+MOCK_SERVICE_NAME = "mock"
+MOCK_SERVICES_ENABLED = bool(int(os.getenv("SESAME_MOCK_SERVICES", "0") or 0))
+
+if MOCK_SERVICES_ENABLED:
+    for mock_class, mock_type, mock_params in (
+        ("MockTransport", ServiceType.ServiceTransport, {"api_url": "mock://"}),
+        ("MockSTTService", ServiceType.ServiceSTT, {}),
+        ("MockLLMService", ServiceType.ServiceLLM, {}),
+        ("MockTTSService", ServiceType.ServiceTTS, {}),
+    ):
+        ServiceFactory.register_service(
+            f"bots.mock_services:{mock_class}",
+            MOCK_SERVICE_NAME,
+            mock_type,
+            requires_api_key=False,
+            default_params=mock_params,
+        )
@@ -905,6 +905,234 @@ def run(
         raise typer.Exit(1)
 
 
+@app.command()
+@require_env_and_schema
+def voice_worker(
+    capacity: int = typer.Option(
+        int(os.getenv("SESAME_VOICE_BOT_MAX_CONCURRENT", "20") or 20),
+        "--capacity",
+        "-c",
+        help="Voice bots this node runs at once.",
+    ),
+    worker_id: Optional[str] = typer.Option(None, "--id", help="Node name, host and pid by default."),
+):
+    """Run voice bots dispatched by the webapp (SESAME_VOICE_BOT_DISPATCH=remote)."""
+    load_dotenv(env_file)
+
+    from bots.voice.dispatch import PostgresJobChannel, VoiceBotWorkerNode
+    from bots.voice.supervisor import VoiceBotSupervisor
+    from bots.voice.worker_pool import VoiceBotWorkerPool
+    from common.database import DatabaseSessionFactory
+
+    async def run_node():
+        session_factory = DatabaseSessionFactory()
+        node = VoiceBotWorkerNode(
+            PostgresJobChannel(session_factory),
+            VoiceBotSupervisor(pool=VoiceBotWorkerPool(), max_concurrent=capacity, queue_size=0),
+            session_factory=session_factory,
+            worker_id=worker_id,
+            capacity=capacity,
+        )
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, node.stop)
+        console.print(f"\nVoice bot worker {node.worker_id} running", style="blue bold")
+        try:
+            await node.run()
+        finally:
+            await session_factory.engine.dispose()
+
+    asyncio.run(run_node())
+    console.print("\nVoice bot worker stopped", style="yellow")
+
+
+# ========================
+# Load Test
+# ========================
+
+
+@app.command()
+@require_env_and_schema
+def load_test(
+    url: str = typer.Option("http://localhost:8000", "--url", help="Webapp to load."),
+    users: int = typer.Option(10, "--users", "-u", help="Users to create."),
+    conversations: int = typer.Option(10, "--conversations", "-c", help="Conversations per user."),
+    streams: int = typer.Option(100, "--streams", "-s", help="Action streams running at once."),
+    duration: float = typer.Option(60, "--duration", "-d", help="Seconds to run for."),
+    think_time: float = typer.Option(
+        1.0, "--think-time", help="Mean seconds between the requests of a stream."
+    ),
+    ramp_up: float = typer.Option(10, "--ramp-up", help="Seconds over which streams start."),
+    provider: str = typer.Option(
+        "mock", "--provider", help="LLM provider (mock needs SESAME_MOCK_SERVICES=1 on the webapp)."
+    ),
+    api_key: str = typer.Option("mock", "--api-key", help="API key of the LLM provider."),
+    service_options: str = typer.Option(
+        '{"tokens": 50, "tokens_per_sec": 50, "ttft_ms": 300}',
+        "--service-options",
+        help="Options of the LLM service, as JSON.",
+    ),
+    output: Path = typer.Option(
+        Path("load-test-report"), "--output", "-o", help="Report path, without extension."
+    ),
+    baseline: Optional[Path] = typer.Option(
+        None, "--baseline", help="JSON report of an earlier run to compare with."
+    ),
+    tolerance: float = typer.Option(
+        0.1, "--tolerance", help="Share by which results may be worse than the baseline's."
+    ),
+    keep_data: bool = typer.Option(
+        False, "--keep-data", help="Keep the users and their data after the run."
+    ),
+):
+    """Load /rtvi/action with concurrent streams and write a JSON and HTML report."""
+    load_dotenv(env_file)
+
+    import json
+
+    from common.load_test import LoadTest, LoadTestConfig, compare, write_report
+
+    config = LoadTestConfig(
+        base_url=url,
+        users=users,
+        conversations_per_user=conversations,
+        streams=streams,
+        duration_secs=duration,
+        think_time_secs=think_time,
+        ramp_up_secs=ramp_up,
+        provider=provider,
+        api_key=api_key,
+        service_options=json.loads(service_options),
+    )
+    try:
+        report = asyncio.run(
+            LoadTest(config, construct_admin_database_url()).run(keep_data=keep_data)
+        )
+    except Exception as e:
+        console.print(f"\n✗ Load test failed: {e}", style="red bold")
+        raise typer.Exit(1)
+
+    regressions = None
+    if baseline:
+        regressions = compare(report, json.loads(baseline.read_text()), tolerance)
+    json_path, html_path = write_report(report, output, regressions)
+
+    table = Table(box=box.ROUNDED, show_header=False)
+    table.add_column("Metric", style="blue")
+    table.add_column("Value", style="bold")
+    table.add_row("Requests", str(report["requests"]))
+    table.add_row("Requests/s", str(report["requests_per_sec"]))
+    table.add_row("Error rate", str(report["error_rate"]))
+    for label, key in (("Latency", "latency_ms"), ("TTFT", "ttft_ms")):
+        table.add_row(f"{label} p50/p95 (ms)", f"{report[key]['p50']} / {report[key]['p95']}")
+    table.add_row("Tokens/s", str(report["tokens_per_sec"]["total"]))
+    if report["db_pool"]:
+        table.add_row("DB pool wait, mean (ms)", str(report["db_pool"]["wait_ms_mean"]))
+    console.print(table)
+    console.print(f"\nReport written to {json_path} and {html_path}", style="green")
+
+    if regressions:
+        console.print("\n✗ Regressions against the baseline:", style="red bold")
+        for regression in regressions:
+            console.print(f"  • {regression}", style="red")
+        raise typer.Exit(1)
+
+
+# ========================
+# Seed
+# ========================
+
+
+@app.command()
+@require_env_and_schema
+def seed(
+    users: int = typer.Option(1000, "--users", "-u", help="Users to create."),
+    workspaces: int = typer.Option(2, "--workspaces", "-w", help="Workspaces per user."),
+    conversations: int = typer.Option(
+        50, "--conversations", "-c", help="Conversations per workspace."
+    ),
+    messages: int = typer.Option(
+        30, "--messages", "-m", help="Median messages per conversation."
+    ),
+    attachment_rate: float = typer.Option(
+        0.05, "--attachment-rate", help="Share of conversations with attachments."
+    ),
+    workers: int = typer.Option(
+        os.cpu_count() or 4, "--workers", help="Processes generating and copying rows."
+    ),
+    password: Optional[str] = typer.Option(
+        None, "--password", "-p", help="Password of the users (random if not given)."
+    ),
+    random_seed: Optional[int] = typer.Option(
+        None,
+        "--random-seed",
+        help="Generate the same data on every run (with new ids and emails).",
+    ),
+):
+    """Bulk-load synthetic users, conversations and messages for scale tests."""
+    load_dotenv(env_file)
+
+    import time
+
+    from common.encryption import encrypt_with_secret
+    from common.seed import SeedConfig
+    from common.seed import seed as seed_database
+
+    if not os.getenv("SESAME_APP_SECRET"):
+        console.print(
+            "SESAME_APP_SECRET missing from .env, required to encrypt service API keys.",
+            style="red bold",
+        )
+        raise typer.Exit(1)
+
+    config = SeedConfig(
+        users=users,
+        workspaces_per_user=workspaces,
+        conversations_per_workspace=conversations,
+        messages_per_conversation=messages,
+        attachment_rate=attachment_rate,
+        workers=workers,
+        random_seed=random_seed,
+    )
+    password = password or secrets.token_urlsafe(12)
+    run_id = secrets.token_hex(4)
+    console.print(
+        f"\nSeeding {users} users, about {config.estimated_messages():,} messages "
+        f"({workers} workers)",
+        style="blue bold",
+    )
+
+    started = time.monotonic()
+    with Status("[blue]Loading...", spinner="dots") as status:
+        try:
+            counts = seed_database(
+                construct_admin_database_url(),
+                config,
+                run_id,
+                PasswordHasher().hash(password),
+                encrypt_with_secret("seed"),
+                on_progress=lambda done, total: status.update(
+                    f"[blue]Loaded {done}/{total} users..."
+                ),
+            )
+        except Exception as e:
+            console.print(f"\n✗ Seeding failed: {e}", style="red bold")
+            raise typer.Exit(1)
+    elapsed = time.monotonic() - started
+
+    table = Table(box=box.ROUNDED)
+    table.add_column("Table", style="blue")
+    table.add_column("Rows", style="bold", justify="right")
+    for table_name, count in counts.items():
+        table.add_row(table_name, f"{count:,}")
+    console.print(table)
+    console.print(
+        f"\n✓ Loaded and analyzed in {elapsed:.1f}s. "
+        f"Users are seed-{run_id}-<n>@example.com, password {password}",
+        style="green",
+    )
+
+
 # ========================
 # Services
 # ========================
@@ -1013,71 +1241,66 @@ async def _update_table(table_name: str):
 
 
 @app.command()
-def terminate():
-    """终止所有运行中的FastAPI服务器进程"""
+def terminate(
+    timeout: float = typer.Option(
+        float(os.getenv("SESAME_VOICE_BOT_DRAIN_TIMEOUT", "30")) + 15,
+        "--timeout",
+        help="等待服务器正常退出的秒数，超时后强制终止",
+    ),
+):
+    """终止所有运行中的FastAPI服务器进程
+
+    先发送SIGTERM，让服务器停止接收新的语音机器人并等待运行中的会话结束，
+    超时后再强制终止剩余进程。
+    """
     console.print("\n正在查找运行中的服务器进程...", style="blue bold")
-    
-    terminated = False
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+
+    servers = []
+    for proc in psutil.process_iter(["pid", "cmdline"]):
         try:
-            # 检查进程信息
-            cmdline = proc.cmdline() if hasattr(proc, 'cmdline') else []
-            
-            # 匹配所uvicorn进程
-            if len(cmdline) >= 1 and 'uvicorn' in str(cmdline):
-                try:
-                    # 获取进程及其子进程
-                    parent = psutil.Process(proc.pid)
-                    
-                    # 显示进程信息
-                    console.print(f"\n发现uvicorn进程:", style="yellow")
-                    console.print(f"PID: {parent.pid}", style="yellow")
-                    console.print(f"命令: {' '.join(cmdline)}", style="yellow")
-                    
-                    # 获取所有子进程
-                    children = parent.children(recursive=True)
-                    
-                    # 先终止子进程
-                    for child in children:
-                        try:
-                            console.print(f"终止子进程 (PID: {child.pid})", style="yellow")
-                            child.kill()  # 直接使用kill而不是terminate
-                        except:
-                            pass
-                    
-                    # 直接强制终止父进程
-                    console.print(f"终止主进程 (PID: {parent.pid})", style="yellow")
-                    parent.kill()  # 直接使用kill
-                    
-                    terminated = True
-                    console.print(f"✓ 已终止进程组 {parent.pid}", style="green")
-                    
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    # 如果上述方法失败，尝试使用系统命令强制终止
-                    try:
-                        os.kill(proc.pid, signal.SIGKILL)
-                        console.print(f"✓ 已强制终止进程 {proc.pid}", style="green")
-                        terminated = True
-                    except:
-                        console.print(f"无法终止进程 {proc.pid}", style="red")
-                
+            cmdline = proc.info["cmdline"] or []
+            if "uvicorn" not in " ".join(cmdline):
+                continue
+            # 只处理最上层的uvicorn进程，子进程由它自己关闭
+            parent = proc.parent()
+            if parent and "uvicorn" in " ".join(parent.cmdline()):
+                continue
+            console.print("\n发现uvicorn进程:", style="yellow")
+            console.print(f"PID: {proc.pid}", style="yellow")
+            console.print(f"命令: {' '.join(cmdline)}", style="yellow")
+            proc.send_signal(signal.SIGTERM)
+            servers.append(proc)
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             continue
         except Exception as e:
             console.print(f"处理进程时发生错误: {str(e)}", style="red")
-            continue
-    
-    # 最后再检查一次，确保所有uvicorn进程都被终止
-    try:
-        # 使用系统命令查找并终止所有残留的uvicorn进程
-        os.system("pkill -9 -f uvicorn")
-    except Exception as e:
-        console.print(f"清理残留进程时发生错误: {str(e)}", style="red")
-    
-    if not terminated:
+
+    if not servers:
         console.print("未发现运行中的服务器进程", style="yellow")
+        return
+
+    # 子进程（包括语音机器人）在主进程退出后仍可能残留，先记录下来
+    children = {}
+    for server in servers:
+        try:
+            children.update({c.pid: c for c in server.children(recursive=True)})
+        except psutil.NoSuchProcess:
+            pass
+
+    with Status(f"等待服务器正常退出（最多{timeout:.0f}秒）...", console=console):
+        _, alive = psutil.wait_procs(servers, timeout=timeout)
+
+    for proc in alive + [c for c in children.values() if c.is_running()]:
+        try:
+            console.print(f"强制终止进程 (PID: {proc.pid})", style="yellow")
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+    if alive:
+        console.print("\n✓ 服务器进程已强制终止", style="yellow bold")
     else:
-        console.print("\n✓ 所有服务器进程已成功终��", style="green bold")
+        console.print("\n✓ 所有服务器进程已正常退出", style="green bold")
 
 
 def main():
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import uuid
 from typing import AsyncGenerator, Callable
@@ -46,6 +47,18 @@ def construct_database_url(db_name="", user=None, password=None):
     )
 
 
+@pytest.fixture(autouse=True)
+async def cancel_leftover_tasks():
+    before = asyncio.all_tasks()
+    yield
+    # pipecat leaves the push task of a finished pipeline's sink behind, which
+    # keeps the interpreter from exiting once the event loop is closed.
+    leftover = asyncio.all_tasks() - before - {asyncio.current_task()}
+    for task in leftover:
+        task.cancel()
+    await asyncio.gather(*leftover, return_exceptions=True)
+
+
 @pytest.fixture(scope="session")
 def create_test_schema():
     async_postgres_url = construct_database_url()
@@ -9,3 +9,9 @@ async def test_get_workspaces(authorized_client: AsyncClient):
     assert response.status_code == 200
     response_json = response.json()
     assert isinstance(response_json, list)
+
+
+async def test_get_bots_latency(authorized_client: AsyncClient):
+    response = await authorized_client.get("/api/bots/latency", params={"days": 1})
+    assert response.status_code == 200
+    assert set(response.json()) == {"stt", "llm_ttfb", "tts_ttfb", "end_to_end"}
@@ -0,0 +1,229 @@
+import asyncio
+
+import pytest
+from bots.circuit_breaker import with_circuit_breaker
+from bots.llm_router import check_llm_circuits, create_llm_router
+from bots.types import BotConfig, LLMRouteConfig, LLMRoutingConfig
+from common.circuit_breaker import CircuitBreaker, CircuitState, circuit_breakers
+from common.errors import ServiceUnavailableError
+from common.models import Service
+from common.service_factory import ServiceFactory, ServiceType
+
+from pipecat.frames.frames import (
+    EndFrame,
+    ErrorFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class FakeLLM(LLMService):
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.fail = fail
+        self.requests = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            self.requests += 1
+            await self.push_frame(LLMFullResponseStartFrame())
+            if self.fail:
+                await self.push_error(ErrorFrame("unavailable"))
+            else:
+                await self.push_frame(TextFrame("Hi"))
+            await self.push_frame(LLMFullResponseEndFrame())
+        else:
+            await self.push_frame(frame, direction)
+
+
+class ErrorCollector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, ErrorFrame):
+            self.errors.append(frame.error)
+        await self.push_frame(frame, direction)
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    params = dict(min_requests=4, error_rate=0.5, window_secs=60, slow_secs=5, open_secs=30)
+    return CircuitBreaker("llm/test", **{**params, **kwargs})
+
+
+async def test_opens_on_error_rate_and_probes_when_half_open():
+    breaker = _breaker()
+    breaker.record_success(0.2, now=0)
+    breaker.record_failure(now=1)
+    breaker.record_success(6, now=2)  # too slow, counts as failed
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure(now=3)
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow(now=10)
+    assert breaker.retry_after(now=10) == 23
+
+    # One request probes the provider, the others still fail fast.
+    assert breaker.allow(now=33)
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert not breaker.allow(now=34)
+    breaker.record_failure(now=35)
+    assert breaker.state == CircuitState.OPEN
+
+    assert breaker.allow(now=70)
+    breaker.record_success(0.3, now=71)
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow(now=72)
+
+
+async def test_old_failures_and_unanswered_probes_are_forgotten():
+    breaker = _breaker()
+    for now in range(3):
+        breaker.record_failure(now=now)
+    breaker.record_failure(now=100)
+    assert breaker.state == CircuitState.CLOSED
+
+    breaker = _breaker(min_requests=1)
+    breaker.record_failure(now=0)
+    assert breaker.allow(now=30)
+    # Interrupted quickly: tells nothing, the next request probes.
+    breaker.record_abandoned(1, now=31)
+    assert breaker.allow(now=32)
+    # Never answered: another probe once the open time has passed.
+    assert not breaker.allow(now=40)
+    assert breaker.allow(now=62)
+
+
+@pytest.fixture
+def test_service():
+    key = ("test_event", ServiceType.ServiceLLM)
+    ServiceFactory.register_service(
+        "threading:Event", "test_event", ServiceType.ServiceLLM, requires_api_key=False
+    )
+    yield key
+    ServiceFactory._services.pop(key)
+    circuit_breakers._breakers.pop(circuit_breakers.key("llm", "test_event", ""), None)
+
+
+async def test_factory_refuses_services_while_open(test_service):
+    service = ServiceFactory.get_service("test_event", ServiceType.ServiceLLM, "")
+    breaker = circuit_breakers.for_service(service)
+    assert breaker is circuit_breakers.get("llm", "test_event", "")
+
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(ServiceUnavailableError) as e:
+        ServiceFactory.get_service("test_event", ServiceType.ServiceLLM, "")
+    assert e.value.retry_after > 0
+
+
+async def test_only_llm_services_get_a_breaker():
+    ServiceFactory.register_service(
+        "threading:Event", "test_event", ServiceType.ServiceTTS, requires_api_key=False
+    )
+    try:
+        service = ServiceFactory.get_service("test_event", ServiceType.ServiceTTS, "")
+    finally:
+        ServiceFactory._services.pop(("test_event", ServiceType.ServiceTTS))
+    # Nothing would record the outcome of its requests.
+    assert circuit_breakers.for_service(service) is None
+    assert circuit_breakers.find("tts", "test_event", "") is None
+
+
+@pytest.fixture
+def routed_services():
+    providers = ["test_primary", "test_backup"]
+    for provider in providers:
+        ServiceFactory.register_service(
+            "pipecat.services.ai_services:LLMService",
+            provider,
+            ServiceType.ServiceLLM,
+            requires_api_key=False,
+        )
+    yield providers
+    for provider in providers:
+        ServiceFactory._services.pop((provider, ServiceType.ServiceLLM))
+        circuit_breakers._breakers.pop(circuit_breakers.key("llm", provider, "key"), None)
+
+
+async def test_routing_goes_on_while_the_primary_is_open(routed_services):
+    primary, backup = routed_services
+    routes = [LLMRouteConfig(provider=provider) for provider in routed_services]
+    config = BotConfig(llm_routing=LLMRoutingConfig(providers=routes))
+    services = {
+        "llm": Service(service_type="llm", service_provider=primary, api_key="key"),
+        f"llm:{backup}": Service(service_type="llm", service_provider=backup, api_key="key"),
+    }
+    for provider in routed_services:
+        ServiceFactory.get_service(provider, ServiceType.ServiceLLM, "key")
+    for _ in range(10):
+        circuit_breakers.get("llm", primary, "key").record_failure()
+
+    llm = ServiceFactory.get_service(primary, ServiceType.ServiceLLM, "key", check_circuit=False)
+    router = create_llm_router(config, services, llm)
+    assert router
+    # The backup takes the turns.
+    check_llm_circuits(primary, llm, router)
+
+    for _ in range(10):
+        circuit_breakers.get("llm", backup, "key").record_failure()
+    with pytest.raises(ServiceUnavailableError) as e:
+        check_llm_circuits(primary, llm, router)
+    assert e.value.service_name == f"{primary}, {backup}"
+    # Without routing, the primary's circuit decides.
+    with pytest.raises(ServiceUnavailableError):
+        check_llm_circuits(primary, llm, None)
+
+
+async def _run_requests(processor: FrameProcessor, count: int) -> ErrorCollector:
+    errors = ErrorCollector()
+    task = PipelineTask(Pipeline([errors, processor]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    for _ in range(count):
+        context = OpenAILLMContext([{"role": "user", "content": "Hello"}])
+        await task.queue_frame(OpenAILLMContextFrame(context))
+        await asyncio.sleep(0.05)
+    await task.queue_frame(EndFrame())
+    await runner
+    return errors
+
+
+async def test_failing_llm_opens_circuit_and_fails_fast():
+    llm = FakeLLM(fail=True)
+    breaker = _breaker(min_requests=2, open_secs=60)
+    circuit_breakers.attach(llm, breaker)
+
+    errors = await _run_requests(with_circuit_breaker(llm), 4)
+
+    assert breaker.state == CircuitState.OPEN
+    # Two requests failed, the last two weren't sent.
+    assert llm.requests == 2
+    assert errors.errors[:2] == ["unavailable", "unavailable"]
+    assert len(errors.errors) == 4
+
+
+async def test_responses_keep_circuit_closed():
+    llm = FakeLLM()
+    breaker = _breaker(min_requests=1)
+    circuit_breakers.attach(llm, breaker)
+
+    await _run_requests(with_circuit_breaker(llm), 3)
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.snapshot()["requests"] == 3
@@ -0,0 +1,168 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bots.types import BotConfig
+from bots.voice import room_pool
+from bots.voice.bot import _cleanup, voice_bot_create
+from bots.voice.room_pool import DailyRoomPool
+from common.models import Service
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class DailyStandIn:
+    """Just enough of the Daily REST API for the room pool."""
+
+    def __init__(self):
+        self.rooms = {}
+        self.tokens = []
+        self.fail_tokens = False
+        self.app = web.Application()
+        self.app.router.add_post("/rooms", self.create_room)
+        self.app.router.add_get("/rooms/{name}", self.get_room)
+        self.app.router.add_delete("/rooms/{name}", self.delete_room)
+        self.app.router.add_post("/meeting-tokens", self.create_token)
+
+    async def create_room(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        name = uuid.uuid4().hex[:10]
+        room = {
+            "id": name,
+            "name": name,
+            "api_created": True,
+            "privacy": body.get("privacy", "public"),
+            "url": f"https://example.daily.co/{name}",
+            "created_at": "2024-01-01T00:00:00.000Z",
+            "config": body.get("properties", {}),
+        }
+        self.rooms[name] = room
+        return web.json_response(room)
+
+    async def get_room(self, request: web.Request) -> web.Response:
+        return web.json_response(self.rooms[request.match_info["name"]])
+
+    async def delete_room(self, request: web.Request) -> web.Response:
+        del self.rooms[request.match_info["name"]]
+        return web.json_response({"deleted": True})
+
+    async def create_token(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        assert body["properties"]["room_name"] in self.rooms
+        if self.fail_tokens and len(self.tokens) % 2:
+            return web.json_response({"error": "rate-limit"}, status=429)
+        token = uuid.uuid4().hex
+        self.tokens.append(token)
+        return web.json_response({"token": token})
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def daily():
+    daily = DailyStandIn()
+    server = TestServer(daily.app)
+    await server.start_server()
+    daily.url = str(server.make_url("")).rstrip("/")
+    yield daily
+    await server.close()
+
+
+async def _filled(pool: DailyRoomPool, daily: DailyStandIn, count: int):
+    for _ in range(100):
+        if pool.available("key", daily.url) == count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Pool was not refilled")
+
+
+async def test_connect_uses_pooled_rooms(daily):
+    pool = DailyRoomPool(size=2)
+
+    room, user_token, bot_token = await pool.acquire("key", daily.url)
+    assert user_token != bot_token
+    assert room.config.exp > time.time()
+
+    await _filled(pool, daily, 2)
+    created = len(daily.rooms)
+
+    # Served from the pool, only the tokens are requested.
+    second, _, _ = await pool.acquire("key", daily.url)
+    assert second.name != room.name
+    assert len(daily.tokens) == 4
+
+    await _filled(pool, daily, 2)
+    assert len(daily.rooms) == created + 1
+
+    await pool.close()
+
+
+async def test_unused_rooms_are_recycled(daily):
+    pool = DailyRoomPool(size=1)
+
+    room, _, _ = await pool.acquire("key", daily.url)
+    await _filled(pool, daily, 1)
+    pool.recycle("key", daily.url, room)
+    # The pool is full already.
+    assert pool.available("key", daily.url) == 1
+
+    pooled, _, _ = await pool.acquire("key", daily.url)
+    pool.recycle("key", daily.url, pooled)
+    again, _, _ = await pool.acquire("key", daily.url)
+    assert again.name == pooled.name
+
+    await pool.close()
+
+
+async def test_rooms_expiring_soon_are_dropped(daily, monkeypatch):
+    pool = DailyRoomPool(size=1)
+
+    await pool.acquire("key", daily.url)
+    await _filled(pool, daily, 1)
+    pooled = next(iter(pool._queues.values())).rooms[0]
+
+    # Not enough time left for a full session.
+    monkeypatch.setattr(room_pool, "MAX_SESSION_TIME", pool._room_ttl)
+    room, _, _ = await pool.acquire("key", daily.url)
+    assert room.name != pooled.name
+
+    await pool.close()
+
+
+async def test_rooms_are_discarded_when_tokens_fail(daily):
+    pool = DailyRoomPool(size=1)
+
+    await pool.acquire("key", daily.url)
+    await _filled(pool, daily, 1)
+    pooled = next(iter(pool._queues.values())).rooms[0]
+
+    # Only one of the two tokens is issued.
+    daily.fail_tokens = True
+    with pytest.raises(Exception):
+        await pool.acquire("key", daily.url)
+    daily.fail_tokens = False
+
+    await _filled(pool, daily, 1)
+    room, _, _ = await pool.acquire("key", daily.url)
+    assert room.name != pooled.name
+
+    await pool.close()
+
+
+async def test_only_rooms_created_on_demand_are_deleted(daily, monkeypatch):
+    monkeypatch.delenv("USE_DEBUG_ROOM", raising=False)
+    monkeypatch.delenv("DAILY_USE_DEBUG_ROOM", raising=False)
+    pool = DailyRoomPool(size=1)
+    pooled, _, _ = await voice_bot_create("key", daily.url, pool)
+    await pool.close()
+    on_demand, _, _ = await voice_bot_create("key", daily.url)
+    transport = Service(service_provider="daily", api_key="key", options={"api_url": daily.url})
+    services = {"transport": transport}
+
+    await _cleanup(pooled.url, BotConfig(), services)
+    await _cleanup(on_demand.url, BotConfig(), services)
+
+    assert pooled.name in daily.rooms
+    assert on_demand.name not in daily.rooms
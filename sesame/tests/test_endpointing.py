@@ -0,0 +1,78 @@
+import pytest
+from bots.voice.endpointing import AdaptiveEndpointing, AdaptiveVADAnalyzer
+from common.metrics import Metrics
+
+from pipecat.audio.vad.vad_analyzer import VADParams, VADState
+
+
+def test_premature_turn_ends_wait_longer():
+    endpointing = AdaptiveEndpointing(stop_secs=0.3, min_secs=0.2, max_secs=1.2)
+    before = Metrics.get("vad_premature_turn_ends")
+
+    now = 0.0
+    for _ in range(10):
+        # The turn ends after 0.3s and the user goes on 0.4s later.
+        now += 5
+        endpointing.observe_turn_end(now, 0.3)
+        endpointing.observe_speech_start(now + 0.4)
+
+    assert endpointing.turn_ends == 10
+    assert endpointing.premature_turn_ends == 10
+    assert Metrics.get("vad_premature_turn_ends") - before == 10
+    assert 0.5 < endpointing.stop_secs() <= 0.8
+
+
+def test_later_speech_is_a_new_turn():
+    endpointing = AdaptiveEndpointing(stop_secs=0.3, premature_window=1.0)
+
+    endpointing.observe_turn_end(10.0, 0.3)
+    endpointing.observe_speech_start(15.0)
+
+    assert endpointing.premature_turn_ends == 0
+    assert endpointing.stop_secs() == 0.3
+
+
+def test_short_pauses_end_turns_sooner_within_bounds():
+    endpointing = AdaptiveEndpointing(stop_secs=0.8, min_secs=0.5, max_secs=1.2)
+
+    for _ in range(50):
+        endpointing.observe_pause(0.1)
+
+    assert endpointing.stop_secs() == pytest.approx(0.5)
+
+
+def test_transcript_hints():
+    endpointing = AdaptiveEndpointing(stop_secs=0.6, min_secs=0.2, max_secs=1.2)
+
+    endpointing.observe_transcript("I'd like to book a table for two and")
+    assert endpointing.stop_secs() == pytest.approx(0.9)
+    endpointing.observe_transcript("I'd like to book a table for two.")
+    assert endpointing.stop_secs() == pytest.approx(0.45)
+    endpointing.observe_transcript("I'd like to book a table")
+    assert endpointing.stop_secs() == 0.6
+
+
+def test_disabled_keeps_stop_secs():
+    endpointing = AdaptiveEndpointing(stop_secs=0.3, enabled=False)
+
+    endpointing.observe_transcript("so um")
+    for _ in range(20):
+        endpointing.observe_pause(1.0)
+        endpointing.observe_turn_end(0.0, 0.3)
+        endpointing.observe_speech_start(0.1)
+
+    assert endpointing.stop_secs() == 0.3
+    assert endpointing.premature_turn_ends == 20
+
+
+def test_analyzer_uses_endpointing():
+    endpointing = AdaptiveEndpointing(stop_secs=0.3)
+    analyzer = AdaptiveVADAnalyzer(endpointing, params=VADParams(stop_secs=0.3))
+
+    silence = b"\x00" * analyzer.num_frames_required() * 2
+    assert analyzer.analyze_audio(silence) == VADState.QUIET
+    assert analyzer._vad_stop_frames == round(0.3 / (512 / 16000))
+
+    # New params from the client are the new starting point.
+    analyzer.set_params(VADParams(stop_secs=0.6))
+    assert endpointing.base_stop_secs == 0.6
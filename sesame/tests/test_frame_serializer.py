@@ -0,0 +1,93 @@
+import base64
+import json
+
+import msgpack
+import pytest
+from bots.http.frame_serializer import (
+    BotFrameSerializer,
+    BotWebSocketSerializer,
+    StreamFormat,
+    negotiate_stream_format,
+)
+from bots.http.text_coalescer import BotLLMTextCoalescer
+
+from pipecat.frames.frames import EndFrame, Frame, TransportMessageUrgentFrame
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+
+def _llm_text(text: str) -> dict:
+    return {"label": "rtvi-ai", "type": "bot-llm-text", "data": {"text": text}}
+
+
+class MessageCollector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, TransportMessageUrgentFrame):
+            self.messages.append(frame.message)
+        await self.push_frame(frame, direction)
+
+
+def test_negotiate_stream_format():
+    assert negotiate_stream_format(None, None) == StreamFormat.BASE64
+    assert negotiate_stream_format("json", None) == StreamFormat.JSON
+    assert negotiate_stream_format(None, "application/x-msgpack") == StreamFormat.MSGPACK
+    assert negotiate_stream_format(None, "text/event-stream; format=json") == StreamFormat.JSON
+    with pytest.raises(ValueError):
+        negotiate_stream_format("xml", None)
+
+
+def test_serialize_formats():
+    message = _llm_text("hello")
+    frame = TransportMessageUrgentFrame(message=message)
+
+    encoded = BotFrameSerializer().serialize(frame)
+    assert json.loads(base64.b64decode(encoded[len("data: ") :])) == message
+
+    encoded = BotFrameSerializer(StreamFormat.JSON).serialize(frame)
+    assert encoded == f"data: {json.dumps(message)}\n\n"
+
+    encoded = BotFrameSerializer(StreamFormat.MSGPACK).serialize(frame)
+    assert msgpack.unpackb(encoded) == message
+
+
+def test_websocket_serializer():
+    serializer = BotWebSocketSerializer()
+    message = _llm_text("hello")
+
+    assert json.loads(serializer.serialize(TransportMessageUrgentFrame(message=message))) == message
+
+    frame = serializer.deserialize(json.dumps({"label": "rtvi-ai", "type": "action", "id": "1"}))
+    assert isinstance(frame, TransportMessageUrgentFrame)
+    assert frame.message["type"] == "action"
+    assert serializer.deserialize("not json") is None
+    assert serializer.deserialize("[1, 2]") is None
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_llm_text_is_coalesced():
+    collector = MessageCollector()
+    task = PipelineTask(Pipeline([BotLLMTextCoalescer(window_secs=10), collector]))
+
+    await task.queue_frames(
+        [
+            TransportMessageUrgentFrame(message=_llm_text("Once ")),
+            TransportMessageUrgentFrame(message=_llm_text("upon ")),
+            TransportMessageUrgentFrame(message={"label": "rtvi-ai", "type": "bot-llm-stopped"}),
+            TransportMessageUrgentFrame(message=_llm_text("a time")),
+            EndFrame(),
+        ]
+    )
+    await PipelineRunner(handle_sigint=False).run(task)
+
+    assert collector.messages == [
+        _llm_text("Once upon "),
+        {"label": "rtvi-ai", "type": "bot-llm-stopped"},
+        _llm_text("a time"),
+    ]
@@ -0,0 +1,404 @@
+import asyncio
+import base64
+import json
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from bots import persistent_wal
+from bots.http.frame_serializer import BotFrameSerializer
+from bots.http.partial_response import PartialResponseProcessor
+from bots.http.session import HTTPBotSession, HTTPBotTurnCompletion, HTTPBotTurnOutput
+from bots.http.session_manager import HTTPBotSessionManager
+from bots.http.text_coalescer import BotLLMTextCoalescer
+from bots.persistent_context import PersistentContext
+from bots.rtvi import create_rtvi_processor
+from bots.types import BotConfig, BotParams, RTVIMessageModel
+from common.auth import Auth
+from common.metrics import Metrics
+from common.models import Message
+from fastapi import FastAPI, HTTPException, WebSocketDisconnect
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from webapp.api import rtvi as rtvi_api
+
+from pipecat.frames.frames import (
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.processors.frameworks.rtvi import RTVIBotLLMProcessor, RTVIMessage
+from pipecat.services.openai import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+    OpenAILLMService,
+)
+
+@pytest.fixture(autouse=True)
+def wal_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistent_wal, "WAL_DIR", str(tmp_path))
+    return tmp_path
+
+
+class EchoLLM(FrameProcessor):
+    """Answers every context with the number of messages it contains."""
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            await self.push_frame(LLMFullResponseStartFrame())
+            await self.push_frame(TextFrame(f"{len(frame.context.messages)} messages"))
+            await self.push_frame(LLMFullResponseEndFrame())
+        else:
+            await self.push_frame(frame, direction)
+
+
+class StallingLLM(FrameProcessor):
+    """Starts an answer and never finishes it."""
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            await self.push_frame(LLMFullResponseStartFrame())
+            await self.push_frame(TextFrame("Once upon"))
+            await asyncio.sleep(3600)
+        else:
+            await self.push_frame(frame, direction)
+
+
+async def _create_session(
+    conversation_id: str, stored: list, llm: type[FrameProcessor] = EchoLLM
+) -> HTTPBotSession:
+    context = OpenAILLMContext([{"role": "system", "content": "hi"}])
+    aggregators = OpenAILLMService.create_context_aggregator(
+        context, assistant_expect_stripped_words=False
+    )
+    storage = PersistentContext(context=context, wal_key=conversation_id, batch_window=0)
+    rtvi = await create_rtvi_processor(BotConfig(), aggregators.user())
+    output = HTTPBotTurnOutput()
+    completion = HTTPBotTurnCompletion()
+    coalescer = BotLLMTextCoalescer(window_secs=0)
+    partial_response = PartialResponseProcessor()
+    task = PipelineTask(
+        Pipeline(
+            [
+                rtvi,
+                aggregators.user(),
+                storage.create_processor(),
+                llm(),
+                partial_response,
+                RTVIBotLLMProcessor(),
+                coalescer,
+                output,
+                aggregators.assistant(),
+                storage.create_processor(exit_on_endframe=True),
+                completion,
+            ]
+        )
+    )
+    session = HTTPBotSession(
+        conversation_id=conversation_id,
+        db=None,
+        context=context,
+        storage=storage,
+        rtvi=rtvi,
+        task=task,
+        output=output,
+        completion=completion,
+        coalescer=coalescer,
+        partial_response=partial_response,
+    )
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        stored.extend(messages)
+
+    return session
+
+
+def _append_action(text: str) -> RTVIMessage:
+    return RTVIMessage(
+        type="action",
+        id="1",
+        data={
+            "service": "llm",
+            "action": "append_to_messages",
+            "arguments": [
+                {"name": "messages", "value": [{"role": "user", "content": text}]},
+                {"name": "run_immediately", "value": True},
+            ],
+        },
+    )
+
+
+async def _run_turn(manager: HTTPBotSessionManager, key: str, stored: list, count: int):
+    created = []
+
+    async def create():
+        session = await _create_session(key, stored)
+        created.append(session)
+        return session
+
+    async with manager.checkout(key) as slot:
+        session = await slot.get("fingerprint", count, create)
+        turn = session.run_turn([_append_action("hello")], AsyncSession(), BotFrameSerializer())
+        chunks = [chunk async for chunk in turn]
+
+    messages = [json.loads(base64.b64decode(chunk[len("data: ") :])) for chunk in chunks]
+    texts = [m["data"]["text"] for m in messages if m.get("type") == "bot-llm-text"]
+    return session, bool(created), texts
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_session_is_reused_between_turns():
+    manager = HTTPBotSessionManager(max_sessions=2, idle_timeout=0)
+    stored = []
+
+    first, created, texts = await _run_turn(manager, "convo", stored, 1)
+    assert created
+    assert texts == ["2 messages"]
+
+    second, created, texts = await _run_turn(manager, "convo", stored, 3)
+    assert not created
+    assert second is first
+    assert second.turns == 2
+    # The second turn sees the first one's context.
+    assert texts == ["4 messages"]
+    assert [m["role"] for m in stored] == ["user", "assistant", "user", "assistant"]
+
+    await manager.close()
+    assert first.closed
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_stale_session_is_rebuilt():
+    manager = HTTPBotSessionManager(max_sessions=2, idle_timeout=0)
+    stored = []
+
+    first, _, _ = await _run_turn(manager, "convo", stored, 1)
+    # Someone else added messages to the conversation.
+    second, created, _ = await _run_turn(manager, "convo", stored, 10)
+    assert created
+    assert first.closed
+    assert second is not first
+
+    await manager.close()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_sessions_are_capped():
+    manager = HTTPBotSessionManager(max_sessions=1, idle_timeout=0)
+    stored = []
+
+    first, _, _ = await _run_turn(manager, "one", stored, 1)
+    second, _, _ = await _run_turn(manager, "two", stored, 1)
+    assert first.closed
+    assert not second.closed
+    assert manager.session_count == 1
+
+    await manager.close()
+
+
+class RecordingSession(AsyncSession):
+    def __init__(self):
+        super().__init__()
+        self.sync_session.bind = create_engine("sqlite://")
+        self.commits = 0
+
+    async def commit(self):
+        self.commits += 1
+        await super().commit()
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_closing_the_stream_cancels_the_turn(monkeypatch):
+    stored = []
+    sessions = []
+    db = RecordingSession()
+
+    @asynccontextmanager
+    async def db_context(auth):
+        yield db
+
+    async def get_config_and_conversation(conversation_id, db):
+        return BotConfig(), SimpleNamespace(
+            messages=[], language_code="english", workspace_id="workspace"
+        )
+
+    async def validate_services(*args):
+        return {}
+
+    async def http_bot_pipeline(params, *args):
+        session = await _create_session(params.conversation_id, stored, StallingLLM)
+        sessions.append(session)
+        return session
+
+    async def is_disconnected():
+        return False
+
+    monkeypatch.setattr(rtvi_api, "get_authenticated_db_context", db_context)
+    monkeypatch.setattr(rtvi_api, "_get_config_and_conversation", get_config_and_conversation)
+    monkeypatch.setattr(rtvi_api, "_validate_services", validate_services)
+    monkeypatch.setattr("bots.http.bot.http_bot_pipeline", http_bot_pipeline)
+    manager = HTTPBotSessionManager(max_sessions=1, idle_timeout=0)
+    request = SimpleNamespace(
+        headers={},
+        app=SimpleNamespace(state=SimpleNamespace(http_bot_sessions=manager, cache={})),
+        is_disconnected=is_disconnected,
+    )
+    params = BotParams(
+        conversation_id="convo",
+        actions=[RTVIMessageModel.model_validate(_append_action("hello").model_dump())],
+    )
+    cancelled = Metrics.get("http_bot_cancelled")
+    partial = Metrics.get("http_bot_cancelled_partial_responses")
+
+    response = await rtvi_api.stream_action(request, params, Auth("user"), "json", 0)
+    stream = response.body_iterator
+    async for chunk in stream:
+        if "Once upon" in chunk:
+            break
+    # What Starlette does when the client goes away.
+    await stream.aclose()
+
+    # The pipeline is stopped, the LLM isn't left generating.
+    assert sessions[0].closed
+    assert Metrics.get("http_bot_cancelled") == cancelled + 1
+    assert Metrics.get("http_bot_cancelled_partial_responses") == partial + 1
+    assert stored == [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "Once upon"},
+    ]
+    assert db.commits == 1
+    await manager.close()
+
+
+class WebSocketApp:
+    """`/rtvi/ws` with the database and the LLM replaced, `good` is the only valid token."""
+
+    def __init__(self, monkeypatch, llm: type[FrameProcessor] = EchoLLM):
+        self.stored = []
+        self.sessions = []
+        self.manager = HTTPBotSessionManager(max_sessions=1, idle_timeout=0)
+
+        @asynccontextmanager
+        async def db_context(*args):
+            yield RecordingSession()
+
+        async def authenticate(token, db):
+            if token != "good":
+                raise HTTPException(status_code=401, detail="Invalid or revoked authentication token")
+            return Auth("user")
+
+        async def get_config_and_conversation(conversation_id, db):
+            return BotConfig(), SimpleNamespace(
+                messages=[], language_code="english", workspace_id="workspace"
+            )
+
+        async def validate_services(*args):
+            return {}
+
+        async def get_messages(conversation_id, db):
+            return []
+
+        async def count_messages(conversation_id, db):
+            return 0
+
+        async def http_bot_pipeline(params, *args):
+            session = await _create_session(params.conversation_id, self.stored, llm)
+            self.sessions.append(session)
+            return session
+
+        monkeypatch.setattr(rtvi_api, "default_session_factory", db_context)
+        monkeypatch.setattr(rtvi_api, "get_authenticated_db_context", db_context)
+        monkeypatch.setattr(rtvi_api, "authenticate", authenticate)
+        monkeypatch.setattr(rtvi_api, "_get_config_and_conversation", get_config_and_conversation)
+        monkeypatch.setattr(rtvi_api, "_validate_services", validate_services)
+        monkeypatch.setattr(Message, "get_messages_by_conversation_id", get_messages)
+        monkeypatch.setattr(Message, "count_messages_by_conversation_id", count_messages)
+        monkeypatch.setattr("bots.http.bot.http_bot_pipeline", http_bot_pipeline)
+
+        app = FastAPI()
+        app.include_router(rtvi_api.router)
+        app.state.http_bot_sessions = self.manager
+        self.client = TestClient(app)
+
+    def __enter__(self) -> "WebSocketApp":
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.client.portal.call(self.manager.close)
+        self.client.__exit__(*exc)
+
+    def connect(self, token: str = "good"):
+        return self.client.websocket_connect(
+            "/rtvi/ws?conversation_id=convo", headers={"Authorization": f"Bearer {token}"}
+        )
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _receive_until(websocket, text: str) -> list:
+    messages = []
+    while not any(m.get("data", {}).get("text") == text for m in messages):
+        messages.append(json.loads(websocket.receive_text()))
+    return messages
+
+
+def test_websocket_rejects_bad_tokens(monkeypatch):
+    with WebSocketApp(monkeypatch) as app:
+        with pytest.raises(WebSocketDisconnect) as e:
+            with app.connect("bad"):
+                pass
+        assert e.value.code == 1008
+
+        # Without a header the first message must carry the token.
+        with app.client.websocket_connect("/rtvi/ws?conversation_id=convo") as websocket:
+            websocket.send_json({"type": "action", "data": {}})
+            with pytest.raises(WebSocketDisconnect) as e:
+                websocket.receive_text()
+        assert e.value.code == 1008
+        assert app.sessions == []
+
+
+def test_websocket_turn(monkeypatch):
+    with WebSocketApp(monkeypatch) as app:
+        with app.client.websocket_connect("/rtvi/ws?conversation_id=convo") as websocket:
+            websocket.send_json({"type": "auth", "data": {"token": "good"}})
+            websocket.send_text(_append_action("hello").model_dump_json())
+            messages = _receive_until(websocket, "2 messages")
+            # Stored once the turn is done.
+            _wait_for(lambda: len(app.stored) == 2)
+
+        assert "bot-llm-started" in [m["type"] for m in messages]
+        assert [m["role"] for m in app.stored] == ["user", "assistant"]
+
+
+def test_websocket_disconnect_cancels_the_turn(monkeypatch):
+    cancelled = Metrics.get("http_bot_cancelled")
+    with WebSocketApp(monkeypatch, StallingLLM) as app:
+        with app.connect() as websocket:
+            websocket.send_text(_append_action("hello").model_dump_json())
+            _receive_until(websocket, "Once upon")
+            websocket.close()
+            _wait_for(lambda: app.sessions[0].closed and len(app.stored) == 2)
+
+        # The pipeline is stopped, the LLM isn't left generating.
+        assert app.sessions[0].closed
+        assert Metrics.get("http_bot_cancelled") == cancelled + 1
+        assert app.stored == [
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "Once upon"},
+        ]
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from typing import Dict
+
+# Importing the webapp must not load these, they are imported on first use.
+DEFERRED_MODULES = [
+    "pipecat.frames.frames",
+    "pipecat.services.ai_services",
+    "pipecat.processors.frameworks.rtvi",
+    "onnxruntime",
+    "pymupdf",
+    "pymupdf4llm",
+    "scipy",
+]
+# Cumulative import time allowed for `webapp.main`, in milliseconds.
+IMPORT_TIME_BUDGET_MS = int(os.getenv("SESAME_IMPORT_TIME_BUDGET_MS", "4000"))
+
+SESAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_times(module: str) -> Dict[str, float]:
+    """Cumulative import time of every module `module` loads, in milliseconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SESAME_DIR,
+        env={**os.environ, "PYTHONPATH": SESAME_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def test_webapp_defers_heavy_imports():
+    times = _import_times("webapp.main")
+    assert "webapp.main" in times
+    assert [m for m in DEFERRED_MODULES if m in times] == []
+
+
+def test_webapp_import_time_budget():
+    # Best of a few runs, the first one may hit a cold disk cache.
+    elapsed = min(_import_times("webapp.main")["webapp.main"] for _ in range(3))
+    assert elapsed <= IMPORT_TIME_BUDGET_MS, (
+        f"Importing webapp.main took {elapsed:.0f}ms, over the {IMPORT_TIME_BUDGET_MS}ms budget"
+    )
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from bots.http.llm_cache import LLMResponseCache, cached_llm
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    LLMUpdateSettingsFrame,
+    TextFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class CountingLLM(LLMService):
+    def __init__(self):
+        super().__init__()
+        self.set_model_name("fake-model")
+        self._settings = {"temperature": 0}
+        self.requests = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            self.requests += 1
+            await self.push_frame(LLMFullResponseStartFrame())
+            for chunk in ["Hel", "lo ", "there"]:
+                await self.push_frame(TextFrame(chunk))
+            await self.push_frame(LLMFullResponseEndFrame())
+        else:
+            await self.push_frame(frame, direction)
+
+
+class Collector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+        self.ended = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, LLMFullResponseStartFrame):
+            self.responses.append([])
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.ended += 1
+        elif type(frame) is TextFrame:
+            self.responses[-1].append(frame.text)
+        await self.push_frame(frame, direction)
+
+
+async def _run(
+    llm: LLMService, cache: LLMResponseCache, frames, scope: str = "workspace"
+) -> Collector:
+    collector = Collector()
+    task = PipelineTask(Pipeline([cached_llm(llm, llm, "fake", scope, cache), collector]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    for frame in frames:
+        responses = len(collector.responses)
+        await task.queue_frame(frame)
+        if isinstance(frame, OpenAILLMContextFrame):
+            # The response must be in the cache before the next request.
+            for _ in range(100):
+                if collector.ended > responses:
+                    break
+                await asyncio.sleep(0.01)
+    await task.queue_frame(EndFrame())
+    await runner
+    return collector
+
+
+def _request(text: str = "Hello") -> OpenAILLMContextFrame:
+    return OpenAILLMContextFrame(OpenAILLMContext([{"role": "user", "content": text}]))
+
+
+async def test_same_request_is_replayed_in_original_chunks():
+    llm = CountingLLM()
+    collector = await _run(
+        llm, LLMResponseCache(1024), [_request(), _request(), _request("Something else")]
+    )
+
+    assert llm.requests == 2
+    assert collector.responses == [["Hel", "lo ", "there"]] * 3
+
+
+async def test_settings_are_part_of_the_key():
+    llm = CountingLLM()
+    frames = [
+        _request(),
+        LLMUpdateSettingsFrame(settings={"max_tokens": 10}),
+        _request(),
+        # Not deterministic, never cached.
+        LLMUpdateSettingsFrame(settings={"temperature": 0.7}),
+        _request(),
+        _request(),
+    ]
+    await _run(llm, LLMResponseCache(1024), frames)
+
+    assert llm.requests == 4
+
+
+async def test_responses_stay_in_their_scope():
+    cache = LLMResponseCache(1024)
+    requests = 0
+    for scope in ["workspace:key", "other-workspace:key", "workspace:other-key", "workspace:key"]:
+        llm = CountingLLM()
+        await _run(llm, cache, [_request()], scope=scope)
+        requests += llm.requests
+
+    assert requests == 3
+
+
+async def test_least_recently_used_responses_are_evicted():
+    cache = LLMResponseCache(max_bytes=200)
+    for i in range(3):
+        cache.put(f"{i}" * 64, ["x" * 20])
+    assert cache.get("0" * 64) is None
+    assert cache.get("1" * 64) == ["x" * 20]
+    cache.put("3" * 64, ["x" * 20])
+    assert cache.get("2" * 64) is None
+    assert cache.get("1" * 64) is not None
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from bots.llm_router import LLMLatencyTracker, LLMRoute, LLMRouter
+from common.metrics import Metrics
+
+from pipecat.frames.frames import (
+    EndFrame,
+    ErrorFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    MetricsFrame,
+    TextFrame,
+)
+from pipecat.metrics.metrics import TTFBMetricsData
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class FakeLLM(LLMService):
+    def __init__(self, reply: str, delay: float = 0, fail: bool = False):
+        super().__init__()
+        self.reply = reply
+        self.delay = delay
+        self.fail = fail
+        self.requests = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            self.requests += 1
+            await self.push_frame(LLMFullResponseStartFrame())
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                await self.push_error(ErrorFrame("unavailable"))
+            else:
+                ttfb = TTFBMetricsData(processor=self.name, value=self.delay)
+                await self.push_frame(MetricsFrame(data=[ttfb]))
+                await self.push_frame(TextFrame(self.reply))
+            await self.push_frame(LLMFullResponseEndFrame())
+        else:
+            await self.push_frame(frame, direction)
+
+
+class Collector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+        self.responses = 0
+        self.ttfb = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, TextFrame):
+            self.texts.append(frame.text)
+        elif isinstance(frame, MetricsFrame):
+            self.ttfb += [data.processor for data in frame.data]
+        elif isinstance(frame, LLMFullResponseEndFrame):
+            self.responses += 1
+        await self.push_frame(frame, direction)
+
+
+async def _run_turn(router: LLMRouter) -> Collector:
+    collector = Collector()
+    task = PipelineTask(Pipeline([router, collector]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    context = OpenAILLMContext([{"role": "user", "content": "Hello"}])
+    await task.queue_frame(OpenAILLMContextFrame(context))
+    for _ in range(100):
+        if collector.responses:
+            break
+        await asyncio.sleep(0.01)
+
+    await task.queue_frame(EndFrame())
+    await runner
+    return collector
+
+
+async def test_tracker_ranks_unmeasured_then_fastest_healthy():
+    tracker = LLMLatencyTracker(window_secs=60, failure_cooldown_secs=30)
+    routes = [
+        LLMRoute(name, FakeLLM(name), weight)
+        for name, weight in [("a", 1), ("b", 1), ("c", 2), ("d", 1)]
+    ]
+    tracker.record("a", 0.5, now=100)
+    tracker.record("b", 0.8, now=100)
+    tracker.record("c", 0.8, now=100)
+    assert [r.provider for r in tracker.rank(routes, now=101)] == ["d", "c", "a", "b"]
+
+    tracker.record_failure("c", now=101)
+    assert [r.provider for r in tracker.rank(routes, now=102)] == ["d", "a", "b", "c"]
+
+    # Old responses and failures are forgotten.
+    assert tracker.ttft("a", now=200) is None
+    assert tracker.healthy("c", now=200)
+
+
+async def test_turn_goes_to_fastest_provider():
+    slow, fast = FakeLLM("slow"), FakeLLM("fast")
+    tracker = LLMLatencyTracker()
+    tracker.record("slow", 0.9)
+    tracker.record("fast", 0.2)
+    router = LLMRouter([LLMRoute("slow", slow), LLMRoute("fast", fast)], slow, 0, tracker)
+
+    collector = await _run_turn(router)
+
+    assert collector.texts == ["fast"]
+    assert (slow.requests, fast.requests) == (0, 1)
+    assert collector.ttfb == [fast.name]
+    assert router.providers == {slow.name: "slow", fast.name: "fast"}
+
+
+async def test_hedged_request_wins_when_first_provider_is_slow():
+    slow, fast = FakeLLM("slow", delay=0.5), FakeLLM("fast")
+    tracker = LLMLatencyTracker()
+    router = LLMRouter(
+        [LLMRoute("slow", slow), LLMRoute("fast", fast)], slow, hedge_secs=0.05, tracker=tracker
+    )
+    wins = Metrics.get("llm_hedge_wins")
+
+    collector = await _run_turn(router)
+
+    assert collector.texts == ["fast"]
+    assert (slow.requests, fast.requests) == (1, 1)
+    # Only the metrics of the response used.
+    assert collector.ttfb == [fast.name]
+    assert Metrics.get("llm_hedge_wins") == wins + 1
+    # The slow one is known to be slower now.
+    assert [r.provider for r in tracker.rank(router._routes)] == ["fast", "slow"]
+
+
+async def test_failing_provider_hands_turn_to_next():
+    broken, backup = FakeLLM("broken", fail=True), FakeLLM("backup")
+    tracker = LLMLatencyTracker()
+    router = LLMRouter([LLMRoute("broken", broken), LLMRoute("backup", backup)], broken, 0, tracker)
+
+    collector = await _run_turn(router)
+
+    assert collector.texts == ["backup"]
+    assert not tracker.healthy("broken")
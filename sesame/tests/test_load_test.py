@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from common.load_test import (
+    LoadTest,
+    LoadTestConfig,
+    RequestResult,
+    compare,
+    percentiles,
+    render_html,
+    summarize,
+)
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+STARTED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _event(message: dict) -> str:
+    return f"data: {json.dumps(message)}\n\n"
+
+
+async def test_action_stream_is_measured():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.params["coalesce_ms"] == "0"
+        body = _event({"type": "bot-llm-started"}) + "".join(
+            _event({"type": "bot-llm-text", "data": {"text": f"word{i} "}}) for i in range(5)
+        )
+        return httpx.Response(200, text=body + _event({"type": "bot-llm-stopped"}))
+
+    load_test = LoadTest(LoadTestConfig(), "postgresql+asyncpg://unused")
+    async with httpx.AsyncClient(
+        base_url="http://test", transport=httpx.MockTransport(handler)
+    ) as client:
+        result = await load_test._send_action(client, "token", "conversation")
+
+    assert result.error is None
+    assert result.status == 200
+    assert result.tokens == 5
+    assert result.ttfb is not None and result.ttfb <= result.ttft <= result.latency
+
+
+async def test_failed_and_empty_responses_are_errors():
+    responses = iter(
+        [
+            httpx.Response(503, json={"detail": "LLM provider unavailable"}),
+            httpx.Response(200, text=_event({"type": "bot-llm-stopped"})),
+        ]
+    )
+    load_test = LoadTest(LoadTestConfig(), "postgresql+asyncpg://unused")
+    async with httpx.AsyncClient(
+        base_url="http://test", transport=httpx.MockTransport(lambda _: next(responses))
+    ) as client:
+        errors = [(await load_test._send_action(client, "token", "c")).error for _ in range(2)]
+
+    assert errors == ["HTTP 503", "No response"]
+
+
+async def test_report_and_regressions():
+    results = [
+        RequestResult(started_at=i / 10, latency=0.5 + i / 100, ttfb=0.05, ttft=0.3, tokens=50)
+        for i in range(20)
+    ] + [RequestResult(started_at=1.5, latency=60, error="Timeout")]
+    server_before = {"counters": {"db_pool_checkouts": 10, "db_pool_wait_us": 0}}
+    server_after = {
+        "counters": {"db_pool_checkouts": 50, "db_pool_wait_us": 20_000},
+        "db_pool": {"size": 5, "checked_out": 0, "overflow": -5},
+    }
+    report = summarize(
+        LoadTestConfig(), results, STARTED_AT, 10, server_before, server_after, peak_checked_out=4
+    )
+
+    assert report["requests"] == 21 and report["errors"] == 1
+    assert report["requests_per_sec"] == 2.0
+    assert report["tokens_per_sec"]["total"] == 100.0
+    assert report["latency_ms"]["p50"] == 600.0
+    assert report["db_pool"]["wait_ms_mean"] == 0.5
+    assert "api_key" not in report["config"]
+    assert [bucket["requests"] for bucket in report["timeline"]] == [10, 11]
+    assert "<th>Timeout</th><td>1</td>" in render_html(report)
+
+    assert compare(report, report, 0.1) == []
+    slower = {**report, "requests_per_sec": 1.5, "latency_ms": {**report["latency_ms"]}}
+    slower["latency_ms"]["p95"] = report["latency_ms"]["p95"] * 1.5
+    assert [r.split(":")[0] for r in compare(slower, report, 0.1)] == [
+        "requests_per_sec",
+        "latency_ms p95",
+    ]
+
+
+async def test_percentiles_of_nothing_are_none():
+    assert percentiles([])["p95"] is None
+    assert percentiles([1, 2, 3, 4], 1000)["max"] == 4000
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import pytest
+from bots.mock_services import MockLLMService, MockSTTService, MockTransport, MockTTSService
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    InputAudioRawFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    OutputAudioRawFrame,
+    TextFrame,
+    TranscriptionFrame,
+    TTSAudioRawFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.transports.base_transport import TransportParams
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class Collector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        self.frames.append((time.monotonic(), frame))
+        await self.push_frame(frame, direction)
+
+    def of_type(self, frame_type):
+        return [(at, frame) for at, frame in self.frames if isinstance(frame, frame_type)]
+
+
+async def _run(processors, frames, wait: float = 0.1) -> Collector:
+    collector = Collector()
+    task = PipelineTask(Pipeline(processors + [collector]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    for frame in frames:
+        await task.queue_frame(frame)
+    await asyncio.sleep(wait)
+    await task.queue_frame(EndFrame())
+    await runner
+    return collector
+
+
+async def test_llm_streams_tokens_after_ttft():
+    llm = MockLLMService(tokens=20, tokens_per_sec=200, ttft_ms=100)
+    context = OpenAILLMContext([{"role": "user", "content": "Hi"}])
+    sent_at = time.monotonic()
+    collector = await _run([llm], [OpenAILLMContextFrame(context)], wait=0.4)
+
+    texts = [(at, frame) for at, frame in collector.of_type(TextFrame) if type(frame) is TextFrame]
+    assert len(texts) == 20
+    assert texts[0][0] - sent_at >= 0.1
+    # 19 intervals of 5ms between the tokens.
+    assert texts[-1][0] - texts[0][0] >= 0.09
+    assert texts[-1][1].text.endswith(". ")
+    assert len(collector.of_type(LLMFullResponseStartFrame)) == 1
+    assert len(collector.of_type(LLMFullResponseEndFrame)) == 1
+
+
+async def test_tts_speaks_silence_for_the_text():
+    tts = MockTTSService(latency_ms=10, words_per_minute=600, sample_rate=16000)
+    collector = await _run([tts], [TextFrame("One two three four five.")], wait=0.2)
+
+    audio = b"".join(frame.audio for _, frame in collector.of_type(TTSAudioRawFrame))
+    # Five words at ten a second.
+    assert len(audio) == 16000 * 2 // 2
+    assert not any(audio)
+
+
+async def test_stt_transcribes_scripted_text_as_audio_comes_in():
+    stt = MockSTTService(transcripts=["first", "second"], interval_secs=0.1)
+    chunk = InputAudioRawFrame(audio=bytes(320), sample_rate=16000, num_channels=1)
+    # 0.35s of audio, in 10ms chunks.
+    collector = await _run([stt], [chunk] * 35)
+
+    assert [frame.text for _, frame in collector.of_type(TranscriptionFrame)] == [
+        "first",
+        "second",
+        "first",
+    ]
+
+
+async def test_transport_loops_output_audio_back_to_its_input():
+    params = TransportParams(
+        audio_in_enabled=True,
+        audio_in_sample_rate=16000,
+        audio_out_enabled=True,
+        audio_out_sample_rate=16000,
+    )
+    transport = MockTransport(params)
+    joined = []
+
+    @transport.event_handler("on_first_participant_joined")
+    async def on_first_participant_joined(transport, participant):
+        joined.append(participant)
+
+    tone = OutputAudioRawFrame(audio=b"\x01\x02" * 1600, sample_rate=16000, num_channels=1)
+    collector = Collector()
+    task = PipelineTask(Pipeline([transport.input(), collector, transport.output()]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    await asyncio.sleep(0.05)
+    await task.queue_frame(tone)
+    await asyncio.sleep(0.4)
+    await task.queue_frame(EndFrame())
+    await runner
+
+    assert len(joined) == 1
+    audio = b"".join(frame.audio for _, frame in collector.of_type(InputAudioRawFrame))
+    # All of it, possibly with silence where the input got ahead of the output.
+    assert audio.replace(b"\x00", b"") == b"\x01\x02" * 1600
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+from bots import persistent_wal
+from bots.persistent_context import PersistentContext
+from bots.persistent_wal import PersistentContextWAL
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pipecat.services.openai import OpenAILLMContext
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture(autouse=True)
+def wal_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistent_wal, "WAL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _context(messages=None):
+    return OpenAILLMContext(messages or [])
+
+
+async def test_batches_are_coalesced(wal_dir):
+    calls = []
+    storage = PersistentContext(context=_context(), wal_key="convo", batch_window=0.5)
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        calls.append(list(messages))
+
+    for i in range(3):
+        context = _context([{"role": "user", "content": str(n)} for n in range(i + 1)])
+        await storage.save(context)
+
+    await storage.close()
+
+    assert calls == [[{"role": "user", "content": str(n)} for n in range(3)]]
+    # Everything was stored, so the WAL file is gone.
+    assert list(wal_dir.glob("*.wal")) == []
+
+
+async def test_failed_batches_are_replayed(wal_dir, monkeypatch):
+    monkeypatch.setattr("bots.persistent_context.PERSIST_RETRY_DELAY_SECONDS", 0)
+
+    storage = PersistentContext(context=_context(), wal_key="convo", batch_window=0)
+
+    @storage.on_context_message
+    async def failing_handler(messages):
+        raise Exception("database unavailable")
+
+    await storage.save(_context([{"role": "user", "content": "hello"}]))
+    await storage.close()
+
+    assert len(list(wal_dir.glob("convo.*.wal"))) == 1
+
+    replayed = []
+    storage = PersistentContext(context=_context(), wal_key="convo")
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        replayed.append(list(messages))
+
+    await asyncio.sleep(0.1)
+    await storage.close()
+
+    assert replayed == [[{"role": "user", "content": "hello"}]]
+    assert list(wal_dir.glob("*.wal")) == []
+
+
+async def test_live_wal_is_not_claimed(wal_dir):
+    wal = PersistentContextWAL("convo")
+    wal.append([{"role": "user", "content": "in flight"}])
+
+    assert PersistentContextWAL.claim_orphans("convo") == []
+
+    wal.close()
+    orphans = PersistentContextWAL.claim_orphans("convo")
+    assert [items for _, _, items in orphans] == [[{"role": "user", "content": "in flight"}]]
+    for path, f, _ in orphans:
+        PersistentContextWAL.release_orphan(path, f, replayed=True)
+
+
+def _db() -> AsyncSession:
+    # The storage only listens to the transaction events of the sync session.
+    db = AsyncSession()
+    db.sync_session.bind = create_engine("sqlite://")
+    return db
+
+
+def _wal_items(wal_dir):
+    items = []
+    for path in wal_dir.glob("*.wal"):
+        with open(path) as f:
+            items.extend(PersistentContextWAL._read_pending(f))
+    return items
+
+
+async def test_batches_stay_in_the_wal_until_the_transaction_commits(wal_dir):
+    db = _db()
+    storage = PersistentContext(context=_context(), wal_key="convo", batch_window=0)
+    storage.track_transaction(db)
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        db.sync_session.execute(text("SELECT 1"))
+
+    await storage.save(_context([{"role": "user", "content": "hello"}]))
+    await storage.flush()
+    assert _wal_items(wal_dir) == [{"role": "user", "content": "hello"}]
+
+    db.sync_session.commit()
+    assert _wal_items(wal_dir) == []
+
+    await storage.close()
+    assert list(wal_dir.glob("*.wal")) == []
+
+
+async def test_rolled_back_batches_are_stored_again(wal_dir, monkeypatch):
+    monkeypatch.setattr("bots.persistent_context.PERSIST_RETRY_DELAY_SECONDS", 0)
+    db = _db()
+    calls = []
+    storage = PersistentContext(context=_context(), wal_key="convo", batch_window=0)
+    storage.track_transaction(db)
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        db.sync_session.execute(text("SELECT 1"))
+        calls.append([m["content"] for m in messages])
+        if len(calls) == 2:
+            # Like `Message.save_messages`, a failure rolls the transaction back.
+            db.sync_session.rollback()
+            raise Exception("database unavailable")
+
+    first = [{"role": "user", "content": "one"}]
+    await storage.save(_context(first))
+    await storage.flush()
+    await storage.save(_context(first + [{"role": "assistant", "content": "two"}]))
+    await storage.flush()
+
+    # The retry stores the rolled back batch again, ahead of the failed one.
+    assert calls == [["one"], ["two"], ["one", "two"]]
+    db.sync_session.commit()
+    await storage.close()
+    assert list(wal_dir.glob("*.wal")) == []
+
+
+async def test_uncommitted_batches_are_kept_for_replay(wal_dir):
+    db = _db()
+    storage = PersistentContext(context=_context(), wal_key="convo", batch_window=0)
+    storage.track_transaction(db)
+
+    @storage.on_context_message
+    async def on_context_message(messages):
+        db.sync_session.execute(text("SELECT 1"))
+
+    await storage.save(_context([{"role": "user", "content": "hello"}]))
+    await storage.close()
+    # The session ends without committing (e.g. the bot crashed).
+    db.sync_session.close()
+
+    orphans = PersistentContextWAL.claim_orphans("convo")
+    assert [items for _, _, items in orphans] == [[{"role": "user", "content": "hello"}]]
+    for path, f, _ in orphans:
+        PersistentContextWAL.release_orphan(path, f, replayed=True)
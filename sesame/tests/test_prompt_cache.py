@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from bots.prompt_cache import (
+    PromptCacheUsageProcessor,
+    cache_context_prefix,
+    mark_cached_prefix,
+    workspace_prompt_cache_usage,
+)
+from bots.types import BotConfig
+from common.metrics import Metrics
+from common.models import Message, RTVIServiceConfigModel, RTVIServiceOptionConfigModel
+
+from pipecat.frames.frames import EndFrame, MetricsFrame
+from pipecat.metrics.metrics import LLMTokenUsage, LLMUsageMetricsData
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.services.anthropic import AnthropicLLMContext, AnthropicLLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+EPHEMERAL = {"type": "ephemeral"}
+
+DEFAULT_CONTEXT = [
+    {"role": "system", "content": "You are a helpful tutor."},
+    {"role": "user", "content": [{"type": "text", "text": "Start with a greeting."}]},
+]
+
+
+async def test_prefix_length_counts_leading_default_context_messages():
+    messages = [
+        Message(content=m, extra_metadata={Message.CONTEXT_PREFIX_KEY: True})
+        for m in DEFAULT_CONTEXT
+    ]
+    messages.append(Message(content={"role": "user", "content": "Hi"}))
+    assert Message.context_prefix_length(messages) == 2
+    assert Message.context_prefix_length(messages[2:] + messages[:2]) == 0
+
+
+async def test_prefix_end_and_system_prompt_are_marked():
+    messages = DEFAULT_CONTEXT + [{"role": "user", "content": "Hi"}]
+    marked = mark_cached_prefix(messages, 2)
+
+    assert marked[0]["content"] == [
+        {"type": "text", "text": "You are a helpful tutor.", "cache_control": EPHEMERAL}
+    ]
+    assert marked[1]["content"][-1]["cache_control"] == EPHEMERAL
+    assert marked[2] == messages[2]
+    # The messages of the conversation are left alone.
+    assert "cache_control" not in DEFAULT_CONTEXT[1]["content"][-1]
+    assert mark_cached_prefix(messages, 0) is messages
+
+
+async def test_marks_survive_the_anthropic_context_format():
+    messages = mark_cached_prefix(DEFAULT_CONTEXT + [{"role": "user", "content": "Hi"}], 2)
+    context = AnthropicLLMContext.from_messages(messages)
+
+    assert context.system[-1]["cache_control"] == EPHEMERAL
+    # Both user messages are merged, the breakpoint stays at the end of the prefix.
+    assert [block.get("cache_control") for block in context.messages[0]["content"]] == [
+        EPHEMERAL,
+        None,
+    ]
+
+
+async def test_cache_reads_are_counted_per_provider():
+    read = Metrics.get("llm_prompt_cache_read_tokens:anthropic")
+    total = Metrics.get("llm_prompt_tokens:anthropic")
+    usage = LLMTokenUsage(
+        prompt_tokens=20,
+        completion_tokens=5,
+        total_tokens=25,
+        cache_read_input_tokens=1500,
+        cache_creation_input_tokens=0,
+    )
+
+    task = PipelineTask(Pipeline([PromptCacheUsageProcessor("anthropic", "workspace")]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+    await task.queue_frame(MetricsFrame(data=[LLMUsageMetricsData(processor="llm", value=usage)]))
+    await task.queue_frame(EndFrame())
+    await runner
+
+    assert Metrics.get("llm_prompt_cache_read_tokens:anthropic") == read + 1500
+    assert Metrics.get("llm_prompt_tokens:anthropic") == total + 1520
+    usage = workspace_prompt_cache_usage(["workspace", "other-workspace"])
+    assert usage["workspace"]["anthropic"]["cache_read_tokens"] >= 1500
+    assert "other-workspace" not in usage
+    assert workspace_prompt_cache_usage(["other-workspace"]) == {}
+
+
+def _caching_config(enabled: bool) -> BotConfig:
+    option = RTVIServiceOptionConfigModel(name="enable_prompt_caching_beta", value=enabled)
+    return BotConfig(config=[RTVIServiceConfigModel(service="llm", options=[option])])
+
+
+async def test_workspaces_can_turn_prompt_caching_off():
+    messages = DEFAULT_CONTEXT + [{"role": "user", "content": "Hi"}]
+
+    llm = AnthropicLLMService(api_key="key")
+    assert cache_context_prefix(llm, "anthropic", messages, 2, _caching_config(False)) is messages
+    assert llm._settings["enable_prompt_caching_beta"] is False
+
+    for config in [BotConfig(), _caching_config(True)]:
+        llm = AnthropicLLMService(api_key="key")
+        assert cache_context_prefix(llm, "anthropic", messages, 2, config) != messages
+        assert llm._settings["enable_prompt_caching_beta"] is True
@@ -0,0 +1,87 @@
+import json
+import random
+import statistics
+
+import pytest
+from common.models import Message
+from common.seed import COLUMNS, SeedConfig, SyntheticData, asyncpg_dsn
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+def _data(**config) -> SyntheticData:
+    config = SeedConfig(**{"users": 1, "random_seed": 1, **config})
+    return SyntheticData(config, "run", "hash", "key", random.Random(1))
+
+
+async def test_rows_reference_each_other():
+    rows = _data(workspaces_per_user=2, conversations_per_workspace=20, attachment_rate=1).user(7)
+
+    for table, table_rows in rows.items():
+        assert all(len(row) == len(COLUMNS[table]) for row in table_rows)
+    (user,) = rows["users"]
+    assert user[1] == "seed-run-7@example.com"
+    assert {service[4] for service in rows["services"]} == {"llm", "tts", "stt", "transport"}
+    assert {workspace[1] for workspace in rows["workspaces"]} == {user[0]}
+    workspace_ids = {workspace[0] for workspace in rows["workspaces"]}
+    assert len(rows["conversations"]) == 40
+    assert {conversation[1] for conversation in rows["conversations"]} == workspace_ids
+
+    message_ids = {message[0] for message in rows["messages"]}
+    assert rows["attachments"]
+    assert all(attachment[2] in message_ids for attachment in rows["attachments"])
+    assert all(isinstance(json.loads(a[3]), list) for a in rows["attachments"])
+
+
+async def test_conversations_are_numbered_and_start_with_the_context():
+    rows = _data(conversations_per_workspace=5).user(0)
+    by_conversation = {}
+    for message in rows["messages"]:
+        by_conversation.setdefault(message[1], []).append(message)
+
+    for conversation in rows["conversations"]:
+        messages = by_conversation[conversation[0]]
+        assert [m[2] for m in messages] == list(range(1, len(messages) + 1))
+        assert json.loads(messages[0][3])["role"] == "system"
+        assert json.loads(messages[0][8]) == {Message.CONTEXT_PREFIX_KEY: True}
+        # The conversation was last updated by its last message.
+        assert conversation[6] >= messages[-1][5]
+
+
+async def test_sizes_are_skewed_like_production():
+    rows = _data(conversations_per_workspace=100, messages_per_conversation=20).user(0)
+    lengths = {}
+    for message in rows["messages"]:
+        lengths.setdefault(message[1], 0)
+        lengths[message[1]] += 1
+    # A long tail: the longest conversations are far above the median.
+    assert 12 <= statistics.median(lengths.values()) <= 30
+    assert max(lengths.values()) > 3 * statistics.median(lengths.values())
+
+    sizes = {"user": [], "assistant": []}
+    for message in rows["messages"]:
+        content = json.loads(message[3])
+        if content["role"] in sizes:
+            sizes[content["role"]].append(len(content["content"]))
+    assert statistics.median(sizes["assistant"]) > 5 * statistics.median(sizes["user"])
+
+
+async def test_seeded_data_does_not_depend_on_the_workers():
+    def contents(data: SyntheticData, index: int):
+        rows = data.user(index)
+        return [message[2:5] for message in rows["messages"]], len(rows["attachments"])
+
+    # A worker generating users 2 and 3, and one generating user 3 only.
+    data = _data(attachment_rate=0.5)
+    contents(data, 2)
+    assert contents(data, 3) == contents(_data(attachment_rate=0.5), 3)
+    assert contents(_data(), 3) != contents(_data(random_seed=2), 3)
+
+
+async def test_dsn_and_estimate():
+    assert asyncpg_dsn("postgresql+asyncpg://u:p@h:5432/db") == "postgresql://u:p@h:5432/db"
+    config = SeedConfig(
+        users=10, workspaces_per_user=2, conversations_per_workspace=5, messages_per_conversation=10
+    )
+    # The mean of the log-normal lengths is above their median.
+    assert 1000 < config.estimated_messages() < 2000
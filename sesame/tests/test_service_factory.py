@@ -0,0 +1,47 @@
+import pytest
+from common.service_factory import ServiceFactory, ServiceType, preload_services
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture
+def test_services():
+    keys = [("test_dict", ServiceType.ServiceLLM), ("test_missing", ServiceType.ServiceTTS)]
+    ServiceFactory.register_service(
+        "collections:OrderedDict", "test_dict", ServiceType.ServiceLLM, requires_api_key=False
+    )
+    ServiceFactory.register_service(
+        "sesame_missing_module:Service", "test_missing", ServiceType.ServiceTTS
+    )
+    yield keys
+    for key in keys:
+        class_path = ServiceFactory._services.pop(key).class_path
+        ServiceFactory._classes.pop(class_path, None)
+        ServiceFactory._import_times.pop(class_path, None)
+
+
+async def test_resolved_class_is_cached(test_services):
+    assert ServiceFactory.get_import_times()["llm/test_dict"] is None
+
+    service = ServiceFactory.get_service("test_dict", ServiceType.ServiceLLM, "", {"a": 1})
+    assert service == {"a": 1}
+    import_time = ServiceFactory.get_import_times()["llm/test_dict"]
+    assert import_time is not None and import_time >= 0
+
+    ServiceFactory._classes["collections:OrderedDict"] = dict
+    service = ServiceFactory.get_service("test_dict", ServiceType.ServiceLLM, "")
+    assert type(service) is dict
+
+
+async def test_preload_skips_services_failing_to_import(test_services):
+    times = ServiceFactory.preload(test_services)
+    assert list(times) == ["llm/test_dict"]
+    assert ServiceFactory.get_import_times()["tts/test_missing"] is None
+
+
+async def test_preload_modes(test_services):
+    assert await preload_services(None, mode="none") == {}
+
+    times = await preload_services(None, mode="all")
+    assert "llm/test_dict" in times
+    assert "tts/test_missing" not in times
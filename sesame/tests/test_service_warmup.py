@@ -0,0 +1,103 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from bots.voice.warmup import ServiceWarmup
+
+from pipecat.frames.frames import StartFrame
+from pipecat.services.ai_services import AIService
+from pipecat.services.openai import OpenAILLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class WebsocketService(AIService):
+    def __init__(self):
+        super().__init__()
+        self.connections = 0
+
+    async def start(self, frame: StartFrame):
+        await super().start(frame)
+        await self._connect()
+
+    async def _connect(self):
+        self.connections += 1
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def llm_api():
+    requests = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requests.append(request.method)
+        return web.Response(status=404)
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    yield str(server.make_url("/v1")), requests
+    await server.close()
+
+
+async def test_services_are_connected_once(llm_api):
+    url, requests = llm_api
+    stt = WebsocketService()
+    llm = OpenAILLMService(api_key="key", base_url=url)
+    warmup = ServiceWarmup({"stt": stt, "llm": llm})
+
+    warmup.start()
+    await warmup.wait()
+    assert stt.connections == 1
+    assert requests == ["HEAD"]
+    assert set(warmup.timings) == {"stt", "llm"}
+    assert all(seconds is not None for seconds in warmup.timings.values())
+
+    # The pipeline start uses the warm connection, reconnecting works as usual.
+    await stt._connect()
+    assert stt.connections == 1
+    await stt._connect()
+    assert stt.connections == 2
+
+
+async def test_failed_warm_up_connects_on_start():
+    class FlakyService(WebsocketService):
+        async def _connect(self):
+            if self.connections == 0 and not getattr(self, "failed", False):
+                self.failed = True
+                raise ConnectionError("unreachable")
+            await super()._connect()
+
+    stt = FlakyService()
+    warmup = ServiceWarmup({"stt": stt})
+
+    warmup.start()
+    await warmup.wait()
+    assert warmup.timings == {"stt": None}
+
+    await stt._connect()
+    assert stt.connections == 1
+
+
+async def test_swallowed_connection_errors_count_as_failed():
+    class QuietService(WebsocketService):
+        """Logs connection errors instead of raising them, like Cartesia."""
+
+        _websocket = None
+
+        async def _connect(self):
+            await super()._connect()
+            if self.connections > 1:
+                self._websocket = object()
+
+    tts = QuietService()
+    warmup = ServiceWarmup({"tts": tts})
+
+    warmup.start()
+    await warmup.wait()
+    assert warmup.timings == {"tts": None}
+
+    # Connected again when the pipeline starts.
+    await tts._connect()
+    assert tts.connections == 2
+    assert tts._websocket is not None
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from bots.voice.speculative import SpeculativeInference
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    InterimTranscriptionFrame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.llm_response import LLMUserContextAggregator
+from pipecat.processors.aggregators.openai_llm_context import (
+    OpenAILLMContext,
+    OpenAILLMContextFrame,
+)
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import LLMService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class EchoLLM(LLMService):
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, OpenAILLMContextFrame):
+            text = frame.context.messages[-1]["content"]
+            self.requests.append(text)
+            await self.push_frame(LLMFullResponseStartFrame())
+            await asyncio.sleep(0.02)
+            await self.push_frame(TextFrame(f"re: {text}"))
+            await self.push_frame(LLMFullResponseEndFrame())
+        else:
+            await self.push_frame(frame, direction)
+
+
+class Collector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, TextFrame):
+            self.texts.append(frame.text)
+        await self.push_frame(frame, direction)
+
+
+async def _run_turn(speculation, llm, interim, final):
+    context = speculation._context
+    collector = Collector()
+    pipeline = Pipeline(
+        [
+            speculation.create_processor(),
+            LLMUserContextAggregator(context),
+            speculation.create_gate(),
+            llm,
+            collector,
+        ]
+    )
+    task = PipelineTask(pipeline)
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    await task.queue_frame(UserStartedSpeakingFrame())
+    await task.queue_frame(InterimTranscriptionFrame(interim, "user", "now"))
+    # Stable for long enough, the user is still finishing.
+    await asyncio.sleep(0.1)
+    await task.queue_frame(UserStoppedSpeakingFrame())
+    await task.queue_frame(TranscriptionFrame(final, "user", "now"))
+    for _ in range(100):
+        if collector.texts:
+            break
+        await asyncio.sleep(0.01)
+
+    await task.queue_frame(EndFrame())
+    await runner
+    return collector.texts
+
+
+async def test_matching_final_transcript_uses_speculation():
+    shadow, llm = EchoLLM(), EchoLLM()
+    speculation = SpeculativeInference(OpenAILLMContext(), shadow, stable_secs=0.02)
+
+    texts = await _run_turn(speculation, llm, "what time is it", "What time is it?")
+
+    assert shadow.requests == ["what time is it"]
+    assert llm.requests == []
+    assert texts == ["re: what time is it"]
+    assert (speculation.speculations, speculation.hits, speculation.misses) == (1, 1, 0)
+
+
+async def test_different_final_transcript_is_answered_again():
+    shadow, llm = EchoLLM(), EchoLLM()
+    speculation = SpeculativeInference(OpenAILLMContext(), shadow, stable_secs=0.02)
+
+    texts = await _run_turn(
+        speculation, llm, "what time is it", "What time is it in Paris?"
+    )
+
+    assert llm.requests == ["What time is it in Paris?"]
+    assert texts == ["re: What time is it in Paris?"]
+    assert (speculation.speculations, speculation.hits, speculation.misses) == (1, 0, 1)
+
+
+async def test_without_shadow_frames_pass():
+    llm = EchoLLM()
+    speculation = SpeculativeInference(OpenAILLMContext(), None, stable_secs=0.02)
+
+    texts = await _run_turn(speculation, llm, "what time is it", "What time is it?")
+
+    assert llm.requests == ["What time is it?"]
+    assert texts == ["re: What time is it?"]
+    assert speculation.speculations == 0
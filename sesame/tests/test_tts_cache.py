@@ -0,0 +1,142 @@
+import asyncio
+from typing import AsyncGenerator
+
+import pytest
+from bots.voice.tts_cache import TTSAudioCache, cached_tts
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    LLMFullResponseEndFrame,
+    LLMFullResponseStartFrame,
+    TextFrame,
+    TTSAudioRawFrame,
+    TTSSpeakFrame,
+    TTSStartedFrame,
+    TTSStoppedFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+from pipecat.services.ai_services import TTSService
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class CountingTTS(TTSService):
+    def __init__(self):
+        super().__init__(sample_rate=16000)
+        self.requests = []
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        self.requests.append(text)
+        yield TTSStartedFrame()
+        for i in range(3):
+            yield TTSAudioRawFrame(audio=bytes([i]) * 3200, sample_rate=16000, num_channels=1)
+        yield TTSStoppedFrame()
+
+
+class StreamingTTS(TTSService):
+    """Like websocket services: the audio arrives after `run_tts` has returned."""
+
+    def __init__(self):
+        super().__init__(sample_rate=16000)
+        self.requests = []
+        self._streams = set()
+
+    async def run_tts(self, text: str) -> AsyncGenerator[Frame, None]:
+        self.requests.append(text)
+        yield TTSStartedFrame()
+        task = asyncio.create_task(self._stream(text))
+        self._streams.add(task)
+        task.add_done_callback(self._streams.discard)
+        yield None
+
+    async def _stream(self, text: str):
+        for _ in range(3):
+            await asyncio.sleep(0.02)
+            audio = text[0].encode() * 3200
+            await self.push_frame(TTSAudioRawFrame(audio=audio, sample_rate=16000, num_channels=1))
+        await self.push_frame(TTSStoppedFrame())
+
+
+class Collector(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.audio = []
+        self.texts = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, TTSAudioRawFrame):
+            self.audio.append(frame.audio)
+        elif isinstance(frame, TextFrame):
+            self.texts.append(frame.text)
+        await self.push_frame(frame, direction)
+
+
+async def test_phrases_are_synthesized_once(tmp_path):
+    cache = TTSAudioCache(str(tmp_path))
+    tts = CountingTTS()
+    collector = Collector()
+    task = PipelineTask(Pipeline([cached_tts(tts, "fake", cache), collector]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    for _ in range(2):
+        await task.queue_frame(TTSSpeakFrame("Hello there!"))
+        for _ in range(100):
+            if len(collector.texts) == len(tts.requests) or len(collector.texts) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+    await task.queue_frame(EndFrame())
+    await runner
+
+    assert tts.requests == ["Hello there!"]
+    assert collector.texts == ["Hello there!", "Hello there!"]
+    first, second = collector.audio[:3], collector.audio[3:]
+    assert b"".join(first) == b"".join(second)
+
+
+async def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TTSAudioCache(str(tmp_path), max_bytes=2500)
+    keys = [TTSAudioCache.key("fake", "voice", 16000, {}, text) for text in "abc"]
+
+    cache.put(keys[0], b"\0" * 1000, 16000, 1)
+    cache.put(keys[1], b"\0" * 1000, 16000, 1)
+    audio, sample_rate, _ = cache.get(keys[0])
+    assert sample_rate == 16000
+    audio.close()
+    cache.put(keys[2], b"\0" * 1000, 16000, 1)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+async def test_audio_still_streaming_is_not_cached_as_the_phrase(tmp_path):
+    cache = TTSAudioCache(str(tmp_path))
+    tts = StreamingTTS()
+    collector = Collector()
+    task = PipelineTask(Pipeline([cached_tts(tts, "fake", cache), collector]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    # The phrase comes right after an LLM response whose audio is still coming.
+    await task.queue_frame(LLMFullResponseStartFrame())
+    await task.queue_frame(TextFrame("An answer."))
+    await task.queue_frame(LLMFullResponseEndFrame())
+    await task.queue_frame(TTSSpeakFrame("Hello there!"))
+    await asyncio.sleep(0.3)
+    # Once nothing is being spoken, the phrase is cached and then played.
+    for _ in range(2):
+        await task.queue_frame(TTSSpeakFrame("Hello there!"))
+        await asyncio.sleep(0.3)
+    await task.queue_frame(EndFrame())
+    await runner
+
+    assert tts.requests == ["An answer.", "Hello there!", "Hello there!"]
+    (entry,) = tmp_path.glob("*.pcm")
+    assert entry.read_bytes()[8:] == b"H" * 9600
+    assert b"".join(collector.audio[-3:]) == b"H" * 9600
@@ -0,0 +1,28 @@
+import numpy as np
+from bots.voice.vad import SharedSileroVADAnalyzer, get_silero_session
+
+from pipecat.audio.vad.silero import SileroVADAnalyzer
+
+
+def _audio(seed: int) -> bytes:
+    samples = np.random.default_rng(seed).normal(0, 3000, 512)
+    return samples.astype(np.int16).tobytes()
+
+
+def test_analyzers_share_the_model():
+    first = SharedSileroVADAnalyzer()
+    second = SharedSileroVADAnalyzer()
+
+    assert first._model.session is second._model.session is get_silero_session()
+    assert first._model is not second._model
+
+
+def test_shared_analyzer_matches_silero():
+    shared = SharedSileroVADAnalyzer()
+    reference = SileroVADAnalyzer()
+    other = SharedSileroVADAnalyzer()
+
+    for seed in range(5):
+        # Another session using the model in between must not change the result.
+        other.voice_confidence(_audio(seed + 100))
+        assert shared.voice_confidence(_audio(seed)) == reference.voice_confidence(_audio(seed))
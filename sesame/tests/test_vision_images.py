@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from bots.voice.vision import VisionSession, downscale_image, encode_image
+from PIL import Image
+
+from pipecat.frames.frames import (
+    EndFrame,
+    Frame,
+    UserImageRawFrame,
+    UserImageRequestFrame,
+    UserStartedSpeakingFrame,
+)
+from pipecat.pipeline.pipeline import Pipeline
+from pipecat.pipeline.runner import PipelineRunner
+from pipecat.pipeline.task import PipelineTask
+from pipecat.processors.aggregators.openai_llm_context import OpenAILLMContext
+from pipecat.processors.frame_processor import FrameDirection, FrameProcessor
+
+SIZE = (1280, 720)
+
+
+def _camera_frame(user_id: str = "alice") -> UserImageRawFrame:
+    image = Image.new("RGB", SIZE, (200, 30, 30)).tobytes()
+    return UserImageRawFrame(user_id=user_id, image=image, size=SIZE, format="RGB")
+
+
+class FakeCamera(FrameProcessor):
+    """Answers image requests like the input transport does."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, UserImageRequestFrame):
+            self.requests += 1
+            await self.push_frame(_camera_frame(frame.user_id))
+        else:
+            await self.push_frame(frame, direction)
+
+
+class ImageRequester(FrameProcessor):
+    def __init__(self):
+        super().__init__()
+        self.images = []
+
+    async def process_frame(self, frame: Frame, direction: FrameDirection):
+        await super().process_frame(frame, direction)
+        if isinstance(frame, UserImageRawFrame):
+            self.images.append(frame)
+        await self.push_frame(frame, direction)
+
+    async def request(self, count: int):
+        await self.push_frame(UserImageRequestFrame("alice"), FrameDirection.UPSTREAM)
+        for _ in range(100):
+            if len(self.images) == count:
+                return
+            await asyncio.sleep(0.01)
+
+
+def test_frames_are_downscaled():
+    frame = _camera_frame()
+
+    image, size = downscale_image(frame.image, frame.size, frame.format, max_size=640)
+    assert size == (640, 360)
+    assert len(image) == 640 * 360 * 3
+
+    assert downscale_image(frame.image, frame.size, frame.format, max_size=0)[1] == SIZE
+
+
+def test_images_are_compressed_as_configured():
+    frame = _camera_frame()
+
+    webp, mime_type = encode_image(frame.image, frame.size, frame.format, "WEBP", 60)
+    assert mime_type == "image/webp"
+    assert webp[8:12] == b"WEBP"
+
+    session = VisionSession(image_format="JPEG")
+    context = OpenAILLMContext()
+    session.attach(context)
+    context.add_image_frame_message(
+        format=frame.format, size=frame.size, image=frame.image, text="What is this?"
+    )
+    url = context.messages[-1]["content"][1]["image_url"]["url"]
+    assert url.startswith("data:image/jpeg;base64,")
+    assert base64.b64decode(url.split(",", 1)[1])[:2] == b"\xff\xd8"
+
+
+def test_anthropic_contexts_get_the_encoded_frames():
+    from pipecat.services.anthropic import AnthropicLLMContext
+
+    session = VisionSession(max_size=640, image_format="WEBP", quality=60)
+    context = OpenAILLMContext()
+    session.attach(context)
+    # What Anthropic's LLM service does to the context it is given.
+    AnthropicLLMContext.upgrade_to_anthropic(context)
+
+    frame = session.on_image(_camera_frame())
+    context.add_image_frame_message(
+        format=frame.format, size=frame.size, image=frame.image, text="What is this?"
+    )
+    image, text = context.messages[-1]["content"]
+    assert text == {"type": "text", "text": "What is this?"}
+    assert image["source"]["media_type"] == "image/webp"
+    data = base64.b64decode(image["source"]["data"])
+    assert Image.open(io.BytesIO(data)).size == (640, 360)
+    assert data == encode_image(frame.image, frame.size, frame.format, "WEBP", 60)[0]
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_repeated_requests_reuse_the_last_frame():
+    session = VisionSession(cache_ttl=10, max_size=640)
+    camera, requester = FakeCamera(), ImageRequester()
+    task = PipelineTask(Pipeline([camera, session.create_processor(), requester]))
+    runner = asyncio.create_task(PipelineRunner(handle_sigint=False).run(task))
+
+    await requester.request(1)
+    await requester.request(2)
+    assert camera.requests == 1
+    assert [image.size for image in requester.images] == [(640, 360), (640, 360)]
+
+    # A new turn asks the camera again.
+    await task.queue_frame(UserStartedSpeakingFrame())
+    await asyncio.sleep(0.05)
+    await requester.request(3)
+    assert camera.requests == 2
+
+    await task.queue_frame(EndFrame())
+    await runner
@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+from bots.types import BotConfig, BotParams
+from bots.voice import dispatch
+from bots.voice.dispatch import (
+    InMemoryJobChannel,
+    PostgresJobChannel,
+    VoiceBotDispatcher,
+    VoiceBotWorkerNode,
+)
+from bots.voice.supervisor import VoiceBotCapacityError, VoiceBotSupervisor
+from common.auth import Auth
+from common.encryption import decrypt_with_secret, encrypt_with_secret
+from common.metrics import Metrics
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest.fixture(autouse=True, scope="module")
+def encryption_key():
+    # Derived once, so dispatching doesn't outlast the short heartbeat timeouts below.
+    encrypt_with_secret("")
+
+
+def _params(n: int) -> BotParams:
+    return BotParams(conversation_id=f"00000000-0000-0000-0000-{n:012d}")
+
+
+async def test_sessions_go_to_the_least_loaded_node():
+    channel = InMemoryJobChannel()
+    await channel.register("small", 2)
+    await channel.register("large", 4)
+    dispatcher = VoiceBotDispatcher(channel)
+
+    placed = [
+        await dispatcher.dispatch(Auth("user"), _params(i), "https://room", "token")
+        for i in range(6)
+    ]
+
+    assert placed.count("small") == 2
+    assert placed.count("large") == 4
+    assert not await dispatcher.has_capacity()
+    with pytest.raises(VoiceBotCapacityError):
+        await dispatcher.dispatch(Auth("user"), _params(6), "https://room", "token")
+
+    # Bots a node reports count as well.
+    await channel.claim("large", 4)
+    await channel.heartbeat("large", 4, 1)
+    assert await dispatcher.dispatch(Auth("user"), _params(7), "https://room", "token") == "large"
+
+
+async def test_jobs_of_silent_nodes_move_on():
+    channel = InMemoryJobChannel(heartbeat_timeout=0.1)
+    await channel.register("lost", 2)
+    dispatcher = VoiceBotDispatcher(channel)
+    await dispatcher.dispatch(Auth("user"), _params(1), "https://room", "token")
+
+    await asyncio.sleep(0.15)
+    await channel.register("alive", 2)
+    assert not (await channel.workers())[1]["alive"]
+
+    await dispatcher.check_workers()
+
+    assert [w["worker_id"] for w in await channel.workers()] == ["alive"]
+    jobs = await channel.claim("alive", 2)
+    assert [job["params"]["conversation_id"] for job in jobs] == [_params(1).conversation_id]
+
+
+async def test_jobs_keep_room_tokens_encrypted_and_expire():
+    channel = InMemoryJobChannel()
+    await channel.register("node", 2)
+    dispatcher = VoiceBotDispatcher(channel, job_timeout=0.1)
+    await dispatcher.dispatch(Auth("user"), _params(1), "https://room", "token")
+    expired = Metrics.get("voice_bot_jobs_expired")
+
+    [(_, job)] = channel._jobs["node"]
+    assert job["room_token"] != "token"
+    assert decrypt_with_secret(job["room_token"]) == "token"
+
+    await dispatcher.check_workers()
+    assert (await channel.workers())[0]["pending"] == 1
+
+    await asyncio.sleep(0.15)
+    await dispatcher.check_workers()
+    assert (await channel.workers())[0]["pending"] == 0
+    assert Metrics.get("voice_bot_jobs_expired") - expired == 1
+
+
+class FlakyChannel(InMemoryJobChannel):
+    async def unregister(self, worker_id: str) -> int:
+        if worker_id == "broken":
+            raise ConnectionError("database unavailable")
+        return await super().unregister(worker_id)
+
+
+async def test_jobs_of_silent_nodes_are_dropped_when_no_node_is_left():
+    channel = FlakyChannel(heartbeat_timeout=0.1)
+    await channel.register("broken", 2)
+    await channel.register("lost", 2)
+    dispatcher = VoiceBotDispatcher(channel)
+    for i in range(3):
+        await dispatcher.dispatch(Auth("user"), _params(i), "https://room", "token")
+    dropped = Metrics.get("voice_bot_jobs_dropped")
+
+    await asyncio.sleep(0.15)
+    await dispatcher.check_workers()
+
+    # A worker that can't be forgotten doesn't keep the others around.
+    assert [w["worker_id"] for w in await channel.workers()] == ["broken"]
+    assert Metrics.get("voice_bot_jobs_dropped") - dropped == 1
+
+
+async def test_postgres_channel(db_engine):
+    channel = PostgresJobChannel(
+        async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+    await channel.register("pg-a", 2)
+    await channel.register("pg-b", 2)
+    for i in range(3):
+        await channel.submit("pg-a", {"n": i})
+
+    assert [(w["worker_id"], w["pending"], w["alive"]) for w in await channel.workers()] == [
+        ("pg-a", 3, True),
+        ("pg-b", 0, True),
+    ]
+    assert await channel.claim("pg-a", 1) == [{"n": 0}]
+    assert await channel.reassign("pg-a", "pg-b") == 2
+    await channel.submit("pg-a", {"n": 3})
+
+    # Jobs a worker didn't claim go with it.
+    assert await channel.unregister("pg-a") == 1
+    assert await channel.claim("pg-b", 5) == [{"n": 1}, {"n": 2}]
+
+    # Jobs nobody claimed in time are deleted.
+    await channel.submit("pg-b", {"n": 4})
+    assert await channel.expire(60) == 0
+    await asyncio.sleep(0.1)
+    assert await channel.expire(0.05) == 1
+    assert await channel.unregister("pg-b") == 0
+    assert await channel.workers() == []
+
+
+class FakeSupervisor(VoiceBotSupervisor):
+    def __init__(self):
+        super().__init__(max_concurrent=2, queue_size=0)
+        self.launched = []
+
+    def launch(self, auth, params, config, services, room_url, room_token):
+        with self._lock:
+            self._reserved -= 1
+        self.launched.append((auth.user_id, params.conversation_id, room_url, room_token))
+
+
+async def test_nodes_run_their_jobs(monkeypatch):
+    async def load_session_config(auth, conversation_id, session_factory):
+        return BotConfig(), {}
+
+    monkeypatch.setattr(dispatch, "load_session_config", load_session_config)
+    channel = InMemoryJobChannel()
+    supervisor = FakeSupervisor()
+    node = VoiceBotWorkerNode(
+        channel,
+        supervisor,
+        session_factory=object(),
+        worker_id="node",
+        capacity=2,
+        poll_interval=0.01,
+    )
+    running = asyncio.create_task(node.run())
+    for _ in range(100):
+        if await channel.workers():
+            break
+        await asyncio.sleep(0.01)
+
+    dispatcher = VoiceBotDispatcher(channel)
+    await dispatcher.dispatch(Auth("user"), _params(1), "https://room", "token")
+    for _ in range(100):
+        if supervisor.launched:
+            break
+        await asyncio.sleep(0.01)
+    assert supervisor.launched == [("user", _params(1).conversation_id, "https://room", "token")]
+
+    node.stop()
+    await asyncio.wait_for(running, 5)
+    assert await channel.workers() == []
+
+
+async def test_leaving_nodes_hand_over_their_jobs():
+    channel = InMemoryJobChannel()
+    await channel.register("other", 2)
+    node = VoiceBotWorkerNode(channel, FakeSupervisor(), session_factory=object(), worker_id="node")
+    # Stopped before it claims anything.
+    node.stop()
+    await channel.register("node", 2)
+    await channel.submit("node", {"job": 1})
+
+    await asyncio.wait_for(node.run(), 5)
+
+    assert [w["worker_id"] for w in await channel.workers()] == ["other"]
+    assert await channel.claim("other", 2) == [{"job": 1}]
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from bots.types import BotConfig, BotParams
+from bots.voice.supervisor import VoiceBotCapacityError, VoiceBotSupervisor
+from common.auth import Auth
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+class FakePool:
+    """Stands in for `VoiceBotWorkerPool`, bots "run" until `end()` is called."""
+
+    def __init__(self, fail: bool = False):
+        self.on_session_end = None
+        self.idle_workers = 1
+        self.sessions = []
+        self._fail = fail
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def launch(self, auth, params, config, services, room_url, room_token):
+        if self._fail:
+            raise OSError("Broken pipe")
+        # Every session on the same worker.
+        self.sessions.append(len(self.sessions) + 1)
+        return self.sessions[-1], 100000
+
+    def end(self, session_id: int, exitcode: int):
+        self.on_session_end(session_id, exitcode)
+
+
+def _launch(supervisor: VoiceBotSupervisor):
+    supervisor.launch(
+        Auth("user"), BotParams(conversation_id="conversation"), BotConfig(), {}, "url", "token"
+    )
+
+
+async def test_requests_queue_for_a_free_slot():
+    supervisor = VoiceBotSupervisor(max_concurrent=1, queue_size=1, queue_timeout=5)
+    supervisor.start()
+
+    await supervisor.reserve()
+    waiting = asyncio.create_task(supervisor.reserve())
+    await asyncio.sleep(0.05)
+    assert supervisor.status()["queued"] == 1
+
+    # The queue is full too.
+    with pytest.raises(VoiceBotCapacityError):
+        await supervisor.reserve()
+
+    supervisor.release()
+    await asyncio.wait_for(waiting, 1)
+    assert supervisor.status()["reserved"] == 1
+
+    supervisor.release()
+    await supervisor.drain(timeout=0)
+
+
+async def test_queued_request_times_out():
+    supervisor = VoiceBotSupervisor(max_concurrent=1, queue_size=1, queue_timeout=0.1)
+    supervisor.start()
+
+    await supervisor.reserve()
+    with pytest.raises(VoiceBotCapacityError) as e:
+        await supervisor.reserve()
+    assert e.value.retry_after > 0
+    assert supervisor.status()["queued"] == 0
+
+    supervisor.release()
+    await supervisor.drain(timeout=0)
+
+
+async def test_bot_exit_frees_its_slot():
+    pool = FakePool()
+    supervisor = VoiceBotSupervisor(pool=pool, max_concurrent=1, queue_size=1, queue_timeout=5)
+    supervisor.start()
+
+    await supervisor.reserve()
+    _launch(supervisor)
+    waiting = asyncio.create_task(supervisor.reserve())
+    await asyncio.sleep(0.05)
+    assert supervisor.status()["running"] == 1
+
+    pool.end(pool.sessions[0], 1)
+    await asyncio.wait_for(waiting, 1)
+
+    status = supervisor.status()
+    assert status["running"] == 0
+    assert status["recent_exits"][0]["exitcode"] == 1
+
+    supervisor.release()
+    await supervisor.drain(timeout=0)
+
+
+async def test_late_session_end_leaves_the_next_session_on_the_worker():
+    pool = FakePool()
+    supervisor = VoiceBotSupervisor(pool=pool, max_concurrent=2, queue_size=0, queue_timeout=5)
+    supervisor.start()
+
+    await supervisor.reserve()
+    _launch(supervisor)
+    # The worker is idle again and takes the next session before the end
+    # of the first one is reported.
+    await supervisor.reserve()
+    _launch(supervisor)
+    pool.end(pool.sessions[0], None)
+
+    status = supervisor.status()
+    assert status["running"] == 1
+    assert [bot["pid"] for bot in status["bots"]] == [100000]
+    assert supervisor.in_use == 1
+
+    pool.end(pool.sessions[1], None)
+    assert supervisor.in_use == 0
+    await supervisor.drain(timeout=0)
+
+
+async def test_failed_launch_gives_the_slot_back():
+    supervisor = VoiceBotSupervisor(
+        pool=FakePool(fail=True), max_concurrent=1, queue_size=0, queue_timeout=5
+    )
+    supervisor.start()
+
+    for _ in range(3):
+        await supervisor.reserve()
+        with pytest.raises(OSError):
+            _launch(supervisor)
+    assert supervisor.in_use == 0
+
+    await supervisor.drain(timeout=0)
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from multiprocessing.connection import Connection
+
+import pytest
+from bots.types import BotConfig, BotParams
+from bots.voice.supervisor import VoiceBotSupervisor
+from bots.voice.worker_pool import VoiceBotWorkerPool
+from common.auth import Auth
+
+
+def _fake_worker(conn: Connection, max_sessions: int):
+    """Runs in the worker processes instead of the voice bot, `crash` as room token kills it."""
+    conn.send(("ready", 0))
+    sessions = 0
+    while sessions < max_sessions:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        session_id, args = job
+        sessions += 1
+        if args[-1] == "crash":
+            os._exit(3)
+        time.sleep(0.2)
+        conn.send(("done", session_id))
+
+
+def _wait_for(condition, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+class Pool:
+    def __init__(self, size: int = 1, max_sessions: int = 5):
+        self.size = size
+        self.ended = []
+        self.pool = VoiceBotWorkerPool(
+            size=size,
+            max_sessions_per_worker=max_sessions,
+            on_session_end=lambda session_id, exitcode: self.ended.append((session_id, exitcode)),
+            target=_fake_worker,
+        )
+
+    def __enter__(self) -> "Pool":
+        self.pool.start()
+        _wait_for(lambda: self.pool.idle_workers == self.size)
+        return self
+
+    def __exit__(self, *exc):
+        self.pool.stop()
+
+    def launch(self, room_token: str = "token"):
+        """The session's id and the worker's pid."""
+        return self.pool.launch(
+            Auth("user"),
+            BotParams(conversation_id="conversation"),
+            BotConfig(),
+            {},
+            "https://room",
+            room_token,
+        )
+
+
+def test_sessions_go_to_idle_workers():
+    with Pool(size=2) as pool:
+        first = pool.launch()
+        second = pool.launch()
+        assert first and second and first[1] != second[1]
+        # Both are busy until their sessions end.
+        assert pool.launch() is None
+
+        _wait_for(lambda: len(pool.ended) == 2)
+        assert sorted(pool.ended) == sorted([(first[0], None), (second[0], None)])
+        _wait_for(lambda: pool.pool.idle_workers == 2)
+        third = pool.launch()
+        assert third and third[0] not in (first[0], second[0])
+        assert third[1] in (first[1], second[1])
+
+
+def test_workers_are_replaced_after_their_sessions():
+    with Pool(size=1, max_sessions=2) as pool:
+        _, pid = pool.launch()
+        _wait_for(lambda: pool.pool.idle_workers == 1)
+        assert pool.launch()[1] == pid
+
+        # The worker exits after its second session and a new one takes over.
+        _wait_for(lambda: pool.pool.idle_workers == 1)
+        replacement = pool.launch()
+        assert replacement and replacement[1] != pid
+        _wait_for(lambda: len(pool.ended) == 3)
+        assert [exitcode for _, exitcode in pool.ended] == [None, None, None]
+
+
+def test_dead_workers_end_their_session_and_are_replaced():
+    with Pool(size=1) as pool:
+        session_id, pid = pool.launch("crash")
+
+        _wait_for(lambda: pool.ended == [(session_id, 3)])
+        _wait_for(lambda: pool.pool.idle_workers == 1)
+        replacement = pool.launch()
+        assert replacement and replacement[1] != pid
+
+
+@pytest.mark.asyncio(loop_scope="session")
+async def test_session_end_after_the_worker_took_the_next_session():
+    with Pool(size=1) as pool:
+        supervisor = VoiceBotSupervisor(pool=pool.pool, max_concurrent=2, queue_size=0)
+        supervisor.start()
+        # The monitor thread reports the end of the first session only once
+        # the worker runs the next one.
+        on_session_end, relaunched = pool.pool.on_session_end, threading.Event()
+
+        def late_session_end(*args):
+            relaunched.wait(10)
+            on_session_end(*args)
+
+        pool.pool.on_session_end = late_session_end
+
+        await supervisor.reserve()
+        supervisor.launch(
+            Auth("user"), BotParams(conversation_id="first"), BotConfig(), {}, "url", "token"
+        )
+        _wait_for(lambda: pool.pool.idle_workers == 1)
+        await supervisor.reserve()
+        supervisor.launch(
+            Auth("user"), BotParams(conversation_id="second"), BotConfig(), {}, "url", "token"
+        )
+        relaunched.set()
+        _wait_for(lambda: len(supervisor.status()["recent_exits"]) == 1)
+
+        # The second session still counts.
+        assert supervisor.in_use == 1
+        _wait_for(lambda: supervisor.in_use == 0)
+        await supervisor.drain(timeout=0)
@@ -0,0 +1,145 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from bots.voice.latency import VoiceTurnLatencyTracker
+from common.models import Service, VoiceTurnLatency
+
+from pipecat.frames.frames import (
+    BotStartedSpeakingFrame,
+    MetricsFrame,
+    OutputAudioRawFrame,
+    TranscriptionFrame,
+    UserStartedSpeakingFrame,
+    UserStoppedSpeakingFrame,
+)
+from pipecat.metrics.metrics import TTFBMetricsData
+from pipecat.processors.frame_processor import FrameProcessor
+
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def tracker():
+    tracker = VoiceTurnLatencyTracker()
+    services = {
+        kind: Service(service_type=kind, service_provider=provider)
+        for kind, provider in [("stt", "deepgram"), ("llm", "openai"), ("tts", "cartesia")]
+    }
+    tts = FrameProcessor(name="tts")
+    llm_providers = {"llm": "openai", "routed-llm": "anthropic"}
+    tracker.set_session("conversation", "workspace", services, llm_providers, tts)
+    return tracker
+
+
+async def test_turn_latency_breakdown(tracker):
+    stopped = UserStoppedSpeakingFrame()
+    metrics = MetricsFrame(
+        data=[
+            TTFBMetricsData(processor="llm", value=0.25),
+            TTFBMetricsData(processor="tts", value=0.125),
+            TTFBMetricsData(processor="llm", value=0.5),
+        ]
+    )
+    for frame in [
+        UserStartedSpeakingFrame(),
+        stopped,
+        # Seen again by the processor after the output transport.
+        stopped,
+        TranscriptionFrame("hello", "user", "now"),
+        metrics,
+        BotStartedSpeakingFrame(),
+        # No turn in progress.
+        BotStartedSpeakingFrame(),
+    ]:
+        tracker.on_frame(frame)
+
+    assert len(tracker.turns) == 1
+    turn = tracker.turns[0]
+    assert turn["workspace_id"] == "workspace"
+    assert turn["llm_provider"] == "openai"
+    assert turn["llm_ttfb_ms"] == 250
+    assert turn["tts_ttfb_ms"] == 125
+    assert 0 <= turn["stt_ms"] <= turn["end_to_end_ms"]
+
+
+async def test_turns_have_the_provider_that_answered(tracker):
+    metrics = MetricsFrame(data=[TTFBMetricsData(processor="routed-llm", value=0.3)])
+    for frame in [
+        UserStartedSpeakingFrame(),
+        UserStoppedSpeakingFrame(),
+        metrics,
+        BotStartedSpeakingFrame(),
+        UserStartedSpeakingFrame(),
+        UserStoppedSpeakingFrame(),
+        BotStartedSpeakingFrame(),
+    ]:
+        tracker.on_frame(frame)
+
+    routed, unmeasured = tracker.turns
+    assert (routed["llm_provider"], routed["llm_ttfb_ms"]) == ("anthropic", 300)
+    assert (unmeasured["llm_provider"], unmeasured["llm_ttfb_ms"]) == ("openai", None)
+
+
+async def test_interrupted_turn_is_dropped(tracker):
+    for frame in [
+        UserStartedSpeakingFrame(),
+        UserStoppedSpeakingFrame(),
+        UserStartedSpeakingFrame(),
+        BotStartedSpeakingFrame(),
+    ]:
+        tracker.on_frame(frame)
+
+    assert tracker.turns == []
+
+
+async def test_frames_are_handled_once_after_other_frames(tracker):
+    started, stopped = UserStartedSpeakingFrame(), UserStoppedSpeakingFrame()
+    audio = [OutputAudioRawFrame(b"\0\0", 16000, 1) for _ in range(100)]
+    # The processor after the output transport sees them after lots of audio.
+    for frame in [started, stopped, *audio, started, stopped, BotStartedSpeakingFrame()]:
+        tracker.on_frame(frame)
+
+    assert len(tracker.turns) == 1
+
+
+def _turn(tracker: VoiceTurnLatencyTracker):
+    tracker.on_frame(UserStartedSpeakingFrame())
+    tracker.on_frame(UserStoppedSpeakingFrame())
+    tracker.on_frame(BotStartedSpeakingFrame())
+
+
+async def test_turns_are_saved_while_the_session_runs(tracker, monkeypatch):
+    transactions = []
+
+    async def save_turns(turns, db):
+        if db == "broken":
+            raise RuntimeError("connection lost")
+        db.extend(turns)
+
+    @asynccontextmanager
+    async def db_context():
+        transactions.append("broken" if len(transactions) == 1 else [])
+        yield transactions[-1]
+
+    monkeypatch.setattr(VoiceTurnLatency, "save_turns", save_turns)
+
+    async def flushed(count: int):
+        while len(transactions) < count:
+            await asyncio.sleep(0.01)
+
+    stopped = asyncio.Event()
+    flushes = asyncio.create_task(tracker.run_flushes(db_context, stopped, interval=0.01))
+    _turn(tracker)
+    await flushed(1)
+    assert transactions[0] and len(transactions[0]) == 1
+
+    # Lost with the failed write, the flushes go on.
+    _turn(tracker)
+    await flushed(2)
+    _turn(tracker)
+    stopped.set()
+    await flushes
+    assert transactions[1] == "broken"
+    assert sum(len(turns) for turns in transactions[2:]) == 1
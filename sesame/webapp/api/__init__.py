@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
 from .auth import router as auth_router
+from .bots import router as bots_router
 from .conversations import router as conversations_router
 from .rtvi import router as rtvi_router
 from .services import router as services_router
@@ -15,4 +16,5 @@ router.include_router(workspaces_router, tags=["Workspaces"])
 router.include_router(conversations_router, tags=["Conversations"])
 router.include_router(services_router, tags=["Services"])
 router.include_router(rtvi_router, tags=["RTVI"])
+router.include_router(bots_router, tags=["Bots"])
 
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from common.auth import Auth, default_session_factory
+from common.metrics import Metrics
+from common.models import VoiceTurnLatency, Workspace
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from webapp import get_db, get_user
+
+router = APIRouter(prefix="/bots")
+
+
+@router.get("/status", name="Voice bots running on this host")
+async def get_bots_status(request: Request, user: Auth = Depends(get_user)) -> Dict[str, Any]:
+    supervisor = getattr(request.app.state, "voice_bot_supervisor", None)
+    dispatcher = getattr(request.app.state, "voice_bot_dispatcher", None)
+    if dispatcher is not None:
+        return {"supervised": False, "workers": await dispatcher.status()}
+    if supervisor is None:
+        return {"supervised": False}
+    return {"supervised": True, **supervisor.status(user.user_id)}
+
+
+@router.get("/latency", name="Voice turn latency percentiles")
+async def get_bots_latency(
+    workspace_id: Optional[str] = Query(None),
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    p50/p95/p99 (milliseconds) of each voice turn stage over the last `days`,
+    per workspace and provider: STT, LLM and TTS time to first byte, and end
+    to end per STT/LLM/TTS combination.
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    return await VoiceTurnLatency.get_percentiles(since, db, workspace_id)
+
+
+@router.get("/prompt-cache", name="LLM prompt cache hit rates")
+async def get_bots_prompt_cache(
+    user: Auth = Depends(get_user), db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Prompt tokens LLM providers read from their cache, per workspace of the
+    user and provider, for the conversations of this process (as reported
+    in their usage).
+    """
+    from bots.prompt_cache import workspace_prompt_cache_usage
+
+    workspace_ids = await Workspace.get_workspace_ids(user.user_id, db)
+    return workspace_prompt_cache_usage(workspace_ids)
+
+
+@router.get("/metrics", name="Counters of this process")
+async def get_bots_metrics(user: Auth = Depends(get_user)) -> Dict[str, Any]:
+    """
+    The event counters of this webapp process, and how its database
+    connection pool is used right now. Load tests read them before and
+    after a run.
+    """
+    pool = default_session_factory.engine.pool
+    return {
+        "counters": Metrics.snapshot(),
+        "db_pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        },
+    }
@@ -1,6 +1,5 @@
 from typing import Tuple, Optional
 
-from bots.tasks.summarize import generate_conversation_summary
 from common.auth import Auth, get_db_with_token
 from common.models import (
     Conversation,
@@ -17,7 +16,6 @@ from common.models import (
     AttachmentModel,
     FileParseResponse,
 )
-from common.utils.parser import parse_pdf_to_markdown
 from fastapi import APIRouter, Depends, HTTPException, Query, status, File, UploadFile
 from pydantic import ValidationError
 from sqlalchemy import delete, func, select
@@ -122,6 +120,12 @@ async def create_conversation(
         for message_data in new_convo.workspace.config["default_llm_context"]:
             try:
                 valid_message = MessageCreateModel.model_validate(message_data)
+                # Marked as the prefix shared by the workspace's conversations,
+                # for providers' prompt caching.
+                valid_message.extra_metadata = {
+                    **(valid_message.extra_metadata or {}),
+                    Message.CONTEXT_PREFIX_KEY: True,
+                }
                 initial_message = Message(
                     conversation_id=new_convo.conversation_id, **valid_message.model_dump()
                 )
@@ -285,6 +289,8 @@ async def summarize_conversation(
     conversation_id: str,
     db_and_auth: Tuple[AsyncSession, Auth] = Depends(get_db_with_token),
 ):
+    from bots.tasks.summarize import generate_conversation_summary
+
     db, auth = db_and_auth
 
     try:
@@ -308,6 +314,8 @@ async def create_attachment(
     """
     为会话创建附件,解析上传的PDF文件并返回Markdown格式的内容
     """
+    from common.utils.parser import parse_pdf_to_markdown
+
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
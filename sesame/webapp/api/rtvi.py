@@ -1,26 +1,59 @@
+import asyncio
+import math
 import os
 from typing import Optional
 
-from bots.http.bot import http_bot_pipeline
-from bots.types import BotConfig, BotParams
-from bots.voice.bot import voice_bot_create, voice_bot_launch
-from common.auth import Auth, get_authenticated_db_context
-from common.errors import ServiceConfigurationError
-from common.models import Conversation, Service
+import anyio
+from bots.http.session_manager import HTTPBotSessionManager, session_fingerprint
+from bots.types import BotConfig, BotParams, RTVIMessageModel
+from bots.voice.dispatch import VoiceBotDispatcher
+from bots.voice.room_pool import DailyRoomPool
+from bots.voice.supervisor import (
+    RETRY_AFTER_SECONDS,
+    VoiceBotCapacityError,
+    VoiceBotSupervisor,
+)
+from common.auth import Auth, authenticate, default_session_factory, get_authenticated_db_context
+from common.circuit_breaker import circuit_breakers
+from common.errors import ServiceConfigurationError, ServiceUnavailableError
+from common.models import Conversation, Message, Service
 from common.service_factory import (
+    MOCK_SERVICE_NAME,
     InvalidServiceTypeError,
     ServiceFactory,
     ServiceType,
     UnsupportedServiceError,
 )
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.websockets import WebSocketState
 from webapp import get_db, get_user
 
+# The bots and pipecat are imported by the routes that run them, the webapp
+# starts without loading them.
+
 router = APIRouter(prefix="/rtvi")
 
+# Default window (in milliseconds) for merging consecutive `bot-llm-text`
+# messages into a single stream event. 0 sends one event per token.
+DEFAULT_COALESCE_MS = int(os.getenv("SESAME_RTVI_ACTION_COALESCE_MS", "0") or 0)
+
+# Seconds a `/rtvi/ws` client connecting without an `Authorization` header
+# has to send its `auth` message.
+WS_AUTH_TIMEOUT_SECONDS = 10
+
 
 async def _get_config_and_conversation(conversation_id: str, db: AsyncSession):
     conversation = await Conversation.get_conversation_by_id(conversation_id, db)
@@ -84,6 +117,12 @@ async def _validate_services(
             workspace_id,
             service_type_filter,
         )
+        if config.llm_routing:
+            services.update(
+                await Service.get_llm_route_services(
+                    [route.provider for route in config.llm_routing.providers], db, workspace_id
+                )
+            )
     except ServiceConfigurationError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -100,41 +139,302 @@ async def stream_action(
     request: Request,
     params: BotParams,
     user: Auth = Depends(get_user),
+    stream_format: Optional[str] = Query(
+        None, description="Stream format: `base64` (default), `json` or `msgpack`"
+    ),
+    coalesce_ms: Optional[int] = Query(
+        None, ge=0, le=1000, description="Merge `bot-llm-text` messages over this window"
+    ),
 ):
+    from bots.http.bot import http_bot_pipeline
+    from bots.http.frame_serializer import BotFrameSerializer, negotiate_stream_format
+
     if not params.conversation_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Missing conversation_id in params",
         )
 
+    try:
+        negotiated_format = negotiate_stream_format(stream_format, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail=str(e))
+
+    coalesce_secs = (coalesce_ms if coalesce_ms is not None else DEFAULT_COALESCE_MS) / 1000
+
     async def generate():
+        sessions: HTTPBotSessionManager = request.app.state.http_bot_sessions
+        # Holds this conversation's lock until the turn is done, so requests
+        # for the same conversation run one after the other.
+        async with sessions.checkout(f"{user.user_id}:{params.conversation_id}") as slot:
+            async with get_authenticated_db_context(user) as db:
+                config, conversation = await _get_config_and_conversation(
+                    params.conversation_id, db
+                )
+                messages = [msg.content for msg in conversation.messages]
+                prefix_length = Message.context_prefix_length(conversation.messages)
+                logger.debug(f"Checking cache for services in conversation {params.conversation_id}")
+                cache_key = f"services_{params.conversation_id}"
+                if cache_key in request.app.state.cache:
+                    services = request.app.state.cache[cache_key]
+                else:
+                    logger.debug("No cached services. Fetching from database...")
+                    services = await _validate_services(
+                        db, config, conversation, ServiceType.ServiceLLM
+                    )
+                    request.app.state.cache[cache_key] = services
+                if await request.is_disconnected():
+                    logger.debug(f"Client left before action started on {params.conversation_id}")
+                    return
+                session = await slot.get(
+                    session_fingerprint(config, services),
+                    len(messages),
+                    lambda: http_bot_pipeline(
+                        params,
+                        config,
+                        services,
+                        messages,
+                        db,
+                        conversation.language_code,
+                        prefix_length,
+                        str(conversation.workspace_id),
+                    ),
+                )
+                try:
+                    async for chunk in session.run_turn(
+                        params.actions, db, BotFrameSerializer(negotiated_format), coalesce_secs
+                    ):
+                        yield chunk
+                except (asyncio.CancelledError, GeneratorExit):
+                    # The client disconnected (Starlette cancels the response) or a
+                    # send failed. Stop the pipeline so the provider stops generating
+                    # and commit whatever was produced so far. Shielded, since every
+                    # await would otherwise be cancelled again.
+                    with anyio.CancelScope(shield=True):
+                        await session.cancel()
+                        await db.commit()
+                    raise
+
+    return StreamingResponse(generate(), media_type=negotiated_format.media_type)
+
+
+@router.websocket("/ws")
+async def websocket_action(
+    websocket: WebSocket,
+    conversation_id: str = Query(...),
+    coalesce_ms: Optional[int] = Query(
+        None, ge=0, le=1000, description="Merge `bot-llm-text` messages over this window"
+    ),
+):
+    """
+    Text chat over a single WebSocket bound to one conversation.
+
+    The client is authenticated and the conversation configuration is loaded
+    once, when connecting. Every text message received is an RTVI message
+    (e.g. an `action`) handled as one turn of the conversation, and RTVI
+    messages produced by the bot are sent back as JSON text messages.
+
+    The token goes in an `Authorization: Bearer` header or, for clients that
+    can't set headers (browsers), in a first message
+    `{"type": "auth", "data": {"token": "..."}}`.
+    """
+    from bots.http.bot import http_bot_pipeline
+    from bots.http.frame_serializer import BotWebSocketSerializer
+
+    from pipecat.frames.frames import TransportMessageUrgentFrame
+    from pipecat.processors.frameworks.rtvi import RTVIError, RTVIErrorData
+
+    token = None
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[len("bearer ") :]
+    else:
+        await websocket.accept()
+        token = await _receive_auth_token(websocket)
+    if not token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Missing token")
+        return
+
+    try:
+        async with default_session_factory() as db:
+            user = await authenticate(token, db)
         async with get_authenticated_db_context(user) as db:
-            config, conversation = await _get_config_and_conversation(params.conversation_id, db)
-            messages = [msg.content for msg in conversation.messages]
-            logger.debug(f"Checking cache for services in conversation {params.conversation_id}")
-            cache_key = f"services_{params.conversation_id}"
-            if cache_key in request.app.state.cache:
-                services = request.app.state.cache[cache_key]
-            else:
-                logger.debug("No cached services. Fetching from database...")
-                services = await _validate_services(
-                    db, config, conversation, ServiceType.ServiceLLM
+            config, conversation = await _get_config_and_conversation(conversation_id, db)
+            services = await _validate_services(db, config, conversation, ServiceType.ServiceLLM)
+            language_code = conversation.language_code
+            workspace_id = str(conversation.workspace_id)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+
+    if websocket.client_state == WebSocketState.CONNECTING:
+        await websocket.accept()
+
+    sessions: HTTPBotSessionManager = websocket.app.state.http_bot_sessions
+    serializer = BotWebSocketSerializer()
+    fingerprint = session_fingerprint(config, services)
+    params = BotParams(conversation_id=conversation_id)
+    coalesce_secs = (coalesce_ms if coalesce_ms is not None else DEFAULT_COALESCE_MS) / 1000
+
+    async def run_turn(message: RTVIMessageModel):
+        async with sessions.checkout(f"{user.user_id}:{conversation_id}") as slot:
+            async with get_authenticated_db_context(user) as db:
+
+                async def create():
+                    messages = await Message.get_messages_by_conversation_id(conversation_id, db)
+                    return await http_bot_pipeline(
+                        params,
+                        config,
+                        services,
+                        [m.content for m in messages],
+                        db,
+                        language_code,
+                        Message.context_prefix_length(messages),
+                        workspace_id,
+                    )
+
+                message_count = await Message.count_messages_by_conversation_id(
+                    conversation_id, db
                 )
-                request.app.state.cache[cache_key] = services
-            gen, task = await http_bot_pipeline(
-                params, config, services, messages, db, conversation.language_code
+                session = await slot.get(fingerprint, message_count, create)
+                try:
+                    async for data in session.run_turn([message], db, serializer, coalesce_secs):
+                        await websocket.send_text(data)
+                except (Exception, asyncio.CancelledError):
+                    # Client gone (or sending failed): same as a disconnect on
+                    # /action, stop generating and keep what we have.
+                    with anyio.CancelScope(shield=True):
+                        await session.cancel()
+                        await db.commit()
+                    raise
+
+    incoming: asyncio.Queue[Optional[str]] = asyncio.Queue()
+
+    async def receive():
+        try:
+            while True:
+                await incoming.put(await websocket.receive_text())
+        except (WebSocketDisconnect, RuntimeError):
+            await incoming.put(None)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while (data := await incoming.get()) is not None:
+            frame = serializer.deserialize(data)
+            try:
+                if not isinstance(frame, TransportMessageUrgentFrame):
+                    raise ValueError("Expected a JSON object")
+                message = RTVIMessageModel.model_validate(frame.message)
+            except (ValueError, ValidationError) as e:
+                error = RTVIError(data=RTVIErrorData(error=f"Invalid RTVI message: {e}", fatal=False))
+                await websocket.send_text(error.model_dump_json())
+                continue
+
+            # Run the turn while watching for the client going away, so the
+            # provider stops generating as soon as it does.
+            turn = asyncio.create_task(run_turn(message))
+            try:
+                await asyncio.wait([turn, receiver], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not turn.done():
+                    turn.cancel()
+            try:
+                await turn
+            except asyncio.CancelledError:
+                break
+            except HTTPException as e:
+                error = RTVIError(data=RTVIErrorData(error=str(e.detail), fatal=True))
+                await websocket.send_text(error.model_dump_json())
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        logger.debug(f"WebSocket for conversation {conversation_id} closed")
+
+
+async def _receive_auth_token(websocket: WebSocket) -> Optional[str]:
+    """The token of the `auth` message a client sends first, None if it doesn't."""
+    try:
+        message = await asyncio.wait_for(websocket.receive_json(), WS_AUTH_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, WebSocketDisconnect, ValueError):
+        return None
+    if not isinstance(message, dict) or message.get("type") != "auth":
+        return None
+    data = message.get("data")
+    token = data.get("token") if isinstance(data, dict) else None
+    return token if isinstance(token, str) and token else None
+
+
+def _capacity_error(retry_after: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="All voice bots are busy, try again later",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _check_circuits(config: BotConfig, services: dict[str, Service]):
+    """503 while the circuit of the voice bot's LLM provider is open."""
+    service = services.get(ServiceType.ServiceLLM.value)
+    # Routed LLM turns go to the providers still up.
+    if not service or config.llm_routing:
+        return
+    provider = str(service.service_provider)
+    breaker = circuit_breakers.find(ServiceType.ServiceLLM.value, provider, str(service.api_key))
+    retry_after = breaker.retry_after() if breaker else None
+    if retry_after is not None:
+        error = ServiceUnavailableError(provider, ServiceType.ServiceLLM.value, retry_after)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(error),
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def _launch_voice_bot(
+    supervisor: Optional[VoiceBotSupervisor],
+    dispatcher: Optional[VoiceBotDispatcher],
+    user: Auth,
+    params: BotParams,
+    config: BotConfig,
+    services: dict[str, Service],
+    room_url: str,
+    bot_token: str,
+):
+    # Check if we are running on Modal and launch the voice bot as a separate function
+    if os.getenv("MODAL_ENV"):
+        logger.debug("Spawning voice bot on Modal")
+        try:
+            launch_bot_modal = __import__("sesame.modal_app", fromlist=["launch_bot_modal"])
+        except ImportError:
+            logger.error("Failed to import launch_bot_modal from sesame.modal_app")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to import launch_bot_modal from sesame.modal_app",
             )
-            async for chunk in gen:
-                yield chunk
-            await task
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+        launch_bot_modal.spawn(user, params, config, services, room_url, bot_token)
+    elif dispatcher:
+        await dispatcher.dispatch(user, params, room_url, bot_token)
+    elif supervisor:
+        supervisor.launch(user, params, config, services, room_url, bot_token)
+    else:
+        from bots.voice.bot import voice_bot_launch
+
+        logger.debug("Spawning voice bot as process")
+        voice_bot_launch(user, params, config, services, room_url, bot_token)
 
 
 @router.post("/connect", response_class=JSONResponse)
 async def connect(
-    params: BotParams, db: AsyncSession = Depends(get_db), user: Auth = Depends(get_user)
+    request: Request,
+    params: BotParams,
+    db: AsyncSession = Depends(get_db),
+    user: Auth = Depends(get_user),
 ):
+    from bots.voice.bot import voice_bot_create
+
     logger.debug(f"Connecting to conversation {params.conversation_id}")
     if not params.conversation_id:
         logger.error("No conversation ID passed to connect")
@@ -179,24 +479,53 @@ async def connect(
             detail="Missing API URL for transport service",
         )
 
-    room, user_token, bot_token = await voice_bot_create(transport_api_key, transport_api_url)
+    # Rather than start a bot that waits on a provider that is down.
+    _check_circuits(config, services)
 
-    # Check if we are running on Modal and launch the voice bot as a separate function
-    if os.getenv("MODAL_ENV"):
-        logger.debug("Spawning voice bot on Modal")
+    # Not set on Modal or with worker nodes, where voice bots don't run on this host.
+    supervisor: Optional[VoiceBotSupervisor] = getattr(
+        request.app.state, "voice_bot_supervisor", None
+    )
+    dispatcher: Optional[VoiceBotDispatcher] = getattr(
+        request.app.state, "voice_bot_dispatcher", None
+    )
+    if supervisor:
         try:
-            launch_bot_modal = __import__("sesame.modal_app", fromlist=["launch_bot_modal"])
-        except ImportError:
-            logger.error("Failed to import launch_bot_modal from sesame.modal_app")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to import launch_bot_modal from sesame.modal_app",
+            await supervisor.reserve()
+        except VoiceBotCapacityError as e:
+            raise _capacity_error(e.retry_after)
+    elif dispatcher and not await dispatcher.has_capacity():
+        raise _capacity_error(RETRY_AFTER_SECONDS)
+
+    room_pool: Optional[DailyRoomPool] = getattr(request.app.state, "daily_room_pool", None)
+    mock_transport = getattr(transport_service, "service_provider") == MOCK_SERVICE_NAME
+    if mock_transport:
+        room_pool = None
+    try:
+        if mock_transport:
+            from bots.mock_services import create_mock_room
+
+            room, user_token, bot_token = create_mock_room()
+        else:
+            room, user_token, bot_token = await voice_bot_create(
+                transport_api_key, transport_api_url, room_pool
             )
+    except BaseException:
+        if supervisor:
+            supervisor.release()
+        raise
 
-        launch_bot_modal.spawn(user, params, config, services, room.url, bot_token)
-    else:
-        logger.debug("Spawning voice bot as process")
-        voice_bot_launch(user, params, config, services, room.url, bot_token)
+    try:
+        await _launch_voice_bot(
+            supervisor, dispatcher, user, params, config, services, room.url, bot_token
+        )
+    except BaseException as e:
+        # Nobody joined the room, it can serve the next connect.
+        if room_pool:
+            room_pool.recycle(transport_api_key, transport_api_url, room)
+        if isinstance(e, VoiceBotCapacityError):
+            raise _capacity_error(e.retry_after)
+        raise
 
     return JSONResponse(
         {
@@ -1,10 +1,12 @@
 from uuid import UUID
 
 from common.auth import Auth
-from common.encryption import encrypt_with_secret
+from common.circuit_breaker import circuit_breakers
+from common.encryption import decrypt_with_secret, encrypt_with_secret
 from common.models import (
     Service,
     ServiceCreateModel,
+    ServiceHealthModel,
     ServiceModel,
     ServiceUpdateModel,
 )
@@ -34,6 +36,37 @@ async def get_supported_services(
         )
 
 
+@router.get("/import-times", response_model=dict[str, float | None])
+async def get_service_import_times():
+    """Seconds each service took to import in this process, null until it is."""
+    return ServiceFactory.get_import_times()
+
+
+@router.get("/health", response_model=list[ServiceHealthModel])
+async def get_service_health(
+    db: AsyncSession = Depends(get_db),
+):
+    """Circuit breaker state of the user's LLM services, as this process sees it."""
+    result = await db.execute(select(Service).order_by(Service.created_at.desc()))
+    health = []
+    for service in result.scalars().all():
+        breaker = circuit_breakers.find(
+            service.service_type,
+            str(service.service_provider),
+            decrypt_with_secret(str(service.api_key)),
+        )
+        health.append(
+            ServiceHealthModel(
+                service_id=service.service_id,
+                title=service.title,
+                service_type=service.service_type,
+                service_provider=service.service_provider,
+                **(breaker.snapshot() if breaker else {}),
+            )
+        )
+    return health
+
+
 @router.get("", response_model=list[ServiceModel])
 async def get_services(
     db: AsyncSession = Depends(get_db),
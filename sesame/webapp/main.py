@@ -2,9 +2,15 @@ import os
 import sys
 from contextlib import asynccontextmanager
 
+from bots.http.session_manager import HTTPBotSessionManager
+from bots.voice.dispatch import DISPATCH_MODE, PostgresJobChannel, VoiceBotDispatcher
+from bots.voice.room_pool import DailyRoomPool
+from bots.voice.supervisor import VoiceBotSupervisor
+from bots.voice.worker_pool import VoiceBotWorkerPool
 from cachetools import TTLCache
 from common.database import DatabaseSessionFactory
 from common.models import Base
+from common.service_factory import SERVICE_PRELOAD, preload_services
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -23,6 +29,10 @@ logger.add(sys.stderr, level=os.getenv("SESAME_WEBAPP_LOG_LEVEL", "DEBUG"))
 
 default_session_factory = DatabaseSessionFactory()
 
+# Load the VAD model when the webapp starts instead of on the first session.
+# Bot processes forked afterwards share the loaded model.
+PRELOAD_VAD = bool(int(os.getenv("SESAME_VAD_PRELOAD", "0") or 0))
+
 # ========================
 # FastAPI App
 # ========================
@@ -31,6 +41,8 @@ default_session_factory = DatabaseSessionFactory()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.cache = TTLCache(maxsize=100, ttl=300)
+    app.state.http_bot_sessions = HTTPBotSessionManager()
+    app.state.daily_room_pool = DailyRoomPool()
 
     try:
         async with default_session_factory.engine.connect() as session:
@@ -41,7 +53,36 @@ async def lifespan(app: FastAPI):
             "Database connection failed. Have you set valid SESAME_DATABASE_* credentials in your .env?"
         )
         os._exit(1)
+
+    if PRELOAD_VAD and not os.getenv("MODAL_ENV"):
+        from bots.voice.vad import preload_silero_vad
+
+        preload_silero_vad()
+    if SERVICE_PRELOAD != "none":
+        try:
+            await preload_services(default_session_factory)
+        except Exception as e:
+            logger.warning(f"Unable to preload services: {e}")
+
+    # Voice bots run on Modal or on worker nodes there, nothing to supervise locally.
+    remote = bool(os.getenv("MODAL_ENV")) or DISPATCH_MODE == "remote"
+    app.state.voice_bot_supervisor = None if remote else VoiceBotSupervisor(pool=VoiceBotWorkerPool())
+    app.state.voice_bot_dispatcher = (
+        VoiceBotDispatcher(PostgresJobChannel(default_session_factory))
+        if DISPATCH_MODE == "remote" and not os.getenv("MODAL_ENV")
+        else None
+    )
+    if app.state.voice_bot_supervisor:
+        app.state.voice_bot_supervisor.start()
+    if app.state.voice_bot_dispatcher:
+        app.state.voice_bot_dispatcher.start()
     yield
+    if app.state.voice_bot_supervisor:
+        await app.state.voice_bot_supervisor.drain()
+    if app.state.voice_bot_dispatcher:
+        await app.state.voice_bot_dispatcher.close()
+    await app.state.http_bot_sessions.close()
+    await app.state.daily_room_pool.close()
     await default_session_factory.engine.dispose()
 
 